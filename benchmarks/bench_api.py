@@ -0,0 +1,151 @@
+# Load test for the HTTP API: p50/p99 latency and throughput per endpoint, from
+# concurrent keep-alive clients against a server started here with a scratch
+# ledger (or one already running, with --url).
+#   python -m benchmarks.bench_api
+#   python -m benchmarks.bench_api --workers 1,4 --clients 16 --requests 400
+#   python -m benchmarks.bench_api --url http://127.0.0.1:8000
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+from urllib.parse import urlsplit
+
+BATCH = 10
+_client = {}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def random_order(rng, parties, products):
+    names = rng.sample(products, rng.randint(1, min(8, len(products))))
+    return {'party': rng.choice(parties), 'contact': '9999999999', 'products': names,
+            'quantities': [rng.randint(1, 3) for _ in names]}
+
+
+def _init_client(url, parties, products, seed):
+    _client['connection'] = http.client.HTTPConnection(urlsplit(url).netloc, timeout=60)
+    _client['rng'] = random.Random(seed + os.getpid())
+    _client['parties'], _client['products'] = parties, products
+
+
+def request(scenario, ids):
+    rng, connection = _client['rng'], _client['connection']
+    headers = {'Content-Type': 'application/json'}
+    body = None
+    if scenario in ('create', 'create pdf'):
+        method, path = 'POST', '/invoices'
+        body = json.dumps(random_order(rng, _client['parties'], _client['products']))
+        if scenario == 'create pdf':
+            headers['Accept'] = 'application/pdf'
+    elif scenario == f'batch x{BATCH}':
+        method, path = 'POST', '/invoices/batch'
+        body = json.dumps({'orders': [random_order(rng, _client['parties'], _client['products'])
+                                      for _ in range(BATCH)]})
+    elif scenario == 'list':
+        method, path = 'GET', '/invoices?limit=50'
+    else:
+        method, path = 'GET', f'/invoices/{rng.choice(ids)}/pdf'
+    start = time.perf_counter()
+    connection.request(method, path, body, headers)
+    response = connection.getresponse()
+    response.read()
+    return time.perf_counter() - start, response.status
+
+
+def run(url, scenario, clients, count, parties, products, ids=()):
+    with Pool(clients, initializer=_init_client, initargs=(url, parties, products, len(scenario))) as pool:
+        # Connect every client before the clock starts
+        pool.starmap(request, [('list', ids)] * clients)
+        start = time.perf_counter()
+        results = pool.starmap(request, [(scenario, ids)] * count, chunksize=1)
+        elapsed = time.perf_counter() - start
+    latencies = [seconds for seconds, _ in results]
+    errors = sum(status >= 400 for _, status in results)
+    invoices = {'create': 1, 'create pdf': 1, f'batch x{BATCH}': BATCH}.get(scenario, 0)
+    print(f'{scenario:<12} {count:>6} {percentile(latencies, 0.5) * 1e3:>8.1f} '
+          f'{percentile(latencies, 0.99) * 1e3:>8.1f} {count / elapsed:>8.1f} {count * invoices / elapsed:>10.1f}'
+          f' {errors:>6}')
+
+
+def start_server(tmp, workers, profile):
+    env = dict(os.environ, BIOLUME_LEDGER_DB=os.path.join(tmp, 'ledger.db'),
+               BIOLUME_STORAGE='segments:' + os.path.join(tmp, 'store'))
+    server = subprocess.Popen([sys.executable, '-m', 'biolume.api', '--port', '0', '--workers', str(workers),
+                               '--profile', profile], env=env, stderr=subprocess.PIPE, text=True)
+    line = server.stderr.readline()
+    match = re.search(r'http://[^ ]+', line)
+    if not match:
+        server.kill()
+        raise RuntimeError(f'server did not start: {line}{server.stderr.read()}')
+    return server, match.group(0)
+
+
+def cold_start(profile):
+    # What a fresh process per request would pay: imports, catalog, logos, one invoice
+    code = ('from biolume.catalog import get_catalog; from biolume.invoice import generate_invoice, pdf_bytes;'
+            'from config import get_profile; c = get_catalog(); p = c.party(c.party_names[0]);'
+            f'pdf_bytes(generate_invoice(p["Party"], p["GSTIN/UN"], "", p["Address"], [c.product_names[0]], [1], c,'
+            f' get_profile({profile!r})))')
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help="benchmark a running server instead of starting one")
+    parser.add_argument('--workers', default='1,2', help="worker counts to compare, e.g. 1,4")
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help="requests per scenario")
+    parser.add_argument('--profile', default='ks_ledger')
+    args = parser.parse_args()
+
+    from biolume.catalog import get_catalog
+    from biolume.inventory import Inventory
+
+    catalog = get_catalog()
+    parties, products = list(catalog.party_names), list(catalog.product_names)
+    # Parties whose addresses PyFPDF cannot encode would only measure the error path
+    parties = [name for name in parties if all(ord(ch) < 256 for ch in catalog.party(name)['Address'])]
+    print(f'cold process per invoice: {cold_start(args.profile) * 1e3:.0f} ms   ({os.cpu_count()} CPUs)')
+    scenarios = ['create', 'create pdf', f'batch x{BATCH}', 'list', 'get pdf']
+    for workers in ([None] if args.url else [int(n) for n in args.workers.split(',')]):
+        with tempfile.TemporaryDirectory() as tmp:
+            server = None
+            url = args.url
+            if url is None:
+                # Stock for every product, so only the pricing and rendering are measured
+                inventory = Inventory(os.path.join(tmp, 'ledger.db'))
+                inventory.receive({catalog.product(name)['Product ID']: 10 ** 6 for name in products})
+                inventory.close()
+                server, url = start_server(tmp, workers, args.profile)
+            try:
+                print(f"\n{workers or '?'} workers, {args.clients} clients, {url}")
+                print(f"{'scenario':<12} {'count':>6} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8} {'invoices/s':>10}"
+                      f" {'errors':>6}")
+                for scenario in scenarios:
+                    count = max(args.requests // BATCH, args.clients) if scenario.startswith('batch') else args.requests
+                    ids = ()
+                    if scenario == 'get pdf':
+                        connection = http.client.HTTPConnection(urlsplit(url).netloc)
+                        connection.request('GET', '/invoices?limit=1000')
+                        ids = [row['id'] for row in json.loads(connection.getresponse().read())['invoices']]
+                    run(url, scenario, args.clients, count, parties, products, ids)
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+# Per-invoice render time and PDF size with and without the shared logo cache.
+#   python -m benchmarks.bench_assets
+import time
+
+from biolume import assets, invoice
+from biolume.catalog import get_catalog
+from config import get_profile
+
+DOCUMENTS = 3
+
+
+def render(catalog, profile, count):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        pdf = invoice.generate_invoice('Benchmark Salon', 'NA', '9999999999', 'Chennai',
+                                       catalog.product_names[:5], [1] * 5, catalog, profile)
+        data = invoice.pdf_bytes(pdf)
+        timings.append(time.perf_counter() - start)
+    return timings, len(data)
+
+
+def main():
+    catalog = get_catalog()
+    print(f"{'mode':<24} {'first (ms)':>11} {'next (ms)':>10} {'size (KB)':>10}")
+    for label, cached, dpi in [('per-document decode', False, None),
+                               ('shared cache', True, None),
+                               ('shared cache, 300 dpi', True, 300)]:
+        assets.clear()
+        invoice.PDF.use_asset_cache = cached
+        profile = dict(get_profile(), image_dpi=dpi)
+        timings, size = render(catalog, profile, DOCUMENTS)
+        rest = sum(timings[1:]) / (len(timings) - 1)
+        print(f'{label:<24} {timings[0] * 1e3:>11.1f} {rest * 1e3:>10.1f} {size / 1024:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
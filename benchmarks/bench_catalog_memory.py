@@ -0,0 +1,100 @@
+# Per-process memory of the catalog: DataFrames plus record dicts (the
+# previous representation) against the column tables, read into each process
+# or memory-mapped from the shared snapshot. Several worker processes hold the
+# same catalog at once; PSS splits shared pages between them.
+#   python -m benchmarks.bench_catalog_memory
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import write_catalog
+
+PRODUCTS = 200_000
+PARTIES = 50_000
+WORKERS = 4
+MODES = ['dataframe', 'table', 'table-mmap']
+
+
+def memory_kb():
+    # (RSS, PSS) of this process in kB
+    values = {}
+    for name, key in (('/proc/self/status', 'VmRSS:'), ('/proc/self/smaps_rollup', 'Pss:')):
+        with open(name) as f:
+            for line in f:
+                if line.startswith(key):
+                    values[key] = int(line.split()[1])
+                    break
+    return values.get('VmRSS:', 0), values.get('Pss:', 0)
+
+
+def load_dataframes(pd, product_csv, party_csv):
+    # As the catalog held the masters before: typed DataFrames and a record dict per key
+    from biolume.pricing import to_paise
+
+    products = pd.read_csv(product_csv, usecols=range(6))
+    products = products.assign(**{'Price Paise': to_paise(products['Price']),
+                                  'Disc Price Paise': to_paise(products['Disc Price'])})
+    parties = pd.read_csv(party_csv, dtype=str, keep_default_na=False)
+    indexes = [{record[key]: record for record in df.to_dict('records')}
+               for df, key in ((products, 'Product Name'), (products, 'Product ID'), (parties, 'Party'))]
+    return products, parties, indexes
+
+
+def child(mode, product_csv, party_csv, snapshot_dir):
+    # Both paths load pandas; importing it before the first reading keeps it out of the delta
+    import pandas as pd
+
+    from biolume.catalog import Catalog
+
+    before, _ = memory_kb()
+    if mode == 'dataframe':
+        catalog = load_dataframes(pd, product_csv, party_csv)
+    else:
+        catalog = Catalog(product_csv, party_csv, snapshot_dir, use_mmap=mode == 'table-mmap')
+        # Touch every row, as a long-running worker eventually does
+        for name in catalog.product_names:
+            catalog.product(name)['Disc Price Paise']
+    after, _ = memory_kb()
+    print(before, after, flush=True)
+    # Measure PSS only once every worker holds its copy
+    sys.stdin.readline()
+    print(memory_kb()[1], flush=True)
+    del catalog
+
+
+def run(mode, paths):
+    command = [sys.executable, '-m', 'benchmarks.bench_catalog_memory', mode, *paths]
+    workers = [subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+               for _ in range(WORKERS)]
+    rss = [tuple(map(int, worker.stdout.readline().split())) for worker in workers]
+    for worker in workers:
+        worker.stdin.write('\n')
+        worker.stdin.flush()
+    pss = [int(worker.stdout.readline()) for worker in workers]
+    for worker in workers:
+        worker.wait()
+    return rss, pss
+
+
+def main():
+    if len(sys.argv) > 1:
+        child(*sys.argv[1:])
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        product_csv, party_csv = write_catalog(tmp, PRODUCTS, PARTIES)
+        paths = [product_csv, party_csv, tmp]
+        # Import once up front, so the workers only load the snapshots
+        subprocess.run([sys.executable, '-m', 'biolume.masters', 'import', '--products', product_csv,
+                        '--parties', party_csv, '--snapshots', tmp], check=True, stdout=subprocess.DEVNULL)
+        print(f"{PRODUCTS} products, {PARTIES} parties, {WORKERS} workers")
+        print(f"{'mode':>12} {'RSS before':>11} {'RSS after':>10} {'catalog':>9} {'PSS/worker':>11}  (MB)")
+        for mode in MODES:
+            rss, pss = run(mode, paths)
+            before = sum(b for b, _ in rss) / len(rss) / 1024
+            after = sum(a for _, a in rss) / len(rss) / 1024
+            print(f"{mode:>12} {before:>11.1f} {after:>10.1f} {after - before:>9.1f} "
+                  f"{sum(pss) / len(pss) / 1024:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Peak memory of the ledger export as the archive grows: streamed chunk by
+# chunk to a file, against the whole archive held as one bytes object (as a
+# download button needs it). Each run is a fresh process, so ru_maxrss is
+# that export's own peak.
+#   python -m benchmarks.bench_export
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SIZES = [200, 2000]
+MODES = ['stream', 'in-memory']
+
+
+def fill(path, count, seed=0):
+    from biolume.catalog import get_catalog
+    from biolume.ledger import connect, insert_invoice, invoice_record
+    from biolume.pricing import price_order
+    from config import get_profile
+
+    rng = random.Random(seed)
+    profile = get_profile()
+    catalog = get_catalog()
+    products, parties = list(catalog.product_names), list(catalog.party_names)
+    start = datetime(2026, 10, 1, 9)
+    conn = connect(path)
+    with conn:
+        for i in range(count):
+            party = catalog.party(rng.choice(parties))
+            names = rng.sample(products, rng.randint(1, min(8, len(products))))
+            quantities = [rng.randint(1, 20) for _ in names]
+            lines = catalog.resolve_lines(names)
+            totals = price_order([line['Disc Price Paise'] for line in lines], quantities, profile['rounding'])
+            insert_invoice(conn, invoice_record(party['Party'], party['GSTIN/UN'], '', party['Address'], names,
+                                                quantities, lines, totals, start + timedelta(minutes=10 * i),
+                                                f'BENCH/{i + 1:05d}', profile=profile['name']))
+    conn.close()
+
+
+def child(mode, db, output):
+    from biolume.export import iter_export
+
+    started = time.perf_counter()
+    # No saved copies: every PDF is rendered from the ledger
+    empty = os.path.join(os.path.dirname(output), 'empty')
+    chunks = iter_export(path=db, storage='segments:' + empty, invoice_dir=empty)
+    with open(output, 'wb') as f:
+        if mode == 'stream':
+            for chunk in chunks:
+                f.write(chunk)
+        else:
+            f.write(b''.join(chunks))
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, time.perf_counter() - started)
+
+
+def main():
+    if len(sys.argv) > 1:
+        child(*sys.argv[1:])
+        return
+    print(f"{'invoices':>8} {'mode':>10} {'archive MB':>11} {'peak RSS MB':>12} {'seconds':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in SIZES:
+            db = os.path.join(tmp, f'ledger-{size}.db')
+            fill(db, size)
+            for mode in MODES:
+                output = os.path.join(tmp, f'export-{size}-{mode}.zip')
+                result = subprocess.run([sys.executable, '-m', 'benchmarks.bench_export', mode, db, output],
+                                        check=True, capture_output=True, text=True)
+                peak_kb, seconds = result.stdout.split()
+                print(f"{size:>8} {mode:>10} {os.path.getsize(output) / 2**20:>11.1f} "
+                      f"{int(peak_kb) / 1024:>12.1f} {float(seconds):>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
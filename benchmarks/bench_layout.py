@@ -0,0 +1,32 @@
+# Invoices/second and PDF size with and without the compiled page layout.
+#   python -m benchmarks.bench_layout
+import time
+
+from biolume import invoice
+from biolume.catalog import get_catalog
+
+ORDERS = [(5, 300), (100, 50)]
+
+
+def render(catalog, lines, count):
+    names = (list(catalog.product_names) * (lines // len(catalog.product_names) + 1))[:lines]
+    start = time.perf_counter()
+    for _ in range(count):
+        data = invoice.pdf_bytes(invoice.generate_invoice('Benchmark Salon', 'NA', '9999999999', 'Chennai',
+                                                          names, [1] * lines, catalog))
+    return count / (time.perf_counter() - start), len(data)
+
+
+def main():
+    catalog = get_catalog()
+    print(f"{'lines':>6} {'layout':>9} {'inv/s':>8} {'KB':>8}")
+    for lines, count in ORDERS:
+        for compiled in (False, True):
+            invoice.PDF.use_compiled_layout = compiled
+            render(catalog, lines, 1)  # warm caches
+            rate, size = render(catalog, lines, count)
+            print(f"{lines:>6} {'compiled' if compiled else 'redrawn':>9} {rate:>8.1f} {size / 1024:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
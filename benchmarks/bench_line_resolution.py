@@ -0,0 +1,38 @@
+# Per-invoice line resolution cost as the catalog grows.
+#   python -m benchmarks.bench_line_resolution
+import tempfile
+import time
+
+from benchmarks.synthetic import random_order, write_catalog
+from biolume.catalog import Catalog
+
+SIZES = [100, 1000, 10000, 50000]
+ORDER_LINES = 25
+REPEAT = 50
+
+
+def masked_lookup(df, names):
+    # The previous per-line boolean mask over the whole catalog
+    return [df[df['Product Name'] == name].iloc[0] for name in names]
+
+
+def per_invoice(fn, source, names, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(source, names)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'SKUs':>8} {'mask (ms)':>12} {'index (us)':>12}")
+        for size in SIZES:
+            catalog = Catalog(*write_catalog(tmp, size, 10), snapshot_dir=tmp)
+            names, _ = random_order(catalog.product_names, ORDER_LINES)
+            masked = per_invoice(masked_lookup, catalog.products_df, names, max(1, REPEAT // 10))
+            indexed = per_invoice(Catalog.resolve_lines, catalog, names, REPEAT * 20)
+            print(f'{size:>8} {masked * 1e3:>12.2f} {indexed * 1e6:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
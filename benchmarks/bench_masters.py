@@ -0,0 +1,48 @@
+# Price list import: first import (validate + snapshot), startup from the
+# snapshot versus re-parsing the CSV, and the delta after a small price edit.
+#   python -m benchmarks.bench_masters
+import csv
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import write_products
+from biolume.masters import import_master, load_master
+
+SIZES = [10_000, 200_000]
+EDITED = 100
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def edit_prices(path, rows):
+    with open(path, newline='') as f:
+        data = list(csv.reader(f))
+    for row in data[1:rows + 1]:
+        row[3] = f'  {float(row[3]) + 1:.2f} '
+        row[5] = f'  {float(row[3]) * (100 - float(row[4])) / 100:.2f} '
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows(data)
+
+
+def main():
+    print(f"{'rows':>8} {'read_csv':>9} {'import':>9} {'snapshot':>9} {'re-import':>10}  delta")
+    for size in SIZES:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_products(f'{tmp}/products.csv', size)
+            _, parse_ms = timed(pd.read_csv, path)
+            (_, report), import_ms = timed(import_master, 'products', path, tmp)
+            _, load_ms = timed(load_master, 'products', path, tmp)
+            edit_prices(path, EDITED)
+            (_, report), reimport_ms = timed(import_master, 'products', path, tmp)
+            print(f"{size:>8} {parse_ms:>9.1f} {import_ms:>9.1f} {load_ms:>9.1f} {reimport_ms:>10.1f}  "
+                  f"{len(report.changed)} changed, {len(report.added)} added, {len(report.removed)} removed")
+
+
+if __name__ == '__main__':
+    main()
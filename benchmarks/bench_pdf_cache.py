@@ -0,0 +1,62 @@
+# Re-serving an identical invoice from the PDF cache versus rendering it again,
+# plus LRU eviction under a small budget and invalidation on a price change.
+#   python -m benchmarks.bench_pdf_cache
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import random_order, write_catalog
+from biolume.catalog import Catalog
+from biolume.invoice import generate_invoice, pdf_bytes
+from biolume.pdf_cache import PDFCache, invoice_key
+from config import get_profile
+
+COUNT = 50
+
+
+def main():
+    profile = get_profile()
+    with tempfile.TemporaryDirectory() as tmp:
+        product_csv, party_csv = write_catalog(tmp, 2000, 50)
+        catalog = Catalog(product_csv, party_csv, snapshot_dir=tmp)
+        cache = PDFCache(os.path.join(tmp, 'cache'), max_bytes=64 << 20)
+        orders = []
+        for i in range(COUNT):
+            products, quantities = random_order(catalog.product_names, 20, seed=i)
+            orders.append({'party': catalog.party_names[i % len(catalog.party_names)], 'contact': '9999999999',
+                           'products': products, 'quantities': quantities})
+
+        def serve(order):
+            key = invoice_key(order, profile, catalog)
+            data = cache.get(key)
+            if data is None:
+                party = catalog.party(order['party'])
+                data = pdf_bytes(generate_invoice(order['party'], party['GSTIN/UN'], order['contact'],
+                                                  party['Address'], order['products'], order['quantities'],
+                                                  catalog, profile))
+                cache.put(key, data)
+            return data
+
+        for label in ('miss', 'hit'):
+            start = time.perf_counter()
+            for order in orders:
+                serve(order)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>5}: {elapsed / COUNT * 1000:8.2f} ms/invoice")
+        print(f"cache holds {cache.size / 1024:.0f} KB")
+
+        # Reopening with a smaller budget evicts the least recently used entries
+        small = PDFCache(cache.directory, max_bytes=cache.size // 4)
+        kept = sum(small.get(invoice_key(order, profile, catalog)) is not None for order in orders)
+        print(f"after shrinking to {small.max_bytes / 1024:.0f} KB: {kept}/{COUNT} invoices still cached")
+
+        # Any edit to the price list changes every key
+        before = invoice_key(orders[0], profile, catalog)
+        with open(product_csv, 'a') as f:
+            f.write('\n')
+        catalog.refresh()
+        print(f"key changes after price list edit: {invoice_key(orders[0], profile, catalog) != before}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# End-to-end invoice pipeline benchmark on synthetic data of increasing size.
+#
+#   python -m benchmarks.bench_pipeline
+#   python -m benchmarks.bench_pipeline --json bench_output.json
+#
+# For each scenario it loads a synthetic catalog, then renders invoices
+# (party lookup, line resolution, pricing, PDF, output) and reports
+# invoices/second, the per-span breakdown and peak memory, so runs can be
+# compared across commits.
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import random_order, write_catalog
+from biolume.catalog import Catalog
+from biolume.invoice import generate_invoice, pdf_bytes
+from biolume.profiling import Trace, trace
+
+# (products, parties, lines per invoice, invoices)
+SCENARIOS = [
+    (100, 100, 5, 200),
+    (1000, 1000, 20, 200),
+    (10000, 5000, 50, 100),
+    (50000, 20000, 200, 25),
+]
+
+
+def _render(catalog, i, lines):
+    party_name = catalog.party_names[i % len(catalog.party_names)]
+    names, quantities = random_order(catalog.product_names, lines, seed=i)
+    party = catalog.party(party_name)
+    return pdf_bytes(generate_invoice(party_name, party['GSTIN/UN'], '9999999999', party['Address'],
+                                      names, quantities, catalog))
+
+
+def peak_memory(product_csv, party_csv, lines, invoices=5):
+    # Separate pass: tracemalloc slows allocation-heavy code too much to time under it
+    tracemalloc.start()
+    catalog = Catalog(product_csv, party_csv, snapshot_dir=os.path.dirname(product_csv))
+    for i in range(invoices):
+        _render(catalog, i, lines)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run_scenario(tmp, products, parties, lines, invoices):
+    product_csv, party_csv = write_catalog(tmp, products, parties)
+    start = time.perf_counter()
+    catalog = Catalog(product_csv, party_csv, snapshot_dir=os.path.dirname(product_csv))
+    load_seconds = time.perf_counter() - start
+
+    # Warm the shared logo cache outside the timed loop
+    _render(catalog, 0, 1)
+
+    combined = Trace('scenario')
+    start = time.perf_counter()
+    for i in range(invoices):
+        with trace('bench.invoice') as timing:
+            _render(catalog, i, lines)
+        for name, (calls, seconds) in timing.spans.items():
+            combined.add(name, seconds)
+    elapsed = time.perf_counter() - start
+    peak = peak_memory(product_csv, party_csv, lines)
+    return {
+        'products': products,
+        'parties': parties,
+        'lines': lines,
+        'invoices': invoices,
+        'catalog_load_ms': round(load_seconds * 1000, 1),
+        'invoices_per_s': round(invoices / elapsed, 1),
+        'ms_per_invoice': round(elapsed / invoices * 1000, 3),
+        'peak_traced_mb': round(peak / 2 ** 20, 1),
+        'spans_ms_per_invoice': {s['span']: round(s['ms'] / invoices, 3) for s in combined.summary()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Invoice pipeline benchmark.")
+    parser.add_argument('--json', help="write results to this file as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'products':>9} {'parties':>8} {'lines':>6} {'load ms':>8} {'inv/s':>8} {'ms/inv':>8} {'peak MB':>8}")
+        for scenario in SCENARIOS:
+            result = run_scenario(tmp, *scenario)
+            results.append(result)
+            print(f"{result['products']:>9} {result['parties']:>8} {result['lines']:>6} "
+                  f"{result['catalog_load_ms']:>8} {result['invoices_per_s']:>8} {result['ms_per_invoice']:>8} "
+                  f"{result['peak_traced_mb']:>8}")
+            spans = ', '.join(f'{k} {v}' for k, v in result['spans_ms_per_invoice'].items())
+            print(f'{"":>9} ms/invoice by span: {spans}')
+
+    # ru_maxrss is KB on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    maxrss_mb = maxrss / 2 ** 20 if sys.platform == 'darwin' else maxrss / 1024
+    print(f'process peak RSS: {maxrss_mb:.1f} MB')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'scenarios': results, 'peak_rss_mb': round(maxrss_mb, 1)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+# Throughput of the pricing engine on large orders. Its invariants are
+# checked in tests/test_pricing.py.
+#   python -m benchmarks.bench_pricing
+import random
+import time
+
+from biolume.pricing import ROUND_UP, price_order
+
+LINES = 10000
+REPEAT = 20
+
+
+def float_loop(unit_rupees, quantities):
+    # The previous per-line float arithmetic
+    total_price = 0
+    for price, qty in zip(unit_rupees, quantities):
+        total_price += price * qty
+    return total_price + total_price * 0.18
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn(*args)
+    return (time.perf_counter() - start) / REPEAT
+
+
+def main():
+    rng = random.Random(1)
+    unit = [rng.randint(1000, 150000) for _ in range(LINES)]
+    qty = [rng.randint(1, 50) for _ in range(LINES)]
+    unit_rupees = [p / 100 for p in unit]
+    engine = timed(price_order, unit, qty, ROUND_UP)
+    floats = timed(float_loop, unit_rupees, qty)
+    print(f'{LINES}-line order: engine {engine * 1e3:.2f} ms ({LINES / engine:,.0f} lines/s), '
+          f'float loop {floats * 1e3:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
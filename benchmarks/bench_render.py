@@ -0,0 +1,30 @@
+# Render time and page count of a single invoice as the order grows.
+#   python -m benchmarks.bench_render
+import tempfile
+import time
+
+from benchmarks.synthetic import random_order, write_catalog
+from biolume.catalog import Catalog
+from biolume.invoice import generate_invoice, pdf_bytes
+
+LINE_COUNTS = [10, 100, 500, 2000]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = Catalog(*write_catalog(tmp, 5000, 10), snapshot_dir=tmp)
+        # Warm the logo cache so the first row doesn't pay for it
+        pdf_bytes(generate_invoice('Warmup', 'NA', '', '', catalog.product_names[:1], [1], catalog))
+        print(f"{'lines':>6} {'pages':>6} {'ms':>9} {'us/line':>9} {'KB':>8}")
+        for count in LINE_COUNTS:
+            names, quantities = random_order(catalog.product_names, count)
+            start = time.perf_counter()
+            pdf = generate_invoice('Synthetic Distributor', 'NA', '9999999999', 'Chennai', names, quantities, catalog)
+            data = pdf_bytes(pdf)
+            elapsed = time.perf_counter() - start
+            print(f'{count:>6} {pdf.page_no():>6} {elapsed * 1e3:>9.1f} {elapsed / count * 1e6:>9.1f} '
+                  f'{len(data) / 1024:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# Report query latency over a synthetic year of invoices.
+#   python -m benchmarks.bench_reports
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from biolume import reports
+from biolume.ledger import connect, insert_invoice
+
+PARTIES = 100
+PRODUCTS = 200
+INVOICES_PER_DAY = 300
+LINES = 5
+
+
+def fill(conn, seed=0):
+    rng = random.Random(seed)
+    day = date(2025, 4, 1)
+    with conn:
+        for d in range(365):
+            invoice_date = (day + timedelta(days=d)).isoformat()
+            for _ in range(INVOICES_PER_DAY):
+                lines = []
+                for n in range(LINES):
+                    qty = rng.randint(1, 10)
+                    lines.append({'line_no': n + 1, 'product': f'Product {rng.randrange(PRODUCTS):04d}',
+                                  'quantity': qty, 'disc_price_paise': 10000, 'amount_paise': 10000 * qty})
+                total = sum(line['amount_paise'] for line in lines)
+                insert_invoice(conn, {
+                    'party': f'Salon {rng.randrange(PARTIES):04d}', 'gstin': None, 'contact': '', 'address': '',
+                    'invoice_date': invoice_date, 'created_at': invoice_date, 'total_paise': total,
+                    'tax_paise': total * 18 // 100, 'grand_total_paise': total + total * 18 // 100, 'lines': lines,
+                })
+
+
+def timed(label, fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        rows = fn()
+    print(f'{label:<40} {(time.perf_counter() - start) / repeat * 1e3:8.2f} ms  ({len(rows)} rows)')
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = connect(os.path.join(tmp, 'ledger.db'))
+        start = time.perf_counter()
+        fill(conn)
+        count = conn.execute('SELECT COUNT(*) FROM invoices').fetchone()[0]
+        print(f'{count} invoices written in {time.perf_counter() - start:.1f}s')
+        timed('revenue by party, full year', lambda: reports.revenue_by_party(conn))
+        timed('revenue for one party, one quarter',
+              lambda: reports.revenue_by_party(conn, '2025-07-01', '2025-09-30', 'Salon 0042'))
+        timed('units by product, top 20', lambda: reports.units_by_product(conn, limit=20))
+        timed('daily totals, full year', lambda: reports.daily_totals(conn))
+        timed('search invoices for one party', lambda: reports.search_invoices(conn, party='Salon 0042'))
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# Typeahead latency of the party and product search indexes at scale.
+#   python -m benchmarks.bench_search
+import random
+import time
+
+from biolume.search import SearchIndex
+
+AREAS = ['Anna Nagar', 'Tambaram', 'Adyar', 'Velachery', 'Kilpauk', 'Porur', 'Madipakkam', 'Mogappair',
+         'Koramangala', 'Indiranagar', 'Whitefield', 'Andheri', 'Bandra', 'Powai', 'Salt Lake', 'Gachibowli']
+CITIES = ['Chennai', 'Bengaluru', 'Mumbai', 'Kolkata', 'Hyderabad', 'Coimbatore', 'Madurai', 'Pune']
+BRANDS = ['McKingsTown', 'Naturals', 'Green Trends', 'Lakme', 'Toni Guy', 'Bounce', 'Limelite', 'Jawed Habib']
+CATEGORIES = ['5 - Step Facial', 'Cleanup Kit', 'Facial Kit', 'Hair Care', 'Serum', 'Mask', 'Cream']
+INGREDIENTS = ['Radiance', 'Derma', 'Lumin', 'Cobalin', 'Vitamin C', 'Charcoal', 'Gold', 'Aloe', 'Retinol',
+               'Hyaluronic', 'Niacinamide', 'Papaya', 'Saffron', 'Kojic', 'Tea Tree', 'Ceramide']
+QUERIES = {
+    'parties': ['a', 'an', 'anna nag', 'naturals porur', 'chennai', 'tambram', 'mckingstwn adyr'],
+    'products': ['s', 'se', 'serum vit', 'BTMC004217', 'niacinamde', 'facial kit gold', '8901234504217'],
+}
+
+
+def build(parties, products, seed=0):
+    rng = random.Random(seed)
+    party_names, party_fields = [], []
+    for i in range(parties):
+        name = f'{rng.choice(BRANDS)} - {rng.choice(AREAS).upper()} {i:05d}'
+        party_names.append(name)
+        party_fields.append((name, f'{rng.randint(1, 300)}, Main Road, {rng.choice(AREAS)}, {rng.choice(CITIES)}'))
+    product_names, product_fields, product_codes = [], [], []
+    for i in range(products):
+        category = rng.choice(CATEGORIES)
+        name = f'{category} - {rng.choice(INGREDIENTS)} {rng.choice(INGREDIENTS)} {i}'
+        code = f'BTMC{i:06d}'
+        product_names.append(name)
+        product_fields.append((name, code, category))
+        product_codes.append((code, f'890123450{i:04d}'))
+    return {
+        'parties': (party_names, party_fields, None),
+        'products': (product_names, product_fields, product_codes),
+    }
+
+
+def main():
+    sources = build(20_000, 50_000)
+    for kind, (names, fields, codes) in sources.items():
+        start = time.perf_counter()
+        index = SearchIndex(names, fields, codes)
+        print(f"{kind}: {len(names)} entries indexed in {(time.perf_counter() - start) * 1000:.0f} ms")
+        for query in QUERIES[kind]:
+            repeat = 200
+            start = time.perf_counter()
+            for _ in range(repeat):
+                matches = index.search(query)
+            elapsed = (time.perf_counter() - start) / repeat
+            print(f"  {query!r:>20} {elapsed * 1e6:9.1f} us  {matches[0] if matches else '-'}")
+
+
+if __name__ == '__main__':
+    main()
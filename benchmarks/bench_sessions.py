@@ -0,0 +1,202 @@
+# Load test for the Streamlit app: N concurrent sessions each search a party,
+# build a cart, generate invoices and clear the cart again, against a scratch
+# ledger and store. Reports p50/p99 latency per action, invoices/s and errors,
+# and checks that every recorded invoice number is unique and in the ledger.
+#   python -m benchmarks.bench_sessions 2>/dev/null
+#   python -m benchmarks.bench_sessions --users 16 --processes 4 --invoices 10
+#   python -m benchmarks.bench_sessions --identical    # every session bills the same orders
+#
+# Sessions are driven headless with streamlit.testing (AppTest). An AppTest
+# installs a process-wide stand-in for the Streamlit runtime while its script
+# runs, so script runs within one process take turns; the sessions of a process
+# still share its catalog, job queue and ledger connection, and invoice jobs
+# render concurrently in the background. Sessions in different processes run in
+# parallel and meet in the ledger, the store and the PDF cache.
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+INVOICE_NO = re.compile(r'Invoice (\S+) recorded')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Session:
+    """One simulated user; `steps()` performs an action per `next()` and yields whether it is only waiting."""
+
+    def __init__(self, app, user, invoices, lines, parties, products, rng, identical=False):
+        from streamlit.testing.v1 import AppTest
+
+        # Relative to the working directory, not to this file as from_file() would have it
+        self.at = AppTest.from_file(os.path.abspath(app), default_timeout=60)
+        self.user = user
+        self.invoices = invoices
+        self.lines = lines
+        self.parties = parties
+        self.products = products
+        self.rng = rng
+        self.identical = identical
+        self.latencies = {}
+        self.invoice_seconds = []
+        self.invoice_numbers = []
+        self.errors = []
+
+    def _act(self, name, step):
+        start = time.perf_counter()
+        step()
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+        messages = [str(element.value) for element in self.at.exception]
+        messages += [element.value for element in self.at.error]
+        if messages:
+            raise RuntimeError(f'{name}: {messages[0]}')
+
+    def _labelled(self, kind, label):
+        return next(element for element in getattr(self.at, kind) if element.label == label)
+
+    def steps(self):
+        at = self.at
+        try:
+            self._act('open', at.run)
+            yield False
+            for number in range(self.invoices):
+                party = self.rng.choice(self.parties)
+                self._act('search party', lambda: at.text_input[0].set_value(party).run())
+                yield False
+                self._act('select party', lambda: self._labelled('selectbox', 'Select Party').set_value(party).run())
+                yield False
+                cart = self.rng.sample(self.products, self.rng.randint(1, self.lines))
+                for _, product_id in cart:
+                    self._act('add product', lambda: at.text_input(key='product_query').set_value(product_id).run())
+                    yield False
+                contact = f'9{0 if self.identical else self.user:04d}{number:05d}'
+                self._act('contact', lambda: self._labelled('text_input', 'Enter Contact Number')
+                          .set_value(contact).run())
+                yield False
+                start = time.perf_counter()
+                self._act('generate', lambda: self._labelled('button', 'Generate Invoice').click().run())
+                while not at.get('download_button'):
+                    yield True
+                    self._act('poll', at.run)
+                self.invoice_seconds.append(time.perf_counter() - start)
+                for element in at.success:
+                    match = INVOICE_NO.search(element.value)
+                    if match:
+                        self.invoice_numbers.append(match.group(1))
+                for name, _ in cart:
+                    self._act('remove product', lambda: at.button(key=f'remove:{name}').click().run())
+                    yield False
+        except Exception as e:
+            # A failed session stops; the others carry on
+            self.errors.append(f'user {self.user}: {e}')
+
+
+def run_sessions(app, users, invoices, lines, parties, products, seed, identical):
+    # One process: round-robin over its sessions, one action at a time
+    sessions = [Session(app, user, invoices, lines, parties, products,
+                        random.Random(seed if identical else seed + user), identical) for user in users]
+    started = time.time()
+    live = [session.steps() for session in sessions]
+    while live:
+        waiting = True
+        for steps in list(live):
+            try:
+                waiting &= next(steps)
+            except StopIteration:
+                live.remove(steps)
+        if live and waiting:
+            # Every session is waiting on its invoice job
+            time.sleep(0.02)
+    latencies = {}
+    for session in sessions:
+        for name, values in session.latencies.items():
+            latencies.setdefault(name, []).extend(values)
+    return {'started': started, 'finished': time.time(), 'latencies': latencies,
+            'invoice_seconds': [s for session in sessions for s in session.invoice_seconds],
+            'invoice_numbers': [n for session in sessions for n in session.invoice_numbers],
+            'errors': [e for session in sessions for e in session.errors]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--app', default='data.py', help="Streamlit script to drive")
+    parser.add_argument('--users', type=int, default=8, help="concurrent sessions")
+    parser.add_argument('--processes', type=int, default=min(4, os.cpu_count() or 1),
+                        help="processes the sessions are spread over")
+    parser.add_argument('--invoices', type=int, default=5, help="invoices per session")
+    parser.add_argument('--lines', type=int, default=4, help="most products per cart")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--identical', action='store_true',
+                        help="every session bills the same orders (each must still get its own invoice)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench_sessions_')
+    # Before config is imported, here and in the workers
+    os.environ['BIOLUME_LEDGER_DB'] = os.path.join(tmp, 'ledger.db')
+    os.environ['BIOLUME_STORAGE'] = 'segments:' + os.path.join(tmp, 'store')
+    os.environ.setdefault('STREAMLIT_LOGGER_LEVEL', 'error')
+
+    from biolume.catalog import get_catalog
+    from biolume.inventory import Inventory
+    from biolume.ledger import connect
+    from config import LEDGER_DB
+
+    catalog = get_catalog()
+    # Parties whose addresses PyFPDF cannot encode would only measure the error path
+    parties = [name for name in catalog.party_names
+               if all(ord(ch) < 256 for ch in catalog.party(name)['Address'])]
+    products = [(name, catalog.product(name)['Product ID']) for name in catalog.product_names]
+    # Stock for every product, so no order is refused
+    inventory = Inventory(LEDGER_DB)
+    inventory.receive({product_id: 10 ** 6 for _, product_id in products})
+    inventory.close()
+
+    processes = max(1, min(args.processes, args.users))
+    groups = [list(range(args.users))[i::processes] for i in range(processes)]
+    print(f'{args.users} sessions in {processes} processes, {args.invoices} invoices each, {args.app}'
+          f"{' (identical orders)' if args.identical else ''}   ({os.cpu_count()} CPUs, scratch {tmp})")
+    with Pool(processes) as pool:
+        results = pool.starmap(run_sessions, [(args.app, users, args.invoices, args.lines, parties, products,
+                                               args.seed, args.identical) for users in groups])
+
+    elapsed = max(r['finished'] for r in results) - min(r['started'] for r in results)
+    latencies = {}
+    for result in results:
+        for name, values in result['latencies'].items():
+            latencies.setdefault(name, []).extend(values)
+    latencies['invoice (click to download)'] = [s for r in results for s in r['invoice_seconds']]
+    print(f"\n{'action':<28} {'count':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, values in latencies.items():
+        if values:
+            print(f'{name:<28} {len(values):>6} {percentile(values, 0.5) * 1e3:>8.1f} '
+                  f'{percentile(values, 0.99) * 1e3:>8.1f}')
+
+    invoices = len(latencies['invoice (click to download)'])
+    errors = [e for r in results for e in r['errors']]
+    print(f'\n{invoices} invoices in {elapsed:.1f}s: {invoices / elapsed:.1f} invoices/s, '
+          f'{len(errors)} failed sessions')
+    for error in errors:
+        print(f'  {error}')
+
+    numbers = [n for r in results for n in r['invoice_numbers']]
+    conn = connect(LEDGER_DB)
+    try:
+        recorded, distinct = conn.execute('SELECT count(*), count(DISTINCT invoice_no) FROM invoices').fetchone()
+    finally:
+        conn.close()
+    ok = len(set(numbers)) == len(numbers) and recorded == distinct and (not numbers or recorded == len(numbers))
+    print(f'{len(numbers)} invoice numbers shown, {len(set(numbers))} distinct; '
+          f"{recorded} ledger rows, {distinct} distinct: {'ok' if ok else 'MISMATCH'}")
+    if errors or not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# What saving an invoice copy costs the request that produced it, per backend:
+# a loose file per invoice (the previous INVOICE_DIR copies), a segment store
+# written inline, the S3 backend against the local stand-in with a simulated
+# round trip, and both stores behind the batching writer. Then compaction of a
+# store where half the records were overwritten.
+#   python -m benchmarks.bench_storage
+import os
+import tempfile
+import time
+
+from biolume.storage import LocalS3Client, S3Store, SegmentStore, StoreWriter
+
+COUNT = 500
+PDF_BYTES = 60_000
+# Simulated round trip to the object store
+LATENCY = 0.02
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def loose_files(directory):
+    os.makedirs(directory)
+
+    def put(key, data):
+        path = os.path.join(directory, key.replace('/', '_'))
+        with open(path + '.part', 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.part', path)
+    return put, None
+
+
+def inline(store):
+    return store.put, None
+
+
+def batched(store):
+    writer = StoreWriter(store)
+    return writer.put, writer
+
+
+def run(label, put, writer, payloads):
+    latencies = []
+    start = time.perf_counter()
+    for i, data in enumerate(payloads):
+        began = time.perf_counter()
+        put(f'invoices/{label}-{i:05d}.pdf', data)
+        latencies.append(time.perf_counter() - began)
+    if writer is not None:
+        writer.flush()
+        writer.close()
+    total = time.perf_counter() - start
+    print(f'{label:<22} {percentile(latencies, 0.5) * 1e3:>8.3f} {percentile(latencies, 0.99) * 1e3:>8.3f} '
+          f'{total:>9.2f}')
+
+
+def main():
+    payloads = [os.urandom(PDF_BYTES // 4) * 4 for _ in range(COUNT)]
+    print(f'{COUNT} invoice copies of {PDF_BYTES // 1000} kB, {LATENCY * 1e3:.0f} ms object store round trip')
+    print(f"{'backend':<22} {'p50 ms':>8} {'p99 ms':>8} {'durable s':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        s3 = LocalS3Client(os.path.join(tmp, 's3'), latency=LATENCY)
+        run('files + fsync', *loose_files(os.path.join(tmp, 'files')), payloads)
+        run('segments', *inline(SegmentStore(os.path.join(tmp, 'inline'))), payloads)
+        run('segments, batched', *batched(SegmentStore(os.path.join(tmp, 'batched'))), payloads)
+        # A tenth of the invoices, as every put waits out the full round trip
+        run('s3 stand-in', *inline(S3Store('inline', client=s3)), payloads[:COUNT // 10])
+        run('s3 stand-in, batched', *batched(S3Store('batched', client=s3)), payloads)
+
+        store = SegmentStore(os.path.join(tmp, 'compact'), segment_bytes=8 << 20)
+        for start in range(0, COUNT, 50):
+            store.put_many([(f'invoices/{i:05d}.pdf', payloads[i]) for i in range(start, start + 50)])
+        # Re-save every other invoice
+        store.put_many([(f'invoices/{i:05d}.pdf', payloads[i]) for i in range(0, COUNT, 2)])
+        dead, total = store.garbage()
+        start = time.perf_counter()
+        reclaimed = store.compact()
+        print(f'compaction: {total / 2**20:.1f} MB with {dead / 2**20:.1f} MB dead, '
+              f'{reclaimed / 2**20:.1f} MB reclaimed in {time.perf_counter() - start:.2f}s')
+        assert store.get('invoices/00002.pdf') == payloads[2] and len(store.keys('invoices/')) == COUNT
+
+
+if __name__ == '__main__':
+    main()
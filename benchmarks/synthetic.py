@@ -0,0 +1,49 @@
+import csv
+import os
+import random
+
+from biolume.masters import gstin_check_char
+
+CATEGORIES = ['5 - Step Facial', 'General', 'Cleanup Kit', 'Facial Kit', 'Hair Care']
+
+
+def write_products(path, count, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Product ID', 'Product Category', 'Product Name', 'Price', 'Discount', 'Disc Price', ''])
+        for i in range(count):
+            price = round(rng.uniform(50, 1500), 2)
+            discount = rng.choice([0, 10, 25, 50])
+            writer.writerow([
+                f'BTMC{i + 1:06d}', rng.choice(CATEGORIES), f'Synthetic Product {i + 1:06d}',
+                f'  {price:.2f} ', f'  {discount:.2f} ', f'  {price * (100 - discount) / 100:.2f} ', '',
+            ])
+    return path
+
+
+def write_parties(path, count, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Party', 'Address', 'GSTIN/UN'])
+        for i in range(count):
+            gstin = f'33AAAAA{i % 10000:04d}A1Z'
+            gstin = gstin + gstin_check_char(gstin) if rng.random() < 0.5 else 'NA'
+            writer.writerow([
+                f'Synthetic Salon {i + 1:06d}', f'{i + 1}, Main Road, Chennai, Tamil Nadu 6000{i % 100:02d}', gstin,
+            ])
+    return path
+
+
+def write_catalog(directory, products, parties, seed=0):
+    os.makedirs(directory, exist_ok=True)
+    product_csv = write_products(os.path.join(directory, f'products_{products}.csv'), products, seed)
+    party_csv = write_parties(os.path.join(directory, f'parties_{parties}.csv'), parties, seed)
+    return product_csv, party_csv
+
+
+def random_order(product_names, lines, seed=0):
+    rng = random.Random(seed)
+    names = rng.sample(product_names, min(lines, len(product_names)))
+    return names, [rng.randint(1, 20) for _ in names]
@@ -0,0 +1,5 @@
+# Invoice engine behind the Biolume billing apps.
+#
+# Submodules are imported on demand: the CLI tools (batch, ledger, reports)
+# and batch worker processes never load Streamlit, and nothing here pulls in
+# pandas or FPDF until a catalog is loaded or an invoice rendered.
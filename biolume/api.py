@@ -0,0 +1,454 @@
+# Headless HTTP API for POS and ordering systems, over the same invoice core
+# as the Streamlit apps.
+#
+#   python -m biolume.api --port 8000 --workers 4 --profile ks_ledger
+#
+#   POST /invoices         {"party": ..., "contact": ..., "products": [...], "quantities": [...]}
+#                          201 with the invoice as JSON, or the PDF itself with Accept: application/pdf
+#   POST /invoices/batch   {"orders": [order, ...]}: one result per order, recorded in one group commit
+#   GET  /invoices?party=&product=&start=&end=&limit=
+#   GET  /invoices/<id>    header and lines
+#   GET  /invoices/<id>/pdf
+#   GET  /health
+#
+# Amounts are exact integer paise, in `*_paise` fields as the ledger keeps
+# them; clients format rupees themselves.
+#
+# The parent loads the catalog and renders one throwaway invoice before it
+# forks. Every worker therefore starts with the mapped catalog, prepared
+# logos, compiled layouts and imports already in memory, shared copy-on-write.
+# Workers accept on the one listening socket and serve each connection on a
+# thread. The parent only restarts workers that die. Numbering, stock, the
+# ledger writer and storage are opened per worker after the fork. A created
+# invoice is answered once its ledger group commit is done, so an id in a
+# response can be read back from any worker.
+import argparse
+import atexit
+import gc
+import http.server
+import json
+import logging
+import os
+import re
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent import futures
+from contextlib import contextmanager
+from urllib.parse import parse_qs, quote, urlsplit
+
+from config import LEDGER_DB, PROFILES, get_profile
+
+logger = logging.getLogger('biolume.api')
+
+MAX_BODY_BYTES = 1 << 20
+BATCH_LIMIT = 100
+LIST_LIMIT = 1000
+# Seconds a stopping worker waits for requests in flight
+DRAIN_SECONDS = 10
+TOTAL_FIELDS = ('subtotal', 'cgst', 'sgst', 'igst', 'tax', 'round_off', 'grand_total')
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def _order(payload, catalog):
+    # The order dict the rest of biolume uses, or ApiError(400) naming what is wrong
+    if not isinstance(payload, dict):
+        raise ApiError(400, 'expected a JSON object')
+    party, contact = payload.get('party'), payload.get('contact') or ''
+    products, quantities = payload.get('products'), payload.get('quantities')
+    if not isinstance(party, str) or not isinstance(contact, str):
+        raise ApiError(400, 'party and contact must be strings')
+    if (not isinstance(products, list) or not isinstance(quantities, list) or not products
+            or len(products) != len(quantities) or not all(isinstance(product, str) for product in products)):
+        raise ApiError(400, 'products and quantities must be non-empty lists of the same length')
+    if not all(isinstance(quantity, int) and not isinstance(quantity, bool) and quantity > 0
+               for quantity in quantities):
+        raise ApiError(400, 'quantities must be positive integers')
+    try:
+        catalog.party(party)
+    except KeyError:
+        raise ApiError(400, f'unknown party {party!r}') from None
+    unknown = []
+    for product in products:
+        try:
+            catalog.product(product)
+        except KeyError:
+            unknown.append(product)
+    if unknown:
+        raise ApiError(400, 'unknown products', products=unknown)
+    return {'party': party, 'contact': contact, 'products': products, 'quantities': quantities}
+
+
+def _issue(order, profile, catalog):
+    # Returns (summary, PDF bytes) once the invoice is recorded
+    from .invoice import issue_invoice
+
+    pdf, data, invoice_number, recorded = issue_invoice(order, profile, catalog)
+    return _finish(order, profile, pdf, data, invoice_number, recorded)
+
+
+def _finish(order, profile, pdf, data, invoice_number, recorded):
+    from .invoice import invoice_filename, persist_invoice
+
+    invoice_id = recorded.result() if recorded is not None else None
+    file_name = invoice_filename(order['party'], invoice_number=invoice_number)
+    if profile['save_invoice_copies']:
+        persist_invoice(file_name, data)
+    summary = {'id': invoice_id, 'invoice_no': invoice_number, 'party': order['party'], 'file_name': file_name,
+               **{f'{field}_paise': int(pdf.totals[field]) for field in TOTAL_FIELDS},
+               # Unrecorded invoices are only returned, never kept
+               'pdf': f'/invoices/{invoice_id}/pdf' if invoice_id is not None else None}
+    return summary, data
+
+
+def _stock_error(exc):
+    return ApiError(409, str(exc), shortfalls={product_id: {'wanted': wanted, 'available': available}
+                                               for product_id, (wanted, available) in exc.shortfalls.items()})
+
+
+_readers = []
+_readers_lock = threading.Lock()
+
+
+@contextmanager
+def _reader():
+    # Ledger connections for queries, reused across requests in this worker
+    from .ledger import connect
+
+    with _readers_lock:
+        conn = _readers.pop() if _readers else None
+    if conn is None:
+        conn = connect(LEDGER_DB)
+    try:
+        yield conn
+    finally:
+        with _readers_lock:
+            _readers.append(conn)
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'biolume'
+    # Idle keep-alive connections are dropped after this many seconds
+    timeout = 30
+
+    ROUTES = [
+        ('GET', re.compile(r'/health'), 'health'),
+        ('GET', re.compile(r'/invoices'), 'list_invoices'),
+        ('POST', re.compile(r'/invoices'), 'create'),
+        ('POST', re.compile(r'/invoices/batch'), 'create_batch'),
+        ('GET', re.compile(r'/invoices/(\d+)'), 'get_invoice'),
+        ('GET', re.compile(r'/invoices/(\d+)/pdf'), 'get_pdf'),
+    ]
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; don't let Nagle hold the body for the client's delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        logger.debug('%s %s', self.address_string(), format % args)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        from .inventory import InsufficientStock
+
+        url = urlsplit(self.path)
+        # A request body left unread would be parsed as the next request on this connection
+        self.body_read = method != 'POST'
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        with self.server.tracking():
+            try:
+                for route_method, pattern, name in self.ROUTES:
+                    match = pattern.fullmatch(url.path.rstrip('/') or '/')
+                    if match and route_method == method:
+                        return getattr(self, name)(*match.groups())
+                if any(pattern.fullmatch(url.path.rstrip('/')) for _, pattern, _ in self.ROUTES):
+                    raise ApiError(405, f'{method} not allowed here')
+                raise ApiError(404, 'no such endpoint')
+            except ApiError as exc:
+                self.close_connection = self.close_connection or not self.body_read
+                self._json(exc.status, {'error': str(exc), **exc.details})
+            except InsufficientStock as exc:
+                error = _stock_error(exc)
+                self._json(error.status, {'error': str(error), **error.details})
+            except Exception:
+                logger.exception('%s %s failed', method, self.path)
+                self.close_connection = True
+                self._json(500, {'error': 'internal error'})
+
+    def _body(self):
+        length = self.headers.get('Content-Length', '')
+        if not length.isdigit():
+            raise ApiError(411, 'Content-Length required')
+        if int(length) > MAX_BODY_BYTES:
+            raise ApiError(413, f'request bodies are limited to {MAX_BODY_BYTES} bytes')
+        body = self.rfile.read(int(length))
+        self.body_read = True
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise ApiError(400, 'body is not valid JSON') from None
+
+    def _send(self, status, content_type, body, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status, payload):
+        self._send(status, 'application/json', json.dumps(payload, default=str).encode('utf-8'))
+
+    def _pdf(self, status, file_name, data, summary=None):
+        headers = [('Content-Disposition', f"attachment; filename*=UTF-8''{quote(file_name)}")]
+        if summary:
+            headers += [('X-Invoice-Id', str(summary['id'] or '')), ('X-Invoice-No', summary['invoice_no'] or '')]
+        self._send(status, 'application/pdf', data, headers)
+
+    def health(self):
+        self._json(200, {'status': 'ok', 'profile': self.server.profile['name'], 'pid': os.getpid()})
+
+    def create(self):
+        from .catalog import get_catalog
+
+        catalog = get_catalog()
+        order = _order(self._body(), catalog)
+        summary, data = _issue(order, self.server.profile, catalog)
+        if 'application/pdf' in self.headers.get('Accept', ''):
+            self._pdf(201, summary['file_name'], data, summary)
+        else:
+            self._json(201, summary)
+
+    def create_batch(self):
+        from .catalog import get_catalog
+        from .inventory import InsufficientStock
+        from .invoice import issue_invoice
+
+        payload = self._body()
+        orders = payload.get('orders') if isinstance(payload, dict) else None
+        if not isinstance(orders, list) or not 0 < len(orders) <= BATCH_LIMIT:
+            raise ApiError(400, f'orders must be a list of 1 to {BATCH_LIMIT} orders')
+        catalog, profile = get_catalog(), self.server.profile
+        issued = []
+        try:
+            for payload in orders:
+                try:
+                    order = _order(payload, catalog)
+                    issued.append((order, issue_invoice(order, profile, catalog)))
+                except ApiError as exc:
+                    issued.append(({'status': exc.status, 'error': str(exc), **exc.details}, None))
+                except InsufficientStock as exc:
+                    error = _stock_error(exc)
+                    issued.append(({'status': error.status, 'error': str(error), **error.details}, None))
+                except Exception:
+                    # Not issued: issue_invoice has put back its number and stock
+                    logger.exception('batch order %d failed', len(issued))
+                    issued.append(({'status': 500, 'error': 'internal error'}, None))
+            # Every recorded invoice is queued before waiting, so they share ledger commits
+            results = []
+            for index, (order, invoice) in enumerate(issued):
+                if invoice is None:
+                    results.append(order)
+                    continue
+                try:
+                    summary, _ = _finish(order, profile, *invoice)
+                except Exception:
+                    logger.exception('batch order %d failed', index)
+                    error = {'status': 500, 'error': 'internal error'}
+                    recorded = invoice[3]
+                    if recorded is not None and recorded.done() and recorded.exception() is None:
+                        # In the ledger all the same (only keeping the copy failed); not to be issued again
+                        error.update(id=recorded.result(), invoice_no=invoice[2])
+                    # An unrecorded invoice gave back its number and stock when its commit failed
+                    results.append(error)
+                else:
+                    results.append({'status': 201, **summary})
+        finally:
+            # Even on the way out, each queued invoice is recorded or given back before the response
+            futures.wait([invoice[3] for _, invoice in issued if invoice is not None and invoice[3] is not None])
+        self._json(200, {'results': results})
+
+    def list_invoices(self):
+        from .reports import search_invoices
+
+        try:
+            limit = min(int(self.query.get('limit', 100)), LIST_LIMIT)
+        except ValueError:
+            raise ApiError(400, 'limit must be an integer') from None
+        with _reader() as conn:
+            rows = search_invoices(conn, self.query.get('party'), self.query.get('product'),
+                                   self.query.get('start'), self.query.get('end'), limit)
+        self._json(200, {'invoices': rows})
+
+    def get_invoice(self, invoice_id):
+        from .export import INVOICE_COLUMNS
+        from .reports import invoice_lines
+
+        with _reader() as conn:
+            row = conn.execute(f"SELECT {', '.join(INVOICE_COLUMNS)} FROM invoices WHERE id = ?",
+                               (int(invoice_id),)).fetchone()
+            if row is None:
+                raise ApiError(404, f'no invoice {invoice_id}')
+            invoice = dict(zip(INVOICE_COLUMNS, row))
+            invoice['lines'] = invoice_lines(conn, int(invoice_id))
+        self._json(200, invoice)
+
+    def get_pdf(self, invoice_id):
+        from .export import invoice_pdf
+
+        with _reader() as conn:
+            found = invoice_pdf(conn, int(invoice_id), self.server.profile)
+        if found is None:
+            raise ApiError(404, f'no invoice {invoice_id}')
+        file_name, data, reason = found
+        if data is None:
+            raise ApiError(404, f'invoice {invoice_id} has no PDF ({reason})')
+        self._pdf(200, file_name, data)
+
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, listener, profile):
+        super().__init__(listener.getsockname()[:2], Handler, bind_and_activate=False)
+        # Every worker accepts on the parent's socket
+        self.socket.close()
+        self.socket = listener
+        self.profile = profile
+        self._active = 0
+        self._idle = threading.Condition()
+
+    @contextmanager
+    def tracking(self):
+        with self._idle:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._active -= 1
+                self._idle.notify_all()
+
+    def drain(self, timeout=DRAIN_SECONDS):
+        # Let requests in flight record their invoices before the worker exits
+        with self._idle:
+            return self._idle.wait_for(lambda: self._active == 0, timeout)
+
+    def server_close(self):
+        # The listening socket belongs to the parent
+        pass
+
+
+def warm_up(profile):
+    """Load everything a request needs, once, before the workers are forked."""
+    from . import export, inventory, ledger, numbering, reports, storage  # noqa: F401
+    from .catalog import get_catalog
+    from .invoice import generate_invoice, pdf_bytes
+
+    catalog = get_catalog()
+    party = catalog.party(catalog.party_names[0])
+    # Unnumbered and unrecorded: fills the image, layout and font caches only
+    pdf_bytes(generate_invoice(party['Party'], party['GSTIN/UN'], '', party['Address'],
+                               [catalog.product_names[0]], [1], catalog, profile))
+    return catalog
+
+
+def _run_worker(listener, profile):
+    server = Server(listener, profile)
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        if not stopping.is_set():
+            stopping.set()
+            # shutdown() waits for serve_forever, which runs on this thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    server.serve_forever()
+    if not server.drain():
+        logger.warning('worker %d stopped with requests in flight', os.getpid())
+
+
+def serve(host='127.0.0.1', port=8000, workers=None, profile=None):
+    """Pre-fork `workers` processes serving the API until SIGTERM or SIGINT."""
+    profile = profile or get_profile()
+    workers = workers or os.cpu_count() or 1
+    warm_up(profile)
+    # Keep the warm objects out of the collector, so it never writes to the shared pages
+    gc.freeze()
+    listener = socket.create_server((host, port), backlog=512)
+    # Idle workers woken for a connection another one took get EAGAIN instead of blocking
+    listener.setblocking(False)
+    children = set()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(listener, profile)
+                # Flush the ledger and storage writers, give leased numbers back
+                atexit._run_exitfuncs()
+            except BaseException:
+                logger.exception('worker %d failed', os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    print(f"Serving {profile['name']} on http://{host}:{listener.getsockname()[1]} with {workers} workers",
+          file=sys.stderr, flush=True)
+    while children:
+        pid, status = os.wait()
+        children.discard(pid)
+        if not stopping:
+            logger.warning('worker %d exited (status %d); starting another', pid, status)
+            # Don't spin if workers die straight away
+            time.sleep(0.5)
+            spawn()
+    listener.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the invoice HTTP API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--profile', choices=sorted(PROFILES), help="branding profile from config.py")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(process)d %(name)s %(message)s')
+    serve(args.host, args.port, args.workers, get_profile(args.profile))
+
+
+if __name__ == '__main__':
+    main()
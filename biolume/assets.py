@@ -0,0 +1,104 @@
+# Process-wide cache of logo images, decoded and compressed once and shared
+# by every PDF rendered in this process.
+#
+# FPDF keeps parsed images per document, so every new PDF() re-reads and
+# re-decodes the PNGs (the alpha split in PyFPDF's PNG parser is pure Python
+# and takes seconds for 10.png). Here each image is prepared once into the
+# same info dict FPDF builds for itself, optionally downscaled to the size it
+# is printed at. Pillow ships with Streamlit; without it we fall back to
+# FPDF's own parser and skip the downscale.
+import os
+import threading
+import zlib
+
+from fpdf import FPDF
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None
+
+MM_PER_INCH = 25.4
+
+_images = {}
+_lock = threading.Lock()
+
+
+def _rows(raw, row_bytes, height):
+    # Prefix every scanline with PNG filter type 0 to match /Predictor 15
+    out = bytearray()
+    for y in range(height):
+        out += b'\x00'
+        out += raw[y * row_bytes:(y + 1) * row_bytes]
+    return bytes(out)
+
+
+def _prepare_with_pillow(path, width_mm, dpi):
+    img = Image.open(path)
+    img.load()
+    has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+    if img.mode in ('L', 'LA'):
+        img = img.convert('LA' if has_alpha else 'L')
+    else:
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+
+    if width_mm and dpi:
+        target = max(1, round(width_mm / MM_PER_INCH * dpi))
+        if img.width > target:
+            height = max(1, round(img.height * target / img.width))
+            img = img.resize((target, height), Image.LANCZOS)
+
+    w, h = img.size
+    if has_alpha:
+        alpha = img.getchannel('A').tobytes()
+        img = img.convert('L' if img.mode == 'LA' else 'RGB')
+    colors = 1 if img.mode == 'L' else 3
+    info = {
+        'w': w,
+        'h': h,
+        'cs': 'DeviceGray' if colors == 1 else 'DeviceRGB',
+        'bpc': 8,
+        'f': 'FlateDecode',
+        'dp': f'/Predictor 15 /Colors {colors} /BitsPerComponent 8 /Columns {w}',
+        'pal': '',
+        'trns': '',
+        'data': zlib.compress(_rows(img.tobytes(), w * colors, h), 9),
+    }
+    if has_alpha:
+        info['smask'] = zlib.compress(_rows(alpha, w, h), 9)
+    return info
+
+
+def _prepare_with_fpdf(path):
+    ext = os.path.splitext(path)[1].lower()
+    parser = FPDF()
+    if ext in ('.jpg', '.jpeg'):
+        return parser._parsejpg(path)
+    return parser._parsepng(path)
+
+
+def prepared_image(path, width_mm=None, dpi=None):
+    """Return FPDF image info for `path`, prepared once per process.
+
+    With `width_mm` and `dpi`, images wider than needed for that print size
+    are downscaled first. Callers must copy the dict before handing it to a
+    document, since FPDF drops the image data after writing it out.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, width_mm, dpi)
+    info = _images.get(key)
+    if info is None:
+        with _lock:
+            info = _images.get(key)
+            if info is None:
+                if Image is not None:
+                    info = _prepare_with_pillow(path, width_mm, dpi)
+                else:
+                    info = _prepare_with_fpdf(path)
+                _images[key] = info
+    return info
+
+
+def clear():
+    with _lock:
+        _images.clear()
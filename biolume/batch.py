@@ -0,0 +1,255 @@
+# Headless bulk invoice generation.
+#
+#   python -m biolume.batch orders.csv --out generated_invoices/
+#   python -m biolume.batch orders.csv --out month_end.zip --workers 4 --profile mckt
+#
+# The orders file has one row per line item with `Party`, `Product` and `Qty`
+# columns (and an optional `Contact`). Rows are grouped by party, in order of
+# first appearance, and each party becomes one invoice.
+import argparse
+import csv
+import os
+import sys
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from config import PARTY_CSV, PRODUCT_CSV, PROFILES, get_profile
+
+_worker = {}
+
+
+def read_orders(path):
+    orders = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            party = row['Party'].strip()
+            order = orders.setdefault(party, {'party': party, 'contact': '', 'products': [], 'quantities': []})
+            if row.get('Contact'):
+                order['contact'] = row['Contact'].strip()
+            order['products'].append(row['Product'].strip())
+            order['quantities'].append(int(row['Qty']))
+    return list(orders.values())
+
+
+def _init_worker(product_csv, party_csv, profile):
+    # Each worker loads the catalog once and keeps it for all its jobs
+    from .catalog import get_catalog
+    _worker['catalog'] = get_catalog(product_csv, party_csv)
+    _worker['profile'] = profile
+
+
+def render_order(order, when=None, reservation=None, invoice_number=None):
+    # The PDF stack is only imported in the workers that render
+    from .invoice import generate_invoice, invoice_filename, pdf_bytes
+    from .profiling import trace
+
+    profile = _worker['profile']
+    with trace('batch.invoice', party=order['party'], lines=len(order['products'])) as timing:
+        catalog = _worker['catalog']
+        party = catalog.party(order['party'])
+        pdf = generate_invoice(order['party'], party['GSTIN/UN'], order['contact'], party['Address'],
+                               order['products'], order['quantities'], catalog, profile, invoice_number)
+        data = pdf_bytes(pdf)
+    result = {
+        'party': order['party'],
+        'invoice_no': invoice_number,
+        'file_name': invoice_filename(order['party'], when, invoice_number),
+        'pdf': data,
+        'totals': pdf.totals,
+        'seconds': timing.seconds,
+        'spans': timing.summary(),
+    }
+    if invoice_number:
+        from .ledger import invoice_record
+        # Recorded by the parent, which owns the ledger writer
+        result['ledger'] = invoice_record(order['party'], party['GSTIN/UN'], order['contact'], party['Address'],
+                                          order['products'], order['quantities'], pdf.lines, pdf.totals, when,
+                                          invoice_number, reservation, profile['name'])
+    return result
+
+
+class _DirectorySink:
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def write(self, name, data):
+        with open(os.path.join(self.path, name), 'wb') as f:
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+class _ZipSink:
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+
+    def write(self, name, data):
+        self.zip.writestr(name, data)
+
+    def close(self):
+        self.zip.close()
+
+
+def generate_batch(orders, output, workers=None, product_csv=PRODUCT_CSV, party_csv=PARTY_CSV,
+                   profile=None, on_result=None):
+    """Render every order in parallel and stream the PDFs into `output`.
+
+    `orders` is a list from `read_orders`. `output` is a directory, or a
+    `.zip` path. Returns one result per order, in the order they finish:
+    the invoice without its PDF bytes, or `{'party', 'error'}` for an order
+    that failed. One failing order does not stop the others, which are
+    still generated (and recorded). Profiles with `record_ledger` number
+    each invoice and record it in the ledger; its PDF is written only once
+    the ledger has committed it, and the number of an invoice that is not
+    recorded is given back. With
+    `track_stock` as well, stock for every order is reserved before anything
+    renders; if any order cannot be filled, InsufficientStock is raised and
+    nothing is generated.
+    """
+    profile = profile or get_profile()
+    # One timestamp for the whole run keeps file names stable across workers
+    when = datetime.now()
+    results = []
+    ledger = allocator = inventory = None
+    if profile['record_ledger']:
+        from .ledger import duplicate_number, get_ledger
+        from .numbering import get_allocator
+        ledger = get_ledger()
+        # Numbered here rather than in the workers, so a number whose invoice is not recorded goes back
+        allocator = get_allocator(profile['invoice_prefix'])
+    # order index -> reservation not yet handed to the ledger
+    reservations = {}
+    if profile['track_stock']:
+        from .catalog import get_catalog
+        from .inventory import InsufficientStock, get_inventory, order_quantities
+        inventory = get_inventory()
+        catalog = get_catalog(product_csv, party_csv)
+        wanted = [order_quantities(catalog, order['products'], order['quantities']) for order in orders]
+        # Report what the whole run is short of, not just the first order that hits it
+        shortfalls = inventory.shortfalls(sum(map(Counter, wanted), Counter()))
+        if shortfalls:
+            raise InsufficientStock(shortfalls)
+        try:
+            for index, order_wanted in enumerate(wanted):
+                reservations[index] = inventory.reserve(order_wanted)
+        except Exception:
+            for reservation in reservations.values():
+                inventory.release(reservation)
+            raise
+    # order index -> invoice number not yet handed to the ledger
+    numbers = {}
+    # (ledger Future, result, PDF bytes) in the order recorded, not yet written
+    pending = []
+    sink = _ZipSink(output) if output.endswith('.zip') else _DirectorySink(output)
+
+    def report(result):
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    def failed(party, exc):
+        report({'party': party, 'error': f'{type(exc).__name__}: {exc}'})
+
+    def unrecorded(invoice_number, reservation):
+        def callback(future):
+            if future.exception() is None:
+                return
+            # A number the ledger already holds belongs to that invoice; any other goes to the next one
+            if not duplicate_number(future.exception()):
+                allocator.release(invoice_number)
+            if reservation:
+                inventory.release(reservation)
+        return callback
+
+    def settle(wait=False):
+        # Write out each recorded invoice once its commit is done; a failed one leaves nothing behind
+        while pending and (wait or pending[0][0].done()):
+            recorded, result, data = pending.pop(0)
+            if recorded.exception() is not None:
+                failed(result['party'], recorded.exception())
+            else:
+                sink.write(result['file_name'], data)
+                report(result)
+
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(product_csv, party_csv, profile)) as pool:
+            futures = {}
+            for index, order in enumerate(orders):
+                if allocator is not None:
+                    numbers[index] = allocator.next(when)
+                futures[pool.submit(render_order, order, when, reservations.get(index), numbers.get(index))] = index
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    # Never rendered: its number and stock go to the next orders
+                    if index in numbers:
+                        allocator.release(numbers.pop(index))
+                    if index in reservations:
+                        inventory.release(reservations.pop(index))
+                    failed(orders[index]['party'], exc)
+                    continue
+                data = result.pop('pdf')
+                if ledger is None:
+                    sink.write(result['file_name'], data)
+                    report(result)
+                    continue
+                recorded = ledger.record(result.pop('ledger'))
+                recorded.add_done_callback(unrecorded(numbers.pop(index), reservations.pop(index, None)))
+                pending.append((recorded, result, data))
+                settle()
+    finally:
+        # Orders that never reached the ledger give their numbers and stock back
+        for invoice_number in numbers.values():
+            allocator.release(invoice_number)
+        for reservation in reservations.values():
+            inventory.release(reservation)
+        # Invoices already recorded are written out even when the run stops early
+        settle(wait=True)
+        sink.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate proforma invoices in bulk.")
+    parser.add_argument('orders', help="CSV with Party, Product, Qty (and optional Contact) columns")
+    parser.add_argument('--out', default='generated_invoices', help="output directory or .zip file")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--products', default=PRODUCT_CSV, help="product price list CSV")
+    parser.add_argument('--parties', default=PARTY_CSV, help="party master CSV")
+    parser.add_argument('--profile', choices=sorted(PROFILES), help="branding profile from config.py")
+    args = parser.parse_args(argv)
+
+    orders = read_orders(args.orders)
+
+    def report(result):
+        if 'error' in result:
+            print(f"  failed     {result['party']}: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{result['seconds'] * 1000:8.1f} ms  {result['file_name']}")
+
+    from .inventory import InsufficientStock
+
+    start = time.perf_counter()
+    try:
+        results = generate_batch(orders, args.out, args.workers, args.products, args.parties,
+                                 get_profile(args.profile), on_result=report)
+    except InsufficientStock as exc:
+        parser.exit(1, f"Nothing generated: {exc}\n")
+    elapsed = time.perf_counter() - start
+    failed = sum('error' in result for result in results)
+    generated = len(results) - failed
+    print(f"{generated} invoices in {elapsed:.2f}s ({generated / elapsed:.1f}/s) -> {args.out}")
+    if failed:
+        parser.exit(1, f"{failed} of {len(results)} orders failed; the others were generated\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Order cart kept across Streamlit reruns. Every edit adjusts the running
+# subtotal, and the taxable value of the line's tax class, by the changed line
+# only, so the live total costs O(1) per widget change however many lines the
+# order has. Lines whose product a reloaded price list no longer carries are
+# dropped and listed in `dropped` for the UI to report.
+from collections import Counter
+
+from .pricing import ROUND_NONE, tax_totals
+
+
+class Cart:
+    def __init__(self):
+        # product name -> quantity / line amount in paise, in selection order
+        self.quantities = {}
+        self.amounts = {}
+        self.subtotal = 0
+        # (HSN, rate_bp) -> paise
+        self.taxable = Counter()
+        self._unit_paise = {}
+        self._tax_class = {}
+        self._price_version = None
+        # Products taken out because the price list no longer has them, until the UI reports them
+        self.dropped = []
+
+    def __len__(self):
+        return len(self.quantities)
+
+    @property
+    def products(self):
+        return list(self.quantities)
+
+    def sync(self, catalog):
+        # A reloaded price list invalidates every cached unit price
+        if self._price_version == catalog.price_version:
+            return
+        self._price_version = catalog.price_version
+        self._unit_paise = {}
+        self._tax_class = {}
+        self.subtotal = 0
+        self.taxable.clear()
+        for product, quantity in list(self.quantities.items()):
+            try:
+                self._set_line(catalog, product, quantity)
+            except KeyError:
+                self.amounts.pop(product, None)
+                del self.quantities[product]
+                self.dropped.append(product)
+
+    def add(self, catalog, product, quantity=1):
+        """Append a line, or raise its quantity if the product is already in the cart."""
+        self.set_quantity(catalog, product, self.quantities.get(product, 0) + quantity)
+
+    def set_quantity(self, catalog, product, quantity):
+        self.sync(catalog)
+        if product in self.dropped:
+            return
+        self._drop_line(product)
+        self._set_line(catalog, product, quantity)
+
+    def remove(self, product):
+        self._drop_line(product)
+        self.quantities.pop(product, None)
+
+    def clear(self):
+        self.quantities.clear()
+        self.amounts.clear()
+        self.taxable.clear()
+        self.subtotal = 0
+
+    def totals(self, rounding=ROUND_NONE, interstate=False):
+        # Same grouping and rounding as the rendered invoice
+        return tax_totals({key: amount for key, amount in self.taxable.items() if amount}, rounding, interstate)
+
+    def _drop_line(self, product):
+        amount = self.amounts.pop(product, 0)
+        self.subtotal -= amount
+        if product in self._tax_class:
+            self.taxable[self._tax_class[product]] -= amount
+
+    def _set_line(self, catalog, product, quantity):
+        unit = self._unit_paise.get(product)
+        if unit is None:
+            row = catalog.product(product)
+            unit = self._unit_paise[product] = int(row['Disc Price Paise'])
+            self._tax_class[product] = catalog.tax_class(row)
+        quantity = int(quantity)
+        self.quantities[product] = quantity
+        self.amounts[product] = unit * quantity
+        self.subtotal += unit * quantity
+        self.taxable[self._tax_class[product]] += unit * quantity
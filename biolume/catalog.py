@@ -0,0 +1,158 @@
+import os
+import threading
+
+from config import CATALOG_MMAP, PARTY_CSV, PRODUCT_CSV, SNAPSHOT_DIR, TAX_CLASSES
+
+from .gst import tax_class, tax_classes_digest
+from .masters import file_signature, load_master
+from .profiling import span
+from .search import SearchIndex
+
+
+class _Master:
+    # A validated CSV snapshot, re-imported only when the CSV's contents change
+    def __init__(self, kind, path, snapshot_dir, use_mmap):
+        self.kind = kind
+        self.path = path
+        self.snapshot_dir = snapshot_dir
+        self.use_mmap = use_mmap
+        self.signature = None
+        self.digest = None
+        self.table = None
+
+    def refresh(self):
+        signature = file_signature(self.path)
+        if signature == self.signature:
+            return False
+        table = load_master(self.kind, self.path, self.snapshot_dir, self.digest, self.use_mmap)
+        self.signature = signature
+        if table is None:
+            return False
+        self.digest = table.meta['digest']
+        self.table = table
+        return True
+
+
+class Catalog:
+    # Products and parties are read-only column tables (biolume/table.py), memory-mapped
+    # from their snapshots unless use_mmap is off; lookups return `Row` views
+    def __init__(self, product_csv=PRODUCT_CSV, party_csv=PARTY_CSV, snapshot_dir=SNAPSHOT_DIR,
+                 use_mmap=CATALOG_MMAP, tax_classes=TAX_CLASSES):
+        self._products = _Master('products', product_csv, snapshot_dir, use_mmap)
+        self._parties = _Master('parties', party_csv, snapshot_dir, use_mmap)
+        self._tax_classes = tax_classes
+        self._tax_digest = tax_classes_digest(tax_classes)
+        self._lock = threading.Lock()
+        # Bumped on every price list reload so callers holding prices can tell they are stale
+        self.price_version = 0
+        self.refresh()
+
+    def refresh(self):
+        with self._lock:
+            if self._products.refresh():
+                # Typed at import, paise columns included
+                self.products = self._products.table
+                self.product_names = self.products['Product Name']
+                # One tax class per distinct category; replaced whole, so readers see one table or the other
+                self._category_tax = {category: tax_class(category, self._tax_classes)
+                                      for category in self.products['Product Category'].categories}
+                self._product_index = None
+                self.price_version += 1
+            if self._parties.refresh():
+                self.parties = self._parties.table
+                self.party_names = self.parties['Party']
+                self._party_index = None
+        return self
+
+    # DataFrame copies for reports and ad-hoc analysis; built on every access
+    @property
+    def products_df(self):
+        return self.products.to_frame()
+
+    @property
+    def parties_df(self):
+        return self.parties.to_frame()
+
+    @property
+    def digest(self):
+        # Changes whenever either CSV's contents or the tax classes change
+        return f'{self._products.digest}:{self._parties.digest}:{self._tax_digest}'
+
+    @staticmethod
+    def _lookup(table, column, value):
+        # First row with `value`, like a dict keyed on the column
+        row = table.find(column, value)
+        if row is None:
+            raise KeyError(value)
+        return row
+
+    def product(self, name):
+        return self._lookup(self.products, 'Product Name', name)
+
+    def product_by_id(self, product_id):
+        return self._lookup(self.products, 'Product ID', product_id)
+
+    def tax_class(self, product):
+        """(HSN code, GST rate in basis points) of a product row."""
+        # By the row's own category: a row read before a reload indexes the old table
+        category = product['Product Category']
+        found = self._category_tax.get(category)
+        return found if found is not None else tax_class(category, self._tax_classes)
+
+    # Search indexes are built on first use after each load; batch workers never pay for them
+    @property
+    def product_index(self):
+        with self._lock:
+            if self._product_index is None:
+                products = self.products
+                ids = products['Product ID'].tolist()
+                barcodes = products['Barcode'].tolist() if 'Barcode' in products.columns else [''] * len(products)
+                self._product_index = SearchIndex(
+                    self.product_names, list(zip(ids, products['Product Category'].tolist())),
+                    list(zip(ids, barcodes)))
+            return self._product_index
+
+    @property
+    def party_index(self):
+        with self._lock:
+            if self._party_index is None:
+                self._party_index = SearchIndex(self.party_names, [(address,) for address in self.parties['Address'].tolist()])
+            return self._party_index
+
+    def product_by_code(self, code):
+        # Product name for a typed or scanned product ID / barcode, or None
+        return self.product_index.code(code)
+
+    def search_products(self, query, limit=10):
+        with span('search.products'):
+            return self.product_index.search(query, limit)
+
+    def search_parties(self, query, limit=10):
+        with span('search.parties'):
+            return self.party_index.search(query, limit)
+
+    def party(self, name):
+        with span('party.lookup'):
+            return self._lookup(self.parties, 'Party', name)
+
+    def resolve_lines(self, product_names):
+        # Resolve a whole order with one hash-index probe per line
+        with span('lines.resolve'):
+            products = self.products
+            return [self._lookup(products, 'Product Name', name) for name in product_names]
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(product_csv=PRODUCT_CSV, party_csv=PARTY_CSV):
+    # One catalog per process and file pair; cheap stat() check on every call
+    with span('catalog.load'):
+        key = (os.path.abspath(product_csv), os.path.abspath(party_csv))
+        with _catalogs_lock:
+            catalog = _catalogs.get(key)
+            if catalog is None:
+                catalog = _catalogs[key] = Catalog(product_csv, party_csv)
+                return catalog
+        return catalog.refresh()
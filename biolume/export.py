@@ -0,0 +1,295 @@
+# Bulk export of ledger invoices as one ZIP: the PDFs plus normalized CSVs.
+#
+#   python -m biolume.export october.zip --start 2026-10-01 --end 2026-10-31
+#   python -m biolume.export - --party "McKingsTown - ADYAR (Brand Outlet)" > adyar.zip
+#
+#   for chunk in iter_export(start='2026-10-01'):   # e.g. as an HTTP response body
+#       send(chunk)
+#
+# The archive holds invoices.csv (one row per invoice), invoice_lines.csv (one
+# row per line, keyed by invoice_id) and pdf/<file> for every invoice; the
+# ledger's paise amounts are written as rupees with two decimals. It is
+# produced as a stream: zipfile writes to an unseekable sink, so each member's
+# sizes go in a data descriptor after its data and nothing is ever rewound.
+# Ledger rows are read from cursors and every PDF is yielded as soon as it is
+# added, so memory stays flat however many invoices the archive holds; all of
+# them are read in one transaction, so the CSVs and PDFs describe the same
+# invoices even while new ones are recorded. A PDF saved in storage (or in the
+# legacy INVOICE_DIR) is used as is; other invoices are rendered again from the
+# prices, quantities and date the ledger recorded, under the profile they were
+# issued with. One that does not come out at the recorded grand total is left
+# out and listed in pdf/MISSING.csv rather than shipped with different figures.
+import argparse
+import csv
+import io
+import logging
+import os
+import sys
+import time
+import zipfile
+from datetime import datetime
+
+from config import INVOICE_DIR, LEDGER_DB, PROFILES, STORAGE_URL, get_profile
+
+from .ledger import connect
+from .pricing import rupees
+from .reports import PAISE_SUFFIX, _date_filter, _where
+
+logger = logging.getLogger('biolume.export')
+
+INVOICE_COLUMNS = ['id', 'invoice_no', 'invoice_date', 'created_at', 'party', 'gstin', 'contact', 'address',
+                   'total_paise', 'tax_paise', 'grand_total_paise', 'profile']
+LINE_COLUMNS = ['line_no', 'product_id', 'product', 'quantity', 'unit_price_paise', 'discount', 'disc_price_paise',
+                'amount_paise']
+# CSV rows written between hand-offs to the consumer
+CSV_FLUSH_ROWS = 1000
+
+
+class _Sink(io.RawIOBase):
+    # Unseekable, so zipfile streams instead of seeking back to patch headers
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _RecordedPrices:
+    """Stands in for the catalog when re-rendering: lines priced as the ledger recorded them."""
+
+    def __init__(self, lines, catalog):
+        self._lines = lines
+        self._catalog = catalog
+
+    def resolve_lines(self, product_names):
+        return [{'Product ID': line['product_id'], 'Price Paise': line['unit_price_paise'],
+                 'Discount': line['discount'], 'Disc Price Paise': line['disc_price_paise']}
+                for line in self._lines]
+
+    def tax_class(self, line):
+        # The ledger keeps no tax class; use the product's current one
+        from .gst import tax_class
+        try:
+            return self._catalog.tax_class(self._catalog.product_by_id(line['Product ID']))
+        except KeyError:
+            return tax_class(None)
+
+
+def _zip_info(name, when=None):
+    info = zipfile.ZipInfo(name, (when or datetime.now()).timetuple()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    # Permissions for extracted files
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def _invoices(conn, start, end, party):
+    clauses, params = _date_filter(start, end)
+    if party:
+        clauses.append('party = ?')
+        params.append(party)
+    cursor = conn.execute(f"SELECT {', '.join(INVOICE_COLUMNS)} FROM invoices" + _where(clauses) +
+                          ' ORDER BY invoice_date, id', params)
+    for row in cursor:
+        yield dict(zip(INVOICE_COLUMNS, row))
+
+
+def _lines(conn, invoice_id):
+    cursor = conn.execute(f"SELECT {', '.join(LINE_COLUMNS)} FROM invoice_lines WHERE invoice_id = ? ORDER BY line_no",
+                          (invoice_id,))
+    return [dict(zip(LINE_COLUMNS, row)) for row in cursor]
+
+
+def _csv_member(archive, sink, name, header, rows):
+    # `*_paise` columns go out in rupees, under the name without the suffix
+    in_paise = [column.endswith(PAISE_SUFFIX) for column in header]
+    with archive.open(_zip_info(name), 'w', force_zip64=True) as member:
+        text = io.TextIOWrapper(member, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow([column.removesuffix(PAISE_SUFFIX) for column in header])
+        for count, row in enumerate(rows, 1):
+            writer.writerow([rupees(value) if paise and value is not None else value
+                             for value, paise in zip(row, in_paise)])
+            if count % CSV_FLUSH_ROWS == 0:
+                text.flush()
+                yield sink.take()
+        text.flush()
+        # Leave closing the member to the `with`
+        text.detach()
+    yield sink.take()
+
+
+def _issuing_profile(invoice, profile):
+    # Rows imported from the legacy CSV carry no profile; those and any since removed use `profile`
+    try:
+        return get_profile(invoice['profile']) if invoice['profile'] else profile
+    except KeyError:
+        return profile
+
+
+def _pdf(invoice, lines, catalog, profile, store, invoice_dir):
+    # (file name, PDF bytes or None, rendered?, why there is no PDF)
+    from .invoice import generate_invoice, invoice_filename, pdf_bytes
+    from .storage import INVOICE_PREFIX
+
+    created_at = datetime.fromisoformat(invoice['created_at'])
+    file_name = invoice_filename(invoice['party'], created_at, invoice['invoice_no'])
+    try:
+        return file_name, store.get(INVOICE_PREFIX + file_name), False, None
+    except KeyError:
+        pass
+    saved = os.path.join(invoice_dir, file_name)
+    if os.path.exists(saved):
+        with open(saved, 'rb') as f:
+            return file_name, f.read(), False, None
+    if not lines or any(line['unit_price_paise'] is None or line['disc_price_paise'] is None for line in lines):
+        # Imported from the legacy CSV, which kept no prices
+        return file_name, None, False, 'no prices'
+    try:
+        pdf = generate_invoice(invoice['party'], invoice['gstin'], invoice['contact'] or '', invoice['address'] or '',
+                               [line['product'] for line in lines], [line['quantity'] for line in lines],
+                               _RecordedPrices(lines, catalog), _issuing_profile(invoice, profile),
+                               invoice['invoice_no'], created_at)
+        data = pdf_bytes(pdf)
+    except Exception:
+        # One invoice that cannot be drawn (e.g. text outside latin-1) must not end the export
+        logger.exception('invoice %s could not be rendered', invoice['invoice_no'] or invoice['id'])
+        return file_name, None, False, 'render failed'
+    if pdf.totals['grand_total'] != invoice['grand_total_paise']:
+        # Not the document that was issued (e.g. rounded differently); better none than a wrong one
+        logger.warning('invoice %s re-renders to %s, recorded %s', invoice['invoice_no'] or invoice['id'],
+                       rupees(pdf.totals['grand_total']), rupees(invoice['grand_total_paise']))
+        return file_name, None, False, 'totals differ'
+    return file_name, data, True, None
+
+
+def invoice_pdf(conn, invoice_id, profile=None, storage=STORAGE_URL, invoice_dir=INVOICE_DIR):
+    """(file name, PDF bytes, reason) of one ledger invoice, saved or re-rendered; None if there is no such invoice.
+
+    `profile` is used for invoices recorded without one. The bytes are None
+    when the invoice can be neither found nor rendered as issued, and
+    `reason` then says why.
+    """
+    from .catalog import get_catalog
+    from .storage import get_store
+
+    row = conn.execute(f"SELECT {', '.join(INVOICE_COLUMNS)} FROM invoices WHERE id = ?", (invoice_id,)).fetchone()
+    if row is None:
+        return None
+    file_name, data, _, reason = _pdf(dict(zip(INVOICE_COLUMNS, row)), _lines(conn, invoice_id), get_catalog(),
+                                      profile or get_profile(), get_store(storage), invoice_dir)
+    return file_name, data, reason
+
+
+def iter_export(start=None, end=None, party=None, path=LEDGER_DB, profile=None, pdfs=True,
+                storage=STORAGE_URL, invoice_dir=INVOICE_DIR, stats=None):
+    """Yield the export ZIP for the matching invoices, in chunks of bytes.
+
+    `start`/`end` are inclusive YYYY-MM-DD invoice dates. `profile` renders
+    invoices recorded without one. `stats`, if given, is filled with counts
+    as the archive is produced.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(invoices=0, lines=0, pdfs=0, rendered=0, missing=0)
+    profile = profile or get_profile()
+    sink = _Sink()
+    conn = connect(path)
+    try:
+        # One read snapshot for every pass over the invoices
+        conn.execute('BEGIN')
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+            invoices = ([invoice[column] for column in INVOICE_COLUMNS]
+                        for invoice in _invoices(conn, start, end, party))
+            yield from _csv_member(archive, sink, 'invoices.csv', INVOICE_COLUMNS, invoices)
+
+            def line_rows():
+                for invoice in _invoices(conn, start, end, party):
+                    stats['invoices'] += 1
+                    for line in _lines(conn, invoice['id']):
+                        stats['lines'] += 1
+                        yield [invoice['id'], invoice['invoice_no'], invoice['invoice_date'], invoice['party'],
+                               *(line[column] for column in LINE_COLUMNS)]
+
+            yield from _csv_member(archive, sink, 'invoice_lines.csv',
+                                   ['invoice_id', 'invoice_no', 'invoice_date', 'party', *LINE_COLUMNS],
+                                   line_rows())
+            if pdfs:
+                from .catalog import get_catalog
+                from .storage import get_store
+                catalog = get_catalog()
+                store = get_store(storage)
+                missing = []
+                for invoice in _invoices(conn, start, end, party):
+                    file_name, data, rendered, reason = _pdf(invoice, _lines(conn, invoice['id']), catalog, profile,
+                                                     store, invoice_dir)
+                    if data is None:
+                        missing.append([invoice['id'], invoice['invoice_no'], file_name, reason])
+                        continue
+                    archive.writestr(_zip_info(f'pdf/{file_name}', datetime.fromisoformat(invoice['created_at'])),
+                                     data)
+                    stats['pdfs'] += 1
+                    stats['rendered'] += rendered
+                    yield sink.take()
+                stats['missing'] = len(missing)
+                if missing:
+                    yield from _csv_member(archive, sink, 'pdf/MISSING.csv',
+                                           ['invoice_id', 'invoice_no', 'file_name', 'reason'], missing)
+        # The central directory, written on close
+        yield sink.take()
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def write_export(output, **filters):
+    """Write the export to `output` ('-' for stdout); returns the counts."""
+    stats = {}
+    target = sys.stdout.buffer if output == '-' else open(output + '.part', 'wb')
+    try:
+        for chunk in iter_export(stats=stats, **filters):
+            target.write(chunk)
+    except BaseException:
+        if output != '-':
+            target.close()
+            os.remove(output + '.part')
+        raise
+    if output != '-':
+        target.close()
+        os.replace(output + '.part', output)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export ledger invoices as a ZIP of PDFs and CSVs.")
+    parser.add_argument('output', help="ZIP file to write, or - for stdout")
+    parser.add_argument('--db', default=LEDGER_DB)
+    parser.add_argument('--start', help="first invoice date, YYYY-MM-DD")
+    parser.add_argument('--end', help="last invoice date, YYYY-MM-DD")
+    parser.add_argument('--party')
+    parser.add_argument('--no-pdf', action='store_true', help="CSVs only")
+    parser.add_argument('--profile', choices=sorted(PROFILES), help="for re-rendered invoices recorded without one")
+    parser.add_argument('--storage', default=STORAGE_URL, help="where saved invoice copies are kept")
+    parser.add_argument('--invoices', default=INVOICE_DIR, help="legacy directory of invoice copies")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    stats = write_export(args.output, start=args.start, end=args.end, party=args.party, path=args.db,
+                         profile=get_profile(args.profile), pdfs=not args.no_pdf, storage=args.storage,
+                         invoice_dir=args.invoices)
+    missing = f", {stats['missing']} missing (pdf/MISSING.csv)" if stats['missing'] else ''
+    print(f"{stats['invoices']} invoices, {stats['lines']} lines, {stats['pdfs']} PDFs "
+          f"({stats['rendered']} rendered{missing}) in {time.perf_counter() - start:.1f}s -> {args.output}",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
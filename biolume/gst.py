@@ -0,0 +1,50 @@
+# GST classification: tax class per product category and place of supply per party.
+#
+#   hsn, rate_bp = tax_class('Cleanup Kit')          # ('3304', 1800)
+#   state = place_of_supply('29AAAAA0000A1Z5', '33')  # '29'
+#   is_interstate('29AAAAA0000A1Z5', '33')            # True: bill IGST
+#
+# The first two characters of a GSTIN are the registrant's state code. Parties
+# without a usable GSTIN are unregistered buyers and are treated as being in
+# the seller's state.
+import hashlib
+import json
+
+from config import DEFAULT_TAX_CLASS, TAX_CLASSES
+
+STATE_NAMES = {
+    '01': 'Jammu and Kashmir', '02': 'Himachal Pradesh', '03': 'Punjab', '04': 'Chandigarh',
+    '05': 'Uttarakhand', '06': 'Haryana', '07': 'Delhi', '08': 'Rajasthan', '09': 'Uttar Pradesh',
+    '10': 'Bihar', '11': 'Sikkim', '12': 'Arunachal Pradesh', '13': 'Nagaland', '14': 'Manipur',
+    '15': 'Mizoram', '16': 'Tripura', '17': 'Meghalaya', '18': 'Assam', '19': 'West Bengal',
+    '20': 'Jharkhand', '21': 'Odisha', '22': 'Chhattisgarh', '23': 'Madhya Pradesh', '24': 'Gujarat',
+    '26': 'Dadra and Nagar Haveli and Daman and Diu', '27': 'Maharashtra', '29': 'Karnataka', '30': 'Goa',
+    '31': 'Lakshadweep', '32': 'Kerala', '33': 'Tamil Nadu', '34': 'Puducherry',
+    '35': 'Andaman and Nicobar Islands', '36': 'Telangana', '37': 'Andhra Pradesh', '38': 'Ladakh',
+    '97': 'Other Territory',
+}
+
+
+def tax_class(category, classes=TAX_CLASSES):
+    """(HSN code, GST rate in basis points) for a product category."""
+    return tuple(classes.get(category, DEFAULT_TAX_CLASS))
+
+
+def tax_classes_digest(classes=TAX_CLASSES):
+    # Part of the catalog digest, so cached invoices follow rate changes
+    payload = json.dumps([sorted(classes.items()), DEFAULT_TAX_CLASS], default=list)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+
+def place_of_supply(gstin, home_state):
+    """State code the supply is made to: the GSTIN's, or `home_state` for unregistered parties."""
+    state = (gstin or '')[:2]
+    return state if state in STATE_NAMES else home_state
+
+
+def is_interstate(gstin, home_state):
+    return place_of_supply(gstin, home_state) != home_state
+
+
+def state_label(state):
+    return f"{STATE_NAMES.get(state, 'Unknown')} ({state})"
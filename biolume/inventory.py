@@ -0,0 +1,302 @@
+# Stock on hand per Product ID, kept next to the invoice ledger.
+#
+#   inventory = get_inventory()
+#   wanted = order_quantities(catalog, products, quantities)
+#   inventory.shortfalls(wanted)           # {product ID: (wanted, available)}
+#   reservation = inventory.reserve(wanted)  # raises InsufficientStock
+#   ... render; the ledger records the invoice with record['reservation'] ...
+#
+#   python -m biolume.inventory receive stock.csv
+#   python -m biolume.inventory low
+#
+# Every change to stock is a row in `stock_movements` (receipts, stock-take
+# adjustments, invoices); triggers fold each movement into `stock.on_hand`
+# and keep `low_stock` current, so neither the balance nor the low-stock list
+# ever rescans the history. Reading availability takes no locks. A
+# reservation is one write transaction of conditional updates that only
+# succeed while stock still covers every line, so two sessions racing for the
+# last units cannot both get them; the loser reserves nothing and is told
+# what is short. The ledger writer turns a reservation into invoice movements
+# in the same transaction that records the invoice. Reservations left by a
+# process that died are released by the next reservation on the same host.
+# A product is tracked once it has a stock row, from its first receipt,
+# stock-take or reorder level; until then it is billed without any check, so
+# a new install can invoice before its stock has been loaded.
+import argparse
+import atexit
+import csv
+import multiprocessing.util
+import os
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from config import LEDGER_DB
+
+from .ledger import LedgerTables, owner_is_dead
+
+INVENTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock (
+    product_id TEXT PRIMARY KEY,
+    on_hand INTEGER NOT NULL DEFAULT 0,
+    reserved INTEGER NOT NULL DEFAULT 0,
+    reorder_level INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+-- Signed quantities; kind is 'receipt', 'count' or 'invoice'
+CREATE TABLE IF NOT EXISTS stock_movements (
+    id INTEGER PRIMARY KEY,
+    product_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    reference TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stock_movements_product ON stock_movements(product_id, created_at);
+-- Units held for invoices being rendered; owner is host:pid
+CREATE TABLE IF NOT EXISTS stock_reservations (
+    reservation TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    owner TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (reservation, product_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_stock_reservations_owner ON stock_reservations(owner);
+-- Products at or below their reorder level, kept current by the triggers below
+CREATE TABLE IF NOT EXISTS low_stock (
+    product_id TEXT PRIMARY KEY,
+    available INTEGER NOT NULL,
+    reorder_level INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_stock_movements_balance AFTER INSERT ON stock_movements
+BEGIN
+    INSERT INTO stock (product_id, on_hand) VALUES (NEW.product_id, NEW.quantity)
+    ON CONFLICT (product_id) DO UPDATE SET on_hand = on_hand + excluded.on_hand;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_stock_low_insert AFTER INSERT ON stock
+WHEN NEW.on_hand - NEW.reserved <= NEW.reorder_level
+BEGIN
+    INSERT OR REPLACE INTO low_stock VALUES (NEW.product_id, NEW.on_hand - NEW.reserved, NEW.reorder_level);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_stock_low_update AFTER UPDATE ON stock
+BEGIN
+    DELETE FROM low_stock WHERE product_id = NEW.product_id;
+    INSERT INTO low_stock
+    SELECT NEW.product_id, NEW.on_hand - NEW.reserved, NEW.reorder_level
+    WHERE NEW.on_hand - NEW.reserved <= NEW.reorder_level;
+END;
+"""
+
+
+class InsufficientStock(Exception):
+    def __init__(self, shortfalls):
+        # product ID -> (wanted, available)
+        self.shortfalls = shortfalls
+        super().__init__('not enough stock for ' + ', '.join(
+            f'{product_id} ({wanted} wanted, {available} available)'
+            for product_id, (wanted, available) in shortfalls.items()))
+
+
+def order_quantities(catalog, products, quantities):
+    """Units wanted per Product ID; a product listed twice is summed."""
+    wanted = Counter()
+    for product, quantity in zip(products, quantities):
+        wanted[catalog.product(product)['Product ID']] += int(quantity)
+    return dict(wanted)
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+def _available(conn, product_ids):
+    # One query for the whole order; untracked products (no stock row) are left out
+    product_ids = list(product_ids)
+    return dict(conn.execute(
+        f'SELECT product_id, on_hand - reserved FROM stock WHERE product_id IN ({_placeholders(product_ids)})',
+        product_ids))
+
+
+def _shortfalls(conn, wanted):
+    available = _available(conn, wanted)
+    return {product_id: (quantity, available[product_id])
+            for product_id, quantity in wanted.items()
+            if product_id in available and quantity > available[product_id]}
+
+
+def _release(conn, reservation):
+    held = conn.execute('SELECT product_id, quantity FROM stock_reservations WHERE reservation = ?',
+                        (reservation,)).fetchall()
+    conn.executemany('UPDATE stock SET reserved = reserved - ? WHERE product_id = ?',
+                     [(quantity, product_id) for product_id, quantity in held])
+    conn.execute('DELETE FROM stock_reservations WHERE reservation = ?', (reservation,))
+
+
+def fulfil(conn, invoice, reference):
+    """Move an invoice's lines out of stock and drop its reservation.
+
+    Runs inside the ledger transaction that inserts the invoice.
+    """
+    created_at = invoice['created_at']
+    # Untracked products stay untracked rather than going negative
+    conn.executemany(
+        "INSERT INTO stock_movements (product_id, quantity, kind, reference, created_at)"
+        " SELECT ?, ?, 'invoice', ?, ? WHERE EXISTS (SELECT 1 FROM stock WHERE product_id = ?)",
+        [(line['product_id'], -line['quantity'], reference, created_at, line['product_id'])
+         for line in invoice['lines'] if line.get('product_id')])
+    _release(conn, invoice['reservation'])
+
+
+class Inventory(LedgerTables):
+    SCHEMA = INVENTORY_SCHEMA
+
+    def __init__(self, path=LEDGER_DB):
+        super().__init__(path)
+        self._lock = threading.Lock()
+
+    def available(self, product_ids):
+        """Units on hand and not reserved, per tracked Product ID."""
+        with self._lock:
+            return _available(self._connection(), product_ids)
+
+    def shortfalls(self, wanted):
+        """The lines of `wanted` ({product ID: units}) that stock cannot cover."""
+        with self._lock:
+            return _shortfalls(self._connection(), wanted)
+
+    def reserve(self, wanted):
+        """Hold `wanted` ({product ID: units}) for one invoice; returns the reservation id.
+
+        Reserves every tracked line or none, raising InsufficientStock with
+        what is short. Untracked products are not held.
+        """
+        reservation = uuid.uuid4().hex
+        with self._lock:
+            self._transaction(self._reserve, wanted, reservation)
+        return reservation
+
+    def release(self, reservation):
+        # The invoice was never recorded; its units are available again
+        with self._lock:
+            self._transaction(_release, reservation)
+
+    def low_stock(self):
+        """(product ID, available, reorder level) at or below the reorder level, emptiest first."""
+        with self._lock:
+            return self._connection().execute(
+                'SELECT product_id, available, reorder_level FROM low_stock ORDER BY available, product_id'
+            ).fetchall()
+
+    def receive(self, quantities, kind='receipt', reference=None, reorder_levels=None):
+        """Add stock, or with kind='count' set on-hand to counted quantities.
+
+        Both are recorded as movements: a count records the difference.
+        """
+        created_at = datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            self._transaction(self._receive, quantities, kind, reference, reorder_levels or {}, created_at)
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    def _reserve(self, conn, wanted, reservation):
+        self._reclaim(conn)
+        tracked = _available(conn, wanted)
+        items = sorted((product_id, quantity) for product_id, quantity in wanted.items() if product_id in tracked)
+        cursor = conn.executemany(
+            'UPDATE stock SET reserved = reserved + ? WHERE product_id = ? AND on_hand - reserved >= ?',
+            [(quantity, product_id, quantity) for product_id, quantity in items])
+        if cursor.rowcount != len(items):
+            # Some line lost to another session since the caller last looked; undo them all
+            raise InsufficientStock(_shortfalls(conn, wanted))
+        created_at = datetime.now().isoformat(timespec='seconds')
+        conn.executemany('INSERT INTO stock_reservations VALUES (?, ?, ?, ?, ?)',
+                         [(reservation, product_id, quantity, self.owner, created_at)
+                          for product_id, quantity in items])
+
+    def _receive(self, conn, quantities, kind, reference, reorder_levels, created_at):
+        if kind == 'count':
+            current = conn.execute(
+                f'SELECT product_id, on_hand FROM stock WHERE product_id IN ({_placeholders(quantities)})',
+                list(quantities)).fetchall()
+            on_hand = dict.fromkeys(quantities, 0)
+            on_hand.update(current)
+            quantities = {product_id: counted - on_hand[product_id] for product_id, counted in quantities.items()}
+        conn.executemany(
+            'INSERT INTO stock_movements (product_id, quantity, kind, reference, created_at) VALUES (?, ?, ?, ?, ?)',
+            [(product_id, quantity, kind, reference, created_at)
+             for product_id, quantity in quantities.items() if quantity])
+        conn.executemany(
+            'INSERT INTO stock (product_id, reorder_level) VALUES (?, ?)'
+            ' ON CONFLICT (product_id) DO UPDATE SET reorder_level = excluded.reorder_level',
+            list(reorder_levels.items()))
+
+    def _reclaim(self, conn):
+        owners = [owner for (owner,) in conn.execute('SELECT DISTINCT owner FROM stock_reservations')]
+        for owner in owners:
+            if owner == self.owner or not owner_is_dead(owner, self.host):
+                continue
+            for (reservation,) in conn.execute('SELECT DISTINCT reservation FROM stock_reservations WHERE owner = ?',
+                                               (owner,)).fetchall():
+                _release(conn, reservation)
+
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+def get_inventory(path=LEDGER_DB):
+    # Keyed by pid too: a forked worker must open its own connection
+    key = (os.path.abspath(path), os.getpid())
+    with _inventories_lock:
+        inventory = _inventories.get(key)
+        if inventory is None:
+            inventory = _inventories[key] = Inventory(path)
+            atexit.register(inventory.close)
+            multiprocessing.util.Finalize(inventory, inventory.close, exitpriority=10)
+        return inventory
+
+
+def read_stock(path):
+    # Product ID and Qty columns, with an optional Reorder Level
+    quantities, reorder_levels = Counter(), {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            product_id = row['Product ID'].strip()
+            quantities[product_id] += int(row['Qty'])
+            if (row.get('Reorder Level') or '').strip():
+                reorder_levels[product_id] = int(row['Reorder Level'])
+    return dict(quantities), reorder_levels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stock on hand for the invoice ledger.")
+    parser.add_argument('--db', default=LEDGER_DB)
+    sub = parser.add_subparsers(dest='command', required=True)
+    for command, text in (('receive', "add received stock from a CSV"),
+                          ('count', "set on-hand quantities from a stock-take CSV")):
+        cmd = sub.add_parser(command, help=text)
+        cmd.add_argument('csv', help="CSV with Product ID and Qty columns (and optional Reorder Level)")
+        cmd.add_argument('--reference', help="delivery note or stock-take reference")
+    sub.add_parser('low', help="list products at or below their reorder level")
+    args = parser.parse_args(argv)
+
+    inventory = Inventory(args.db)
+    try:
+        if args.command in ('receive', 'count'):
+            quantities, reorder_levels = read_stock(args.csv)
+            kind = 'count' if args.command == 'count' else 'receipt'
+            inventory.receive(quantities, kind, args.reference or os.path.basename(args.csv), reorder_levels)
+            print(f"Recorded {len(quantities)} products from {args.csv}")
+        elif args.command == 'low':
+            for product_id, available, reorder_level in inventory.low_stock():
+                print(f"{product_id:<16} {available:>6} available (reorder at {reorder_level})")
+    finally:
+        inventory.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,497 @@
+import threading
+import zlib
+from datetime import datetime
+
+from fpdf import FPDF
+
+from config import get_profile
+
+from .assets import prepared_image
+from .gst import is_interstate, place_of_supply, state_label
+from .pricing import price_order, rupees
+from .profiling import span
+
+
+# Fonts used by the static page parts. Every document registers them (and the
+# logos) first, so the /F and /I resource numbers baked into compiled layouts
+# are the same in every document.
+LAYOUT_FONTS = [('Arial', 'B', 16), ('Arial', '', 10), ('Arial', 'B', 14), ('Arial', 'I', 8)]
+LOGO_WIDTH = 33
+
+
+# Custom PDF class
+class PDF(FPDF):
+    use_asset_cache = True
+    use_compiled_layout = True
+
+    def __init__(self, profile=None):
+        super().__init__()
+        self.profile = profile or get_profile()
+        # Break pages before the footer rather than into it
+        self.set_auto_page_break(True, margin=self.h - FOOTER_TOP)
+        for family, style, size in LAYOUT_FONTS:
+            self.set_font(family, style, size)
+        for key in ('company_logo', 'photo_logo'):
+            if self.profile[key]:
+                self._register_image(self.profile[key], LOGO_WIDTH)
+        self._forget_font()
+        self.layout = compiled_layout(self.profile) if self.use_compiled_layout else None
+
+    def _forget_font(self):
+        # Make the next set_font() emit its operator even if the font is unchanged
+        self.font_family = ''
+        self.font_style = ''
+        self.font_size_pt = 0
+
+    def _register_image(self, name, w=None):
+        if name not in self.images:
+            if self.use_asset_cache:
+                # Reuse the process-wide decoded copy instead of parsing the file again
+                info = dict(prepared_image(name, w, self.profile.get('image_dpi')))
+            elif name.lower().endswith(('.jpg', '.jpeg')):
+                info = self._parsejpg(name)
+            else:
+                info = self._parsepng(name)
+            info['i'] = len(self.images) + 1
+            self.images[name] = info
+
+    def image(self, name, x=None, y=None, w=0, h=0, type='', link=''):
+        with span('pdf.image'):
+            self._register_image(name, w or None)
+            return super().image(name, x, y, w, h, type, link)
+
+    def header(self):
+        with span('pdf.header'):
+            if self.layout:
+                self.layout.place(self, 'header')
+            else:
+                self._header()
+
+    def footer(self):
+        with span('pdf.footer'):
+            if self.layout:
+                self.layout.place(self, 'footer')
+            else:
+                self._footer()
+            self.set_font('Arial', 'I', 8)
+            self.cell(0, 10, f'Page {self.page_no()}/{{nb}}', align='C')
+
+    def _header(self):
+        profile = self.profile
+        if profile['company_logo']:
+            self.image(profile['company_logo'], 10, 8, LOGO_WIDTH)
+        self.set_font('Arial', 'B', 16)
+        self.cell(0, 10, profile['company_name'], ln=True, align='C')
+        self.set_font('Arial', '', 10)
+        self.multi_cell(0, 5, profile['company_address'], align='C')
+        self.set_font('Arial', 'B', 14)
+        self.cell(0, 10, 'Proforma Invoice', ln=True, align='C')
+        self.line(10, 50, 200, 50)
+        self.ln(5)
+
+    def _footer(self):
+        profile = self.profile
+        if profile['photo_logo']:
+            self.image(profile['photo_logo'], 10, 265, LOGO_WIDTH)
+        self.set_y(-40)
+        self.set_font('Arial', 'I', 8)
+        self.multi_cell(0, 5, profile['bank_details'], align='R')
+
+    def _putimages(self):
+        super()._putimages()
+        self._layout_objects = self.layout.put(self) if self.layout else {}
+
+    def _putxobjectdict(self):
+        super()._putxobjectdict()
+        for name, n in self._layout_objects.items():
+            self._out(f'/{name} {n} 0 R')
+
+
+class CompiledLayout:
+    """Static page content of one profile, drawn once as PDF form XObjects.
+
+    Each part (page header, footer without the page number, table header row)
+    is recorded from a throwaway document. Invoices embed each part once and
+    place it on every page with a single `Do`, instead of replaying the FPDF
+    calls that drew it.
+    """
+
+    def __init__(self, profile):
+        recorder = _LayoutRecorder(profile)
+        recorder.add_page()
+        self.parts = {
+            'header': recorder.record(recorder._header),
+            # Recorded just below the header, inside the page box; placed at any y by translation
+            'table_header': recorder.record(lambda: _draw_table_header(recorder)),
+            'footer': recorder.record(recorder._footer),
+        }
+        self.size = (recorder.w_pt, recorder.h_pt)
+        self.names = {part: f'TPL{idx + 1}' for idx, part in enumerate(self.parts)}
+        self.compressed = {part: zlib.compress(ops.encode('latin-1'))
+                           for part, (ops, _, _, _) in self.parts.items()}
+
+    def place(self, pdf, part, y=None):
+        ops, start_y, end_x, end_y = self.parts[part]
+        dy = 0 if y is None else y - start_y
+        pdf._out(f'q 1 0 0 1 0 {-dy * pdf.k:.2f} cm /{self.names[part]} Do Q')
+        pdf.set_xy(end_x, end_y + dy)
+
+    def put(self, pdf):
+        # Write the form objects into `pdf`; returns {resource name: object number}
+        objects = {}
+        width, height = self.size
+        for part, (ops, _, _, _) in self.parts.items():
+            data = self.compressed[part] if pdf.compress else ops
+            filter = '/Filter /FlateDecode ' if pdf.compress else ''
+            pdf._newobj()
+            pdf._out(f'<</Type /XObject /Subtype /Form {filter}/BBox [0 0 {width:.2f} {height:.2f}]'
+                     f' /Resources 2 0 R /Length {len(data)}>>')
+            pdf._putstream(data)
+            pdf._out('endobj')
+            objects[self.names[part]] = pdf.n
+        return objects
+
+
+class _LayoutRecorder(PDF):
+    use_compiled_layout = False
+
+    def header(self):
+        pass
+
+    def footer(self):
+        pass
+
+    def record(self, draw):
+        # Returns (operators, start y, end x, end y) for whatever `draw` emits
+        self._forget_font()
+        start_y = self.y
+        offset = len(self.pages[self.page])
+        # Static parts may reach into the footer zone; never break the page
+        self.in_footer = 1
+        draw()
+        self.in_footer = 0
+        return self.pages[self.page][offset:], start_y, self.x, self.y
+
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def compiled_layout(profile):
+    key = tuple(profile.get(k) for k in ('company_name', 'company_address', 'company_logo', 'photo_logo',
+                                         'bank_details', 'image_dpi'))
+    layout = _layouts.get(key)
+    if layout is None:
+        with _layouts_lock:
+            layout = _layouts.get(key)
+            if layout is None:
+                layout = _layouts[key] = CompiledLayout(profile)
+    return layout
+
+
+# Line-item table layout (mm). Rows must end above the bank-details footer.
+FOOTER_TOP = 255
+TABLE_COLUMNS = [
+    ("S.No", 10, 'L'),
+    ("Description of Goods", 60, 'L'),
+    ("HSN/SAC", 20, 'C'),
+    ("GST Rate", 20, 'C'),
+    ("Qty", 20, 'C'),
+    ("Rate", 20, 'R'),
+    ("Disc. %", 20, 'R'),
+    ("Amount", 20, 'R'),
+]
+DESCRIPTION_COLUMN = 1
+ROW_HEIGHT = 8
+WRAP_LINE_HEIGHT = 5
+# HSN-wise tax summary below the totals, one layout per supply type; compact rows
+# so that it fits under the totals of a typical order
+HSN_ROW_HEIGHT = 6
+HSN_SUMMARY_COLUMNS = {
+    False: [("HSN/SAC", 25), ("Taxable Value", 35), ("CGST Rate", 20), ("CGST Amount", 30),
+            ("SGST Rate", 20), ("SGST Amount", 30), ("Total Tax", 30)],
+    True: [("HSN/SAC", 25), ("Taxable Value", 45), ("IGST Rate", 30), ("IGST Amount", 45), ("Total Tax", 45)],
+}
+
+
+def _draw_table_header(pdf):
+    pdf.set_fill_color(200, 220, 255)
+    pdf.set_font("Arial", 'B', 9)
+    for title, width, _ in TABLE_COLUMNS:
+        pdf.cell(width, ROW_HEIGHT, title, border=1, align='C', fill=True)
+    pdf.ln()
+
+
+def _table_header(pdf):
+    if pdf.layout:
+        pdf.layout.place(pdf, 'table_header', pdf.get_y())
+    else:
+        _draw_table_header(pdf)
+    pdf.set_font("Arial", '', 9)
+
+
+def _subtotal_row(pdf, label, paise):
+    amount_width = TABLE_COLUMNS[-1][1]
+    label_width = sum(width for _, width, _ in TABLE_COLUMNS) - amount_width
+    pdf.set_font("Arial", 'I', 9)
+    pdf.cell(label_width, ROW_HEIGHT, label, border=1, align='R')
+    pdf.cell(amount_width, ROW_HEIGHT, rupees(paise), border=1, align='R')
+    pdf.ln()
+    pdf.set_font("Arial", '', 9)
+
+
+def _draw_row(pdf, row, wrapped, height):
+    x, y = pdf.get_x(), pdf.get_y()
+    for col, (text, (_, width, align)) in enumerate(zip(row, TABLE_COLUMNS)):
+        if col == DESCRIPTION_COLUMN and len(wrapped) > 1:
+            pdf.rect(x, y, width, height)
+            pdf.set_xy(x, y + (height - len(wrapped) * WRAP_LINE_HEIGHT) / 2)
+            for text_line in wrapped:
+                pdf.set_x(x)
+                pdf.cell(width, WRAP_LINE_HEIGHT, text_line)
+                pdf.ln(WRAP_LINE_HEIGHT)
+            pdf.set_xy(x + width, y)
+        else:
+            pdf.cell(width, height, text, border=1, align=align)
+        x += width
+    pdf.set_xy(pdf.l_margin, y + height)
+
+
+def draw_line_items(pdf, rows, line_amounts):
+    """Draw the line-item table, continuing onto new pages as needed.
+
+    Long product names wrap inside their cell. Before the footer zone the
+    table breaks with a "Carried forward" subtotal, and each continuation
+    page repeats the column header and a "Brought forward" row.
+    """
+    description_width = TABLE_COLUMNS[DESCRIPTION_COLUMN][1]
+    _table_header(pdf)
+    running = 0
+    for row, amount in zip(rows, line_amounts):
+        wrapped = [row[DESCRIPTION_COLUMN]]
+        if pdf.get_string_width(row[DESCRIPTION_COLUMN]) > description_width - 2:
+            wrapped = pdf.multi_cell(description_width, WRAP_LINE_HEIGHT, row[DESCRIPTION_COLUMN],
+                                     split_only=True)
+        height = max(ROW_HEIGHT, len(wrapped) * WRAP_LINE_HEIGHT)
+        # Leave room for this row plus the carried-forward row
+        if pdf.get_y() + height + ROW_HEIGHT > FOOTER_TOP:
+            _subtotal_row(pdf, "Carried forward", running)
+            pdf.add_page()
+            _table_header(pdf)
+            _subtotal_row(pdf, "Brought forward", running)
+        _draw_row(pdf, row, wrapped, height)
+        running += amount
+
+
+def _rate(rate_bp):
+    return f"{rate_bp / 100:g}%"
+
+
+def _hsn_summary_cells(group, interstate):
+    if interstate:
+        return [group['hsn'] or '', rupees(group['taxable']), _rate(group['rate_bp']), rupees(group['igst']),
+                rupees(group['tax'])]
+    half = _rate(group['rate_bp'] / 2)
+    return [group['hsn'] or '', rupees(group['taxable']), half, rupees(group['cgst']), half, rupees(group['sgst']),
+            rupees(group['tax'])]
+
+
+def totals_height(totals):
+    # The gap above, CGST and SGST (or IGST), Round Off when there is one, and Grand Total
+    rows = (1 if totals['interstate'] else 2) + (1 if totals['round_off'] else 0) + 1
+    return 5 + 10 * rows
+
+
+def hsn_summary_height(totals):
+    # Header, one row per tax class and the total row
+    return HSN_ROW_HEIGHT * (len(totals['tax_groups']) + 2)
+
+
+def draw_hsn_summary(pdf, totals):
+    """HSN-wise taxable value and tax, one row per tax class plus a total row."""
+    interstate = totals['interstate']
+    columns = HSN_SUMMARY_COLUMNS[interstate]
+    groups = totals['tax_groups']
+    if pdf.get_y() + hsn_summary_height(totals) > FOOTER_TOP:
+        pdf.add_page()
+    pdf.set_fill_color(200, 220, 255)
+    pdf.set_font("Arial", 'B', 9)
+    for title, width in columns:
+        pdf.cell(width, HSN_ROW_HEIGHT, title, border=1, align='C', fill=True)
+    pdf.ln()
+    pdf.set_font("Arial", '', 9)
+    rows = [_hsn_summary_cells(group, interstate) for group in groups]
+    if interstate:
+        total = ["Total", rupees(totals['subtotal']), "", rupees(totals['igst']), rupees(totals['tax'])]
+    else:
+        total = ["Total", rupees(totals['subtotal']), "", rupees(totals['cgst']), "", rupees(totals['sgst']),
+                 rupees(totals['tax'])]
+    for row in rows + [total]:
+        if row is total:
+            pdf.set_font("Arial", 'B', 9)
+        for col, (text, (_, width)) in enumerate(zip(row, columns)):
+            pdf.cell(width, HSN_ROW_HEIGHT, text, border=1, align='R' if col else 'L')
+        pdf.ln()
+
+
+# Generate Invoice
+def generate_invoice(customer_name, gst_number, contact_number, address, selected_products, quantities,
+                     catalog, profile=None, invoice_number=None, when=None):
+    # `when` dates a re-rendered invoice; new invoices are dated now
+    profile = profile or get_profile()
+    pdf = PDF(profile)
+    pdf.alias_nb_pages()
+    pdf.add_page()
+    current_date = (when or datetime.now()).strftime("%d-%m-%Y")
+
+    pdf.set_font("Arial", '', 10)
+    if invoice_number:
+        pdf.cell(0, 10, f"Invoice No: {invoice_number}", ln=True, align='R')
+    pdf.cell(100, 10, f"Party: {customer_name}")
+    pdf.cell(90, 10, f"Date: {current_date}", ln=True, align='R')
+    # Unregistered parties have no GSTIN
+    pdf.cell(100, 10, f"GSTIN/UN: {gst_number or 'NA'}")
+    pdf.cell(90, 10, f"Contact: {contact_number}", ln=True, align='R')
+
+    state = place_of_supply(gst_number, profile['state_code'])
+    pdf.cell(100, 10, "Address: ")
+    pdf.cell(90, 10, f"Place of Supply: {state_label(state)}", ln=True, align='R')
+    pdf.set_font("Arial", '', 9)
+    pdf.multi_cell(0, 10, address)
+
+    pdf.ln(10)
+
+    lines = catalog.resolve_lines(selected_products)
+    with span('pricing'):
+        # Tax classes were resolved per category when the catalog loaded
+        tax_classes = [catalog.tax_class(line) for line in lines]
+        totals = price_order([line['Disc Price Paise'] for line in lines], quantities, profile['rounding'],
+                             [rate for _, rate in tax_classes], [hsn for hsn, _ in tax_classes],
+                             is_interstate(gst_number, profile['state_code']))
+    rows = [
+        [str(idx + 1), product, hsn, _rate(rate_bp), str(quantities[idx]), rupees(product_data['Price Paise']),
+         f"{float(product_data['Discount']):.1f}%", rupees(totals['line_amounts'][idx])]
+        for idx, (product, product_data, (hsn, rate_bp)) in enumerate(zip(selected_products, lines, tax_classes))
+    ]
+    with span('pdf.table'):
+        draw_line_items(pdf, rows, totals['line_amounts'])
+
+    # Keep the totals block whole above the footer; the HSN summary moves on by itself if it must
+    if pdf.get_y() + totals_height(totals) > FOOTER_TOP:
+        pdf.add_page()
+    pdf.ln(5)
+    # Rates go in the labels only when the whole order has one; the HSN summary has them per class
+    rate_bp = totals['gst_rate_bp']
+    if totals['interstate']:
+        tax_rows = [("IGST" + (f" ({_rate(rate_bp)})" if rate_bp is not None else ""), totals['igst'])]
+    else:
+        half = f" ({_rate(rate_bp / 2)})" if rate_bp is not None else ""
+        tax_rows = [(f"CGST{half}", totals['cgst']), (f"SGST{half}", totals['sgst'])]
+
+    pdf.set_font("Arial", 'B', 10)
+    for label, amount in tax_rows:
+        pdf.cell(160, 10, label, border=0, align='R')
+        pdf.cell(30, 10, rupees(amount), border=1, align='R')
+        pdf.ln()
+    if totals['round_off']:
+        pdf.cell(160, 10, "Round Off", border=0, align='R')
+        pdf.cell(30, 10, rupees(totals['round_off']), border=1, align='R')
+        pdf.ln()
+    pdf.cell(160, 10, "Grand Total", border=0, align='R')
+    pdf.cell(30, 10, f"{rupees(totals['grand_total'])} INR", border=1, align='R')
+    pdf.ln(5)
+    with span('pdf.hsn_summary'):
+        draw_hsn_summary(pdf, totals)
+    pdf.ln(10)
+
+    pdf.lines = lines
+    pdf.totals = totals
+    return pdf
+
+
+def issue_invoice(order, profile, catalog, report=None):
+    """Render an order; ledger profiles also number it, reserve its stock and record it.
+
+    `order` has party, contact, products and quantities. Returns the PDF, its
+    bytes, the invoice number (None when unnumbered) and the ledger Future
+    (None when not recorded). The invoice is issued only once that Future
+    succeeds; if the commit fails, its number and stock are given back and
+    the Future raises. With `track_stock`, InsufficientStock is raised before
+    a number is used.
+    """
+    report = report or (lambda progress, stage: None)
+    party, products, quantities = order['party'], order['products'], order['quantities']
+    party_details = catalog.party(party)
+    gst_number, address = party_details['GSTIN/UN'], party_details['Address']
+    if not profile['record_ledger']:
+        pdf = generate_invoice(party, gst_number, order['contact'], address,
+                               products, quantities, catalog, profile)
+        report(0.8, 'Writing PDF')
+        # Render straight to memory; no temp file in the working directory
+        return pdf, pdf_bytes(pdf), None, None
+
+    from .ledger import duplicate_number, get_ledger, invoice_record
+    from .numbering import get_allocator
+    reservation = None
+    if profile['track_stock']:
+        from .inventory import get_inventory, order_quantities
+        # Before numbering, so an order that cannot be filled uses no number
+        with span('stock.reserve'):
+            inventory = get_inventory()
+            reservation = inventory.reserve(order_quantities(catalog, products, quantities))
+    with span('invoice.number'):
+        allocator = get_allocator(profile['invoice_prefix'])
+        invoice_number = allocator.next()
+    try:
+        pdf = generate_invoice(party, gst_number, order['contact'], address,
+                               products, quantities, catalog, profile, invoice_number)
+        report(0.8, 'Writing PDF')
+        pdf_data = pdf_bytes(pdf)
+    except Exception:
+        # Never issued, so the number goes to the next invoice and the stock back on the shelf
+        allocator.release(invoice_number)
+        if reservation:
+            inventory.release(reservation)
+        raise
+    report(0.9, 'Recording in ledger')
+    # Record the invoice in the ledger (committed in the background)
+    with span('ledger.write'):
+        recorded = get_ledger().record(invoice_record(party, gst_number, order['contact'], address, products,
+                                                      quantities, pdf.lines, pdf.totals, invoice_no=invoice_number,
+                                                      reservation=reservation, profile=profile['name']))
+
+    def unrecorded(future):
+        if future.exception() is None:
+            return
+        # A number the ledger already holds belongs to that invoice; any other goes to the next one
+        if not duplicate_number(future.exception()):
+            allocator.release(invoice_number)
+        if reservation:
+            inventory.release(reservation)
+
+    recorded.add_done_callback(unrecorded)
+    return pdf, pdf_data, invoice_number, recorded
+
+
+def invoice_filename(party, when=None, invoice_number=None):
+    # Numbered invoices are unique by number; unnumbered ones fall back to the timestamp
+    if invoice_number:
+        suffix = invoice_number.replace('/', '-')
+    else:
+        suffix = (when or datetime.now()).strftime('%Y%m%d%H%M%S')
+    return f"invoice_{party.replace('/', '-')}_{suffix}.pdf"
+
+
+def pdf_bytes(pdf):
+    # PyFPDF returns a latin-1 str for dest='S', fpdf2 returns a bytearray
+    with span('pdf.output'):
+        data = pdf.output(dest='S')
+    if isinstance(data, str):
+        data = data.encode('latin-1')
+    return bytes(data)
+
+
+def persist_invoice(file_name, data, writer=None):
+    # Save a copy of a rendered invoice off the request path (see biolume/storage.py); returns a Future
+    from .storage import INVOICE_PREFIX, get_writer
+    return (writer or get_writer()).put(INVOICE_PREFIX + file_name, data)
@@ -0,0 +1,114 @@
+# Background invoice rendering for the Streamlit apps.
+#
+#   queue = get_job_queue()
+#   job = queue.submit(key, render, order)   # returns at once
+#   queue.get(job.id).status                 # 'queued', 'running', 'done' or 'failed'
+#
+# `render` runs on a worker thread and receives the job as its first argument
+# so it can report progress. Submitting a key that is already queued, running
+# or done returns the existing job, so a double-clicked button renders once.
+import hashlib
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def idempotency_key(profile_name, order, day=None):
+    """Key identifying an invoice: profile, party, contact, lines and day."""
+    normalized = {
+        'profile': profile_name,
+        'party': order['party'],
+        'contact': order['contact'].strip(),
+        'lines': [[product, int(qty)] for product, qty in zip(order['products'], order['quantities'])],
+        'day': (day or date.today()).isoformat(),
+    }
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class Job:
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.stage = 'Queued'
+        self.result = None
+        self.error = None
+
+    def report(self, progress, stage):
+        self.progress = progress
+        self.stage = stage
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+
+class JobQueue:
+    def __init__(self, workers=2, keep=256):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='invoice-job')
+        self._lock = threading.Lock()
+        # Oldest first; finished jobs beyond `keep` are forgotten
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self.keep = keep
+
+    def submit(self, key, fn, *args):
+        with self._lock:
+            job = self._by_key.get(key)
+            if job is not None and job.status != FAILED:
+                return job
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+            self._evict()
+        self._pool.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def _run(self, job, fn, args):
+        job.status = RUNNING
+        job.report(0.05, 'Rendering')
+        try:
+            job.result = fn(job, *args)
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+            job.stage = 'Failed'
+        else:
+            job.report(1.0, 'Done')
+            job.status = DONE
+
+    def _evict(self):
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    # Shared by every session in the process
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
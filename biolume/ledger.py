@@ -0,0 +1,423 @@
+# Invoice ledger in an embedded SQLite database (WAL mode).
+#
+# Every invoice is one row in `invoices` plus one row per product in
+# `invoice_lines`. Writes go through a single writer thread per process that
+# commits whatever has queued up in one transaction, so a burst of invoices
+# costs one fsync instead of one per invoice. Other processes share the same
+# file through SQLite's own locking. Amounts are stored as INTEGER paise, as
+# biolume/pricing.py computes them, so the aggregates add up exactly; they
+# become rupees only when displayed or exported.
+#
+#   python -m biolume.ledger import data/invoices.csv
+import argparse
+import atexit
+import csv
+import hashlib
+import json
+import logging
+import math
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from config import INVOICES_CSV, LEDGER_BACKUP, LEDGER_DB
+
+logger = logging.getLogger('biolume.timing')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY,
+    invoice_no TEXT,
+    party TEXT NOT NULL,
+    gstin TEXT,
+    contact TEXT,
+    address TEXT,
+    invoice_date TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    total_paise INTEGER NOT NULL,
+    tax_paise INTEGER NOT NULL,
+    grand_total_paise INTEGER NOT NULL,
+    profile TEXT
+);
+CREATE TABLE IF NOT EXISTS invoice_lines (
+    invoice_id INTEGER NOT NULL REFERENCES invoices(id),
+    line_no INTEGER NOT NULL,
+    product_id TEXT,
+    product TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price_paise INTEGER,
+    discount REAL,
+    disc_price_paise INTEGER,
+    amount_paise INTEGER,
+    PRIMARY KEY (invoice_id, line_no)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_invoices_number ON invoices(invoice_no);
+CREATE INDEX IF NOT EXISTS idx_invoices_party ON invoices(party, invoice_date);
+CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(invoice_date);
+CREATE INDEX IF NOT EXISTS idx_invoice_lines_product ON invoice_lines(product);
+CREATE TABLE IF NOT EXISTS ledger_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- Reporting aggregates, kept current by the triggers below
+CREATE TABLE IF NOT EXISTS daily_totals (
+    invoice_date TEXT PRIMARY KEY,
+    invoices INTEGER NOT NULL,
+    total_paise INTEGER NOT NULL,
+    tax_paise INTEGER NOT NULL,
+    grand_total_paise INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_party_totals (
+    invoice_date TEXT NOT NULL,
+    party TEXT NOT NULL,
+    invoices INTEGER NOT NULL,
+    total_paise INTEGER NOT NULL,
+    tax_paise INTEGER NOT NULL,
+    grand_total_paise INTEGER NOT NULL,
+    PRIMARY KEY (party, invoice_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_product_totals (
+    invoice_date TEXT NOT NULL,
+    product TEXT NOT NULL,
+    units INTEGER NOT NULL,
+    amount_paise INTEGER NOT NULL,
+    PRIMARY KEY (product, invoice_date)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_invoices_aggregate AFTER INSERT ON invoices
+BEGIN
+    INSERT INTO daily_totals VALUES (NEW.invoice_date, 1, NEW.total_paise, NEW.tax_paise, NEW.grand_total_paise)
+    ON CONFLICT (invoice_date) DO UPDATE SET
+        invoices = invoices + 1,
+        total_paise = total_paise + excluded.total_paise,
+        tax_paise = tax_paise + excluded.tax_paise,
+        grand_total_paise = grand_total_paise + excluded.grand_total_paise;
+    INSERT INTO daily_party_totals
+    VALUES (NEW.invoice_date, NEW.party, 1, NEW.total_paise, NEW.tax_paise, NEW.grand_total_paise)
+    ON CONFLICT (party, invoice_date) DO UPDATE SET
+        invoices = invoices + 1,
+        total_paise = total_paise + excluded.total_paise,
+        tax_paise = tax_paise + excluded.tax_paise,
+        grand_total_paise = grand_total_paise + excluded.grand_total_paise;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_invoice_lines_aggregate AFTER INSERT ON invoice_lines
+BEGIN
+    INSERT INTO daily_product_totals
+    VALUES ((SELECT invoice_date FROM invoices WHERE id = NEW.invoice_id), NEW.product,
+            NEW.quantity, COALESCE(NEW.amount_paise, 0))
+    ON CONFLICT (product, invoice_date) DO UPDATE SET
+        units = units + excluded.units,
+        amount_paise = amount_paise + excluded.amount_paise;
+END;
+"""
+
+
+def connect(path=LEDGER_DB):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def owner_is_dead(owner, host):
+    """Whether `owner` (host:pid) is a process on `host` that has exited."""
+    owner_host, _, pid = owner.rpartition(':')
+    if owner_host != host:
+        # Another machine's process; only it can tell whether it is still running
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class LedgerTables:
+    """Tables a component keeps next to the invoices (numbering, stock), over its own connection.
+
+    Subclasses set SCHEMA and write in `_transaction`. `owner` (host:pid)
+    tags what this process holds, so that another process can give it back
+    once `owner_is_dead`.
+    """
+
+    SCHEMA = ''
+
+    def __init__(self, path=LEDGER_DB):
+        self.path = path
+        self.host = socket.gethostname()
+        self.owner = f'{self.host}:{os.getpid()}'
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.executescript(self.SCHEMA)
+            # Explicit BEGIN IMMEDIATE below; readers in other processes keep going under WAL
+            self._conn.isolation_level = None
+        return self._conn
+
+    def _transaction(self, fn, *args):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn(conn, *args)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def _disconnect(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _clean(value):
+    # Catalog snapshots leave empty cells as '' (older pandas loads gave NaN)
+    if value == '' or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+
+def duplicate_number(exc):
+    # The commit failed because another invoice already has this number
+    return isinstance(exc, sqlite3.IntegrityError) and 'invoices.invoice_no' in str(exc)
+
+
+def invoice_record(party, gstin, contact, address, selected_products, quantities, lines, totals, when=None,
+                   invoice_no=None, reservation=None, profile=None):
+    when = when or datetime.now()
+    record_lines = []
+    for idx, (product, product_data, quantity) in enumerate(zip(selected_products, lines, quantities)):
+        record_lines.append({
+            'line_no': idx + 1,
+            'product_id': product_data.get('Product ID'),
+            'product': product,
+            'quantity': int(quantity),
+            'unit_price_paise': int(product_data['Price Paise']),
+            'discount': float(product_data['Discount']),
+            'disc_price_paise': int(product_data['Disc Price Paise']),
+            'amount_paise': int(totals['line_amounts'][idx]),
+        })
+    return {
+        'invoice_no': invoice_no,
+        'party': party,
+        'gstin': _clean(gstin),
+        'contact': contact,
+        'address': _clean(address),
+        'invoice_date': when.strftime('%Y-%m-%d'),
+        'created_at': when.isoformat(timespec='seconds'),
+        'total_paise': int(totals['subtotal']),
+        'tax_paise': int(totals['tax']),
+        'grand_total_paise': int(totals['grand_total']),
+        'lines': record_lines,
+        # The profile the invoice was issued under, to draw it again the same way (biolume/export.py)
+        'profile': profile,
+        # Stock held for this invoice (biolume/inventory.py), taken out when it is recorded
+        'reservation': reservation,
+    }
+
+
+def insert_invoice(conn, invoice):
+    # `id` is only set when restoring a backup (see biolume/storage.py); otherwise SQLite assigns it
+    cur = conn.execute(
+        'INSERT INTO invoices (id, invoice_no, party, gstin, contact, address, invoice_date, created_at,'
+        ' total_paise, tax_paise, grand_total_paise, profile) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (invoice.get('id'), invoice.get('invoice_no'), invoice['party'], invoice['gstin'], invoice['contact'],
+         invoice['address'], invoice['invoice_date'], invoice['created_at'], invoice['total_paise'],
+         invoice['tax_paise'], invoice['grand_total_paise'], invoice.get('profile')))
+    invoice_id = cur.lastrowid
+    conn.executemany(
+        'INSERT INTO invoice_lines (invoice_id, line_no, product_id, product, quantity, unit_price_paise,'
+        ' discount, disc_price_paise, amount_paise) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(invoice_id, line['line_no'], line.get('product_id'), line['product'], line['quantity'],
+          line.get('unit_price_paise'), line.get('discount'), line.get('disc_price_paise'),
+          line.get('amount_paise'))
+         for line in invoice['lines']])
+    if invoice.get('reservation'):
+        from .inventory import fulfil
+        # Stock leaves with the invoice, in the same transaction
+        fulfil(conn, invoice, invoice.get('invoice_no') or str(invoice_id))
+    return invoice_id
+
+
+class Ledger:
+    def __init__(self, path=LEDGER_DB, batch_size=200, backup=None):
+        self.path = path
+        self.batch_size = batch_size
+        # StoreWriter that receives a copy of every commit (see biolume/storage.py)
+        self.backup = backup
+        connect(path).close()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='ledger-writer', daemon=True)
+        self._thread.start()
+
+    def record(self, invoice):
+        # Queue an invoice for the next group commit; the Future yields its id
+        future = Future()
+        self._queue.put((invoice, future))
+        return future
+
+    def connect(self):
+        return connect(self.path)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        conn = connect(self.path)
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self._commit(conn, batch)
+        conn.close()
+
+    def _commit(self, conn, batch):
+        start = time.perf_counter()
+        try:
+            with conn:
+                ids = [insert_invoice(conn, invoice) for invoice, _ in batch]
+        except Exception as exc:
+            if len(batch) == 1:
+                logger.exception('ledger commit of invoice %s failed', batch[0][0].get('invoice_no'))
+                batch[0][1].set_exception(exc)
+                return
+            ids = None
+        if ids is None:
+            # One bad invoice must not fail the rest of the group; find it by committing each alone
+            for item in batch:
+                self._commit(conn, [item])
+            return
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'trace': 'ledger.commit', 'invoices': len(batch),
+                                    'ms': round((time.perf_counter() - start) * 1000, 3)}))
+        if self.backup is not None:
+            self._backup(batch, ids)
+        for (_, future), invoice_id in zip(batch, ids):
+            future.set_result(invoice_id)
+
+    def _backup(self, batch, ids):
+        # One object per group commit, queued; `python -m biolume.storage restore-ledger` reads them back
+        from .storage import LEDGER_PREFIX
+
+        rows = []
+        for (invoice, _), invoice_id in zip(batch, ids):
+            # The reservation is kept so a restore takes the stock out again (see fulfil)
+            row = dict(invoice, id=invoice_id)
+            rows.append(json.dumps(row, ensure_ascii=False))
+        key = f"{LEDGER_PREFIX}{batch[0][0]['invoice_date']}/{ids[0]:010d}-{ids[-1]:010d}.jsonl"
+        self.backup.put(key, ('\n'.join(rows) + '\n').encode('utf-8'))
+
+
+_ledgers = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_ledger(path=LEDGER_DB):
+    # Keyed by pid too: a forked worker needs its own writer thread
+    key = (os.path.abspath(path), os.getpid())
+    with _ledgers_lock:
+        ledger = _ledgers.get(key)
+        if ledger is None:
+            backup = None
+            if LEDGER_BACKUP:
+                from .storage import get_writer
+                backup = get_writer()
+            ledger = _ledgers[key] = Ledger(path, backup=backup)
+            # Flush queued invoices before the interpreter exits
+            atexit.register(ledger.close)
+        return ledger
+
+
+def _split(value):
+    return [part.strip() for part in value.split(',')] if value else []
+
+
+def import_csv(csv_path=INVOICES_CSV, path=LEDGER_DB):
+    """Load the legacy append-only invoices CSV into the ledger, once.
+
+    Returns the number of invoices imported; 0 if this exact file was
+    imported before.
+    """
+    from .pricing import rupee_to_paise
+
+    with open(csv_path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    key = f'imported:{digest}'
+    conn = connect(path)
+    try:
+        if conn.execute('SELECT 1 FROM ledger_meta WHERE key = ?', (key,)).fetchone():
+            return 0
+        count = 0
+        with conn, open(csv_path, newline='') as f:
+            for row in csv.DictReader(f):
+                products = _split(row['Selected Products'])
+                quantities = _split(row['Quantities'])
+                if len(products) != len(quantities):
+                    # Product names containing commas make the joined columns ambiguous
+                    products, quantities = [row['Selected Products']], [None]
+                date = datetime.strptime(row['Date'], '%d-%m-%Y')
+                insert_invoice(conn, {
+                    'party': row['Party'],
+                    'gstin': row['GSTIN/UN'] or None,
+                    'contact': row['Contact Number'],
+                    'address': row['Address'],
+                    'invoice_date': date.strftime('%Y-%m-%d'),
+                    'created_at': date.isoformat(timespec='seconds'),
+                    'total_paise': rupee_to_paise(row['Total Price']),
+                    'tax_paise': rupee_to_paise(row['Tax Amount']),
+                    'grand_total_paise': rupee_to_paise(row['Grand Total']),
+                    'lines': [{'line_no': idx + 1, 'product': product, 'quantity': int(qty) if qty else 0}
+                              for idx, (product, qty) in enumerate(zip(products, quantities))],
+                })
+                count += 1
+            conn.execute('INSERT INTO ledger_meta (key, value) VALUES (?, ?)',
+                         (key, datetime.now().isoformat(timespec='seconds')))
+        return count
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Invoice ledger maintenance.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help="import the legacy invoices CSV")
+    imp.add_argument('csv', nargs='?', default=INVOICES_CSV)
+    imp.add_argument('--db', default=LEDGER_DB)
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        count = import_csv(args.csv, args.db)
+        print(f"Imported {count} invoices into {args.db}")
+
+
+if __name__ == '__main__':
+    main()
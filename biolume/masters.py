@@ -0,0 +1,336 @@
+# Import pipeline for the product price list and the party master.
+#
+#   python -m biolume.masters import
+#   python -m biolume.masters import --products prices.csv --parties parties.csv
+#
+# Each CSV is read in chunks, normalized (trimmed text, numeric columns
+# parsed, `NA`/`Nan`/blank GSTINs made empty) and validated once. Rows with
+# errors are left out; warnings such as a bad GSTIN checksum keep the row.
+# The typed result is written as a compact column table (biolume/table.py)
+# in SNAPSHOT_DIR together with the source file's signature and hash, and
+# each import reports only the rows that changed against the previous
+# snapshot. The catalog maps the snapshot at startup and re-imports only
+# when the source CSV changes.
+import argparse
+import hashlib
+import logging
+import os
+import re
+import time
+
+from config import PARTY_CSV, PRODUCT_CSV, SNAPSHOT_DIR
+
+from .pricing import to_paise
+from .table import CATEGORY, INT, STR, Table
+
+logger = logging.getLogger('biolume.masters')
+
+SNAPSHOT_VERSION = 2
+CHUNK_ROWS = 50_000
+
+PRODUCT_COLUMNS = ['Product ID', 'Product Category', 'Product Name', 'Price', 'Discount', 'Disc Price']
+# Kept when present, for scanner entry
+OPTIONAL_PRODUCT_COLUMNS = ['Barcode']
+PARTY_COLUMNS = ['Party', 'Address', 'GSTIN/UN']
+# Placeholders the party files use for "no GSTIN"
+MISSING = {'', 'na', 'n/a', 'nan', 'none', 'null', '-'}
+
+GSTIN_CHARS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+GSTIN_PATTERN = re.compile(r'^[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z][1-9A-Z]Z[0-9A-Z]$')
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def gstin_check_char(gstin):
+    # Base-36 Luhn variant over the first 14 characters
+    total = 0
+    for i, char in enumerate(gstin[:14]):
+        product = GSTIN_CHARS.index(char) * (2 if i % 2 else 1)
+        total += product // 36 + product % 36
+    return GSTIN_CHARS[(36 - total % 36) % 36]
+
+
+def gstin_error(gstin):
+    """Why `gstin` is not a valid GSTIN, or None if it is."""
+    if not GSTIN_PATTERN.match(gstin):
+        return 'malformed GSTIN'
+    if gstin[14] != gstin_check_char(gstin):
+        return 'GSTIN checksum mismatch'
+    return None
+
+
+class ImportReport:
+    def __init__(self, kind, path):
+        self.kind = kind
+        self.path = path
+        self.rows = 0
+        # (CSV line, column, message)
+        self.errors = []
+        self.warnings = []
+        self.added = []
+        self.removed = []
+        # key -> {column: (old, new)}
+        self.changed = {}
+        self.seconds = 0.0
+
+    def summary(self):
+        return (f"{self.kind}: {self.rows} rows, {len(self.errors)} rejected, {len(self.warnings)} warnings; "
+                f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed "
+                f"({self.seconds * 1000:.0f} ms)")
+
+
+def _strip(chunk, columns, optional=()):
+    missing = [column for column in columns if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+    # Other extra columns (the price list has a trailing empty one) are dropped
+    columns = columns + [column for column in optional if column in chunk.columns]
+    return chunk[columns].apply(lambda column: column.str.strip())
+
+
+def _flag(report, bad, lines, column, message, fatal=True):
+    target = report.errors if fatal else report.warnings
+    target.extend((line, column, message) for line in lines[bad].tolist())
+
+
+def _normalize_products(chunk, lines, report):
+    import pandas as pd
+
+    df = _strip(chunk, PRODUCT_COLUMNS, OPTIONAL_PRODUCT_COLUMNS)
+    bad = pd.Series(False, index=df.index)
+    for column in ('Product ID', 'Product Name'):
+        empty = df[column] == ''
+        _flag(report, empty, lines, column, 'empty')
+        bad |= empty
+    for column in ('Price', 'Discount', 'Disc Price'):
+        values = pd.to_numeric(df[column], errors='coerce')
+        invalid = values.isna() | (values < 0)
+        _flag(report, invalid, lines, column, 'not a non-negative number')
+        bad |= invalid
+        df[column] = values
+    over = df['Discount'] > 100
+    _flag(report, over, lines, 'Discount', 'over 100%')
+    bad |= over
+    expected = df['Price'] * (100 - df['Discount']) / 100
+    mismatch = ~bad & ((expected - df['Disc Price']).abs() > 0.01)
+    _flag(report, mismatch, lines, 'Disc Price', 'does not match Price less Discount', fatal=False)
+
+    df = df[~bad]
+    # Exact integer prices for the pricing engine; the discount in basis points
+    return df.assign(**{'Price Paise': to_paise(df['Price']), 'Discount BP': to_paise(df['Discount']),
+                        'Disc Price Paise': to_paise(df['Disc Price'])})
+
+
+def _normalize_parties(chunk, lines, report):
+    df = _strip(chunk, PARTY_COLUMNS)
+    empty = df['Party'] == ''
+    _flag(report, empty, lines, 'Party', 'empty')
+    gstin = df['GSTIN/UN'].str.upper()
+    gstin = gstin.mask(gstin.str.lower().isin(MISSING), '')
+    df['GSTIN/UN'] = gstin
+    for line, value in zip(lines[~empty & (gstin != '')].tolist(), gstin[~empty & (gstin != '')].tolist()):
+        error = gstin_error(value)
+        if error:
+            report.warnings.append((line, 'GSTIN/UN', f'{error}: {value}'))
+    return df[~empty]
+
+
+# kind -> (key column, source columns, normalizer)
+KINDS = {
+    'products': ('Product ID', PRODUCT_COLUMNS, _normalize_products),
+    'parties': ('Party', PARTY_COLUMNS, _normalize_parties),
+}
+
+
+# Stored columns: (name, kind, hash-indexed). Categories repeat across
+# thousands of SKUs, so they are kept as codes.
+PRODUCT_SCHEMA = [
+    ('Product ID', STR, True),
+    ('Product Category', CATEGORY, False),
+    ('Product Name', STR, True),
+    ('Price Paise', INT, False),
+    ('Discount BP', INT, False),
+    ('Disc Price Paise', INT, False),
+    ('Barcode', STR, True),
+]
+# The source's decimal columns, computed from the fixed-point ones on read
+PRODUCT_DERIVED = {
+    'Price': ('Price Paise', 100),
+    'Discount': ('Discount BP', 100),
+    'Disc Price': ('Disc Price Paise', 100),
+}
+PARTY_SCHEMA = [
+    ('Party', STR, True),
+    ('Address', STR, False),
+    ('GSTIN/UN', STR, False),
+]
+SCHEMAS = {
+    'products': (PRODUCT_SCHEMA, PRODUCT_DERIVED),
+    'parties': (PARTY_SCHEMA, {}),
+}
+
+
+def _diff(old, new, key, report):
+    old = old.drop_duplicates(key).set_index(key)
+    new = new.drop_duplicates(key).set_index(key)
+    report.added = new.index.difference(old.index).tolist()
+    report.removed = old.index.difference(new.index).tolist()
+    common = new.index.intersection(old.index)
+    columns = [column for column in new.columns if column in old.columns]
+    before, after = old.loc[common, columns], new.loc[common, columns]
+    differs = before != after
+    for changed_key in common[differs.any(axis=1).to_numpy()]:
+        row = differs.loc[changed_key]
+        report.changed[changed_key] = {column: (before.at[changed_key, column], after.at[changed_key, column])
+                                       for column in columns if row[column]}
+
+
+def snapshot_path(path, snapshot_dir=SNAPSHOT_DIR):
+    # One snapshot per source file, named so it is recognizable on disk
+    name = os.path.splitext(os.path.basename(path))[0]
+    tag = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:10]
+    return os.path.join(snapshot_dir, f'{name}.{tag}.tbl')
+
+
+def read_snapshot(path, use_mmap=True):
+    """The snapshot Table at `path`, or None; `table.meta` holds its signature and digest."""
+    try:
+        table = Table.open(path, use_mmap)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Truncated, or from another machine; the CSV is the source of truth
+        logger.warning('unreadable snapshot %s; re-importing', path)
+        return None
+    if table.meta.get('version') != SNAPSHOT_VERSION:
+        return None
+    table.meta['signature'] = tuple(table.meta['signature'])
+    return table
+
+
+def _write_snapshot(path, table):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A new file replaces the old one, so processes still mapping the old file keep a valid copy
+    tmp_path = f'{path}.{os.getpid()}.part'
+    table.write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _frame(table):
+    # Changes are reported in the source's units: 'Price' rather than 'Price Paise'
+    sources = {source for source, _ in table.derived.values()}
+    return table.to_frame()[[name for name in table.names() if name not in sources]]
+
+
+def import_master(kind, path, snapshot_dir=SNAPSHOT_DIR, previous=None, chunk_rows=CHUNK_ROWS, use_mmap=True):
+    """Import one CSV, write its snapshot and return (Table, ImportReport)."""
+    import pandas as pd
+
+    key, columns, normalize = KINDS[kind]
+    start = time.perf_counter()
+    report = ImportReport(kind, path)
+    signature, digest = file_signature(path), file_hash(path)
+    target = snapshot_path(path, snapshot_dir)
+    if previous is None:
+        previous = read_snapshot(target, use_mmap)
+
+    parts = []
+    offset = 2  # first data row is line 2, after the header
+    # Everything as text first, so "  50.00 " and "NA" reach the normalizers untouched
+    reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+    for chunk in reader:
+        lines = pd.Series(range(offset, offset + len(chunk)), index=chunk.index)
+        parts.append(normalize(chunk, lines, report))
+        offset += len(chunk)
+    if not parts:
+        # Header-only file
+        parts.append(normalize(pd.DataFrame(columns=columns, dtype=str), pd.Series([], dtype='int64'), report))
+    df = pd.concat(parts, ignore_index=True)
+    duplicated = df[key].duplicated()
+    if duplicated.any():
+        report.warnings.extend((None, key, f'duplicate {value!r}; the first row is used')
+                               for value in df.loc[duplicated, key].tolist())
+    report.rows = len(df)
+
+    schema, derived = SCHEMAS[kind]
+    meta = {'version': SNAPSHOT_VERSION, 'kind': kind, 'source': os.path.abspath(path),
+            'signature': signature, 'digest': digest}
+    table = Table.from_frame(df, schema, derived, meta)
+    if previous is not None:
+        _diff(_frame(previous), _frame(table), key, report)
+    else:
+        report.added = df[key].tolist()
+    _write_snapshot(target, table)
+    # Serve from the file, so this process shares pages with every other reader
+    table = read_snapshot(target, use_mmap) or table
+    report.seconds = time.perf_counter() - start
+    logger.info(report.summary())
+    for line, column, message in report.errors:
+        logger.warning('%s line %s, %s: %s (row skipped)', os.path.basename(path), line, column, message)
+    return table, report
+
+
+def load_master(kind, path, snapshot_dir=SNAPSHOT_DIR, known_digest=None, use_mmap=True):
+    """Current snapshot Table for `path`, importing the CSV only if it changed.
+
+    Returns None when the file's contents still hash to `known_digest`.
+    """
+    signature = file_signature(path)
+    snapshot = read_snapshot(snapshot_path(path, snapshot_dir), use_mmap)
+    if snapshot is not None and snapshot.meta['signature'] == signature:
+        return None if snapshot.meta['digest'] == known_digest else snapshot
+    # mtime/size moved; only re-import if the bytes actually differ
+    digest = file_hash(path)
+    if digest == known_digest:
+        return None
+    if snapshot is not None and snapshot.meta['digest'] == digest:
+        return snapshot
+    snapshot, _ = import_master(kind, path, snapshot_dir, previous=snapshot, use_mmap=use_mmap)
+    return snapshot
+
+
+def _print_report(report, limit=20):
+    print(report.summary())
+    for label, issues in (('error', report.errors), ('warning', report.warnings)):
+        for line, column, message in issues[:limit]:
+            where = f'line {line}, ' if line else ''
+            print(f"  {label}: {where}{column}: {message}")
+        if len(issues) > limit:
+            print(f"  ... {len(issues) - limit} more {label}s")
+    for label, keys in (('added', report.added), ('removed', report.removed)):
+        if keys:
+            shown = ', '.join(map(str, keys[:limit]))
+            print(f"  {label}: {shown}{' ...' if len(keys) > limit else ''}")
+    for key, changes in list(report.changed.items())[:limit]:
+        print(f"  changed {key}: " + ', '.join(f'{column} {old!r} -> {new!r}'
+                                                for column, (old, new) in changes.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate and snapshot the price list and party master.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help="import both CSVs and report what changed")
+    imp.add_argument('--products', default=PRODUCT_CSV, help="product price list CSV")
+    imp.add_argument('--parties', default=PARTY_CSV, help="party master CSV")
+    imp.add_argument('--snapshots', default=SNAPSHOT_DIR, help="snapshot directory")
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        for kind, path in (('products', args.products), ('parties', args.parties)):
+            _, report = import_master(kind, path, args.snapshots)
+            _print_report(report)
+
+
+if __name__ == '__main__':
+    main()
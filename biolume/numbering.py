@@ -0,0 +1,226 @@
+# Gap-free invoice numbers per financial year, e.g. KS/2026-27/00042.
+#
+#   allocator = get_allocator('KS')
+#   number = allocator.next()
+#   try:
+#       ... render and record the invoice ...
+#   except Exception:
+#       allocator.release(number)
+#       raise
+#
+# Sequences live next to the ledger in the same SQLite file. Each process
+# leases a block of numbers in one short write transaction and hands them out
+# from memory, so concurrent Streamlit sessions and batch workers never wait
+# on each other per invoice. Numbers are gap-free rather than strictly in
+# time order: released numbers, and the unused rest of a block when a process
+# closes its allocator, go back to a shared pool that is drawn on before the
+# sequence advances. Pooled numbers at the top of a series go back into its
+# sequence, so a financial year ends on its last issued invoice rather than
+# on the unused rest of a block: a process gives back its earlier years'
+# numbers as soon as it issues one in a new year. Blocks left behind by a process that died are reclaimed
+# by the next lease on the same host. A lease never hands out a number the
+# ledger already holds, whether it comes from the pool or the sequence, so a
+# sequence that fell behind the ledger (e.g. a restored one) skips ahead
+# instead of issuing duplicates.
+import atexit
+import multiprocessing.util
+import os
+import threading
+from bisect import insort
+from datetime import date
+
+from config import LEDGER_DB
+
+from .ledger import LedgerTables, owner_is_dead
+
+NUMBER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoice_sequences (
+    series TEXT PRIMARY KEY,
+    next_number INTEGER NOT NULL
+);
+-- Numbers handed to a live allocator; owner is host:pid
+CREATE TABLE IF NOT EXISTS invoice_number_leases (
+    series TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    owner TEXT NOT NULL,
+    PRIMARY KEY (series, number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_invoice_number_leases_owner ON invoice_number_leases(owner);
+-- Numbers given back unused, reissued before the sequence advances
+CREATE TABLE IF NOT EXISTS invoice_number_pool (
+    series TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    PRIMARY KEY (series, number)
+) WITHOUT ROWID;
+"""
+
+
+def financial_year(when=None):
+    # Indian financial years run April to March
+    when = when or date.today()
+    start = when.year if when.month >= 4 else when.year - 1
+    return f'{start}-{(start + 1) % 100:02d}'
+
+
+def format_number(series, number):
+    return f'{series}/{number:05d}'
+
+
+def parse_number(invoice_no):
+    series, _, number = invoice_no.rpartition('/')
+    return series, int(number)
+
+
+def _unissued(conn, leases):
+    # The (series, number) pairs no ledger invoice carries
+    numbers = [format_number(series, number) for series, number in leases]
+    issued = {invoice_no for (invoice_no,) in conn.execute(
+        f'SELECT invoice_no FROM invoices WHERE invoice_no IN ({", ".join("?" * len(numbers))})', numbers)}
+    return [lease for lease, number in zip(leases, numbers) if number not in issued]
+
+
+def _trim(conn, series):
+    # Lower the sequence past the pooled numbers right below it
+    row = conn.execute('SELECT next_number FROM invoice_sequences WHERE series = ?', (series,)).fetchone()
+    if row is None:
+        return
+    pooled = {number for (number,) in conn.execute(
+        'SELECT number FROM invoice_number_pool WHERE series = ?', (series,))}
+    top = row[0]
+    while top - 1 in pooled:
+        top -= 1
+    if top < row[0]:
+        conn.execute('DELETE FROM invoice_number_pool WHERE series = ? AND number >= ?', (series, top))
+        conn.execute('UPDATE invoice_sequences SET next_number = ? WHERE series = ?', (top, series))
+
+
+def resume_sequences(conn):
+    """Continue each series after the highest number the ledger holds; returns {series: next number}.
+
+    For a ledger rebuilt from its backup: leases and pooled numbers of those
+    series belong to the lost database and are dropped, so no number below
+    the highest recorded one is issued again. Runs in the caller's transaction.
+    """
+    highest = {}
+    for (invoice_no,) in conn.execute('SELECT invoice_no FROM invoices WHERE invoice_no IS NOT NULL'):
+        try:
+            series, number = parse_number(invoice_no)
+        except ValueError:
+            # Not one this allocator issued
+            continue
+        highest[series] = max(number, highest.get(series, 0))
+    for series, number in highest.items():
+        conn.execute('INSERT INTO invoice_sequences (series, next_number) VALUES (?, ?)'
+                     ' ON CONFLICT (series) DO UPDATE SET next_number = MAX(next_number, excluded.next_number)',
+                     (series, number + 1))
+        conn.execute('DELETE FROM invoice_number_leases WHERE series = ?', (series,))
+        conn.execute('DELETE FROM invoice_number_pool WHERE series = ?', (series,))
+    return {series: number + 1 for series, number in highest.items()}
+
+
+class NumberAllocator(LedgerTables):
+    SCHEMA = NUMBER_SCHEMA
+
+    def __init__(self, prefix, path=LEDGER_DB, block_size=20):
+        super().__init__(path)
+        self.prefix = prefix
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        # series -> sorted numbers leased to this process and not yet issued
+        self._free = {}
+        self._conn = None
+
+    def next(self, when=None):
+        """Issue the lowest free number in the financial year of `when`."""
+        series = f'{self.prefix}/{financial_year(when)}'
+        with self._lock:
+            self._retire(series)
+            free = self._free.setdefault(series, [])
+            if not free:
+                free.extend(self._lease(series))
+            return format_number(series, free.pop(0))
+
+    def release(self, invoice_no):
+        # The invoice was never issued; hand its number out again
+        series, number = parse_number(invoice_no)
+        with self._lock:
+            insort(self._free.setdefault(series, []), number)
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            unused = [(series, number) for series, numbers in self._free.items() for number in numbers]
+            self._transaction(self._return, unused)
+            self._free.clear()
+            self._disconnect()
+
+    def _retire(self, series):
+        # Issuing in a new financial year closes the earlier ones for this process
+        for past in [past for past in self._free if past < series]:
+            unused = [(past, number) for number in self._free.pop(past)]
+            self._transaction(self._return, unused, None, past)
+
+    def _lease(self, series):
+        return self._transaction(self._lease_block, series)
+
+    def _lease_block(self, conn, series):
+        self._reclaim(conn)
+        numbers = []
+        while not numbers:
+            candidates = [number for (number,) in conn.execute(
+                'SELECT number FROM invoice_number_pool WHERE series = ? ORDER BY number LIMIT ?',
+                (series, self.block_size))]
+            if candidates:
+                conn.executemany('DELETE FROM invoice_number_pool WHERE series = ? AND number = ?',
+                                 [(series, number) for number in candidates])
+            else:
+                row = conn.execute('SELECT next_number FROM invoice_sequences WHERE series = ?',
+                                   (series,)).fetchone()
+                start = row[0] if row else 1
+                candidates = list(range(start, start + self.block_size))
+                conn.execute('INSERT INTO invoice_sequences (series, next_number) VALUES (?, ?)'
+                             ' ON CONFLICT (series) DO UPDATE SET next_number = excluded.next_number',
+                             (series, start + self.block_size))
+            numbers = [number for _, number in _unissued(conn, [(series, number) for number in candidates])]
+        conn.executemany('INSERT INTO invoice_number_leases (series, number, owner) VALUES (?, ?, ?)',
+                         [(series, number, self.owner) for number in numbers])
+        return numbers
+
+    def _return(self, conn, unused, owner=None, series=None):
+        # Pool the numbers `owner` never issued and drop its leases, of one series or all
+        conn.executemany('INSERT OR IGNORE INTO invoice_number_pool (series, number) VALUES (?, ?)', unused)
+        if series is None:
+            conn.execute('DELETE FROM invoice_number_leases WHERE owner = ?', (owner or self.owner,))
+        else:
+            conn.execute('DELETE FROM invoice_number_leases WHERE owner = ? AND series = ?',
+                         (owner or self.owner, series))
+        for returned in sorted({returned for returned, _ in unused}):
+            _trim(conn, returned)
+
+    def _reclaim(self, conn):
+        owners = [owner for (owner,) in conn.execute('SELECT DISTINCT owner FROM invoice_number_leases')]
+        for owner in owners:
+            if owner == self.owner or not owner_is_dead(owner, self.host):
+                continue
+            leased = conn.execute('SELECT series, number FROM invoice_number_leases WHERE owner = ?',
+                                  (owner,)).fetchall()
+            self._return(conn, _unissued(conn, leased), owner)
+
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def get_allocator(prefix, path=LEDGER_DB):
+    # Keyed by pid too: a forked worker must lease its own blocks
+    key = (prefix, os.path.abspath(path), os.getpid())
+    with _allocators_lock:
+        allocator = _allocators.get(key)
+        if allocator is None:
+            allocator = _allocators[key] = NumberAllocator(prefix, path)
+            # Give unused numbers back so the next process continues without gaps. Pool
+            # workers skip atexit on exit but do run multiprocessing finalizers.
+            atexit.register(allocator.close)
+            multiprocessing.util.Finalize(allocator, allocator.close, exitpriority=10)
+        return allocator
@@ -0,0 +1,118 @@
+# Content-addressed cache of rendered invoice PDFs.
+#
+#   key = invoice_key(order, profile, catalog)
+#   data = cache.get(key)
+#   if data is None:
+#       cache.put(key, render())
+#
+# The key hashes the normalized order, the day, the branding profile and the
+# contents of both catalog CSVs, so editing the price list makes every older
+# entry unreachable; those then age out under the size bound. Entries are
+# plain `<key>.pdf` files. Least recently used files are evicted first, using
+# the file mtime (touched on every hit) to carry recency across restarts.
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from config import PDF_CACHE_DIR
+
+from .jobs import idempotency_key
+
+
+def invoice_key(order, profile, catalog, day=None):
+    payload = {
+        'order': idempotency_key(profile['name'], order, day),
+        'profile': profile,
+        'catalog': catalog.digest,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class PDFCache:
+    def __init__(self, directory=PDF_CACHE_DIR, max_bytes=256 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> size in bytes, least recently used first
+        self._entries = OrderedDict()
+        self.size = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pdf')
+
+    def _scan(self):
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf') and entry.is_file():
+                stat = entry.stat()
+                found.append((stat.st_mtime_ns, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.size += size
+        with self._lock:
+            self._evict()
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted, possibly by another process sharing the directory
+            with self._lock:
+                self.size -= self._entries.pop(key, 0)
+            return None
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = len(data)
+                self.size += len(data)
+            self._entries.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        # Readers never see a half-written entry; processes sharing the directory write apart
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.part'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        self.size -= self._entries.pop(key)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_pdf_cache(max_mb, directory=PDF_CACHE_DIR):
+    # One cache per directory and process; the first caller's budget wins
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            cache = _caches[directory] = PDFCache(directory, max_mb << 20)
+        return cache
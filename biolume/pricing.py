@@ -0,0 +1,138 @@
+# Invoice totals in exact integer paise.
+#
+# All amounts are computed as int64 paise in one vectorized pass over the
+# order, so totals never pick up float error and every entry point prints the
+# same numbers for the same order. The only place rounding happens is here:
+#
+#   * line amount  = discounted unit price x quantity (exact)
+#   * taxable value per tax class (HSN code, GST rate) = sum of its line amounts
+#   * per class, CGST / SGST = taxable value x half the rate, each rounded
+#     half-up to the paisa; IGST (inter-state supply) = taxable value x the rate
+#   * order taxes  = sums over the classes, so the HSN summary adds up exactly
+#   * grand total  = subtotal + taxes, then rounded per the invoice's
+#                    rounding policy; the difference is reported as round_off
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+# Rounding policies for the grand total
+ROUND_NONE = 'none'        # keep paise
+ROUND_UP = 'up'            # next whole rupee
+ROUND_NEAREST = 'nearest'  # nearest whole rupee, half up
+ROUNDING_POLICIES = (ROUND_NONE, ROUND_UP, ROUND_NEAREST)
+
+# GST rate in basis points (18%)
+DEFAULT_GST_RATE_BP = 1800
+
+
+def to_paise(values):
+    # Vectorized rupees -> paise for a Series/array of prices with at most two decimals
+    return np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+
+
+def rupee_to_paise(value):
+    return int((Decimal(str(value).strip()) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def rupees(paise):
+    sign = '-' if paise < 0 else ''
+    paise = abs(int(paise))
+    return f'{sign}{paise // 100}.{paise % 100:02d}'
+
+
+def _share_of(amount, rate_bp, parts=1):
+    # amount x rate_bp / 10000 / parts, rounded half-up, for non-negative amounts
+    return (2 * amount * rate_bp + 10000 * parts) // (20000 * parts)
+
+
+def round_total(paise, rounding):
+    if rounding == ROUND_NONE:
+        return paise
+    if rounding == ROUND_UP:
+        return -(-paise // 100) * 100
+    if rounding == ROUND_NEAREST:
+        return (paise + 50) // 100 * 100
+    raise ValueError(f'Unknown rounding policy: {rounding!r}')
+
+
+def price_order(unit_paise, quantities, rounding=ROUND_NONE, gst_rate_bp=DEFAULT_GST_RATE_BP, hsn=None,
+                interstate=False):
+    """Compute line amounts, taxes and the grand total of an order.
+
+    `unit_paise` holds the discounted unit price of each line in paise and
+    `quantities` the billed quantity. `gst_rate_bp` is one rate for the whole
+    order or one per line, and `hsn` the lines' HSN codes. All returned
+    amounts are integer paise.
+    """
+    unit_paise = np.asarray(unit_paise, dtype=np.int64)
+    quantities = np.asarray(quantities, dtype=np.int64)
+    if unit_paise.shape != quantities.shape:
+        raise ValueError('unit prices and quantities must have the same length')
+    if (quantities < 0).any() or (unit_paise < 0).any():
+        raise ValueError('prices and quantities must not be negative')
+    rates = np.broadcast_to(np.asarray(gst_rate_bp, dtype=np.int64), unit_paise.shape)
+
+    line_amounts = unit_paise * quantities
+    # One grouped pass: each line's tax class (HSN, rate), then the taxable value of every class
+    rate_keys, group = np.unique(rates, return_inverse=True)
+    codes = [None]
+    if hsn is not None:
+        hsn = np.asarray(hsn, dtype=str)
+        if hsn.shape != unit_paise.shape:
+            raise ValueError('HSN codes and prices must have the same length')
+        codes, code_group = np.unique(hsn, return_inverse=True)
+        codes = codes.tolist()
+        group = code_group * len(rate_keys) + group
+    present, group = np.unique(group, return_inverse=True)
+    taxable = np.zeros(len(present), dtype=np.int64)
+    np.add.at(taxable, group, line_amounts)
+    classes = [(codes[key // len(rate_keys)], int(rate_keys[key % len(rate_keys)])) for key in present.tolist()]
+    totals = tax_totals(dict(zip(classes, taxable.tolist())), rounding, interstate)
+    totals['line_amounts'] = line_amounts.tolist()
+    return totals
+
+
+def order_totals(subtotal, rounding=ROUND_NONE, gst_rate_bp=DEFAULT_GST_RATE_BP, interstate=False):
+    """Taxes and grand total for an order whose line amounts sum to `subtotal` paise."""
+    return tax_totals({(None, gst_rate_bp): subtotal}, rounding, interstate)
+
+
+def tax_totals(taxable, rounding=ROUND_NONE, interstate=False):
+    """Taxes and grand total from the taxable value, in paise, of each (HSN, rate_bp) class.
+
+    `tax_groups` holds one HSN summary row per class; the order's taxes are their sums.
+    """
+    keys = list(taxable)
+    amounts = np.array([taxable[key] for key in keys], dtype=np.int64)
+    rates = np.array([rate for _, rate in keys], dtype=np.int64)
+    zero = np.zeros_like(amounts)
+    if interstate:
+        # Inter-state supply pays the whole rate as integrated tax
+        cgst = sgst = zero
+        igst = _share_of(amounts, rates)
+    else:
+        # Intra-state GST splits evenly into central and state tax
+        cgst = sgst = _share_of(amounts, rates, 2)
+        igst = zero
+    groups = [{'hsn': hsn, 'rate_bp': rate, 'taxable': int(amount), 'cgst': int(c), 'sgst': int(s),
+               'igst': int(i), 'tax': int(c + s + i)}
+              for (hsn, rate), amount, c, s, i in zip(keys, amounts, cgst, sgst, igst)]
+    subtotal = int(amounts.sum())
+    tax = int(cgst.sum() + sgst.sum() + igst.sum())
+    unrounded = subtotal + tax
+    grand_total = round_total(unrounded, rounding)
+    distinct_rates = set(rates.tolist())
+    return {
+        'subtotal': subtotal,
+        # The order's single GST rate, or None when its lines have several
+        'gst_rate_bp': distinct_rates.pop() if len(distinct_rates) == 1 else None,
+        'interstate': interstate,
+        'cgst': int(cgst.sum()),
+        'sgst': int(sgst.sum()),
+        'igst': int(igst.sum()),
+        'tax': tax,
+        'tax_groups': groups,
+        'round_off': grand_total - unrounded,
+        'grand_total': grand_total,
+        'rounding': rounding,
+    }
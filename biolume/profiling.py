@@ -0,0 +1,89 @@
+# Lightweight timing spans for the invoice pipeline.
+#
+#   with trace('invoice', party=name) as t:
+#       with span('catalog.load'):
+#           ...
+#   t.summary()  # [{'span': 'catalog.load', 'calls': 1, 'ms': 0.4}, ...]
+#
+# Spans only record while a trace is active in the current context (thread
+# or task), so instrumented code costs a context-variable lookup otherwise.
+# Each finished trace is logged as one JSON line on the `biolume.timing`
+# logger.
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('biolume.timing')
+
+_current = contextvars.ContextVar('biolume_trace', default=None)
+
+
+class Trace:
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+        self.spans = {}
+        self.order = []
+        self.seconds = 0.0
+
+    def add(self, name, seconds):
+        entry = self.spans.get(name)
+        if entry is None:
+            entry = self.spans[name] = [0, 0.0]
+            self.order.append(name)
+        entry[0] += 1
+        entry[1] += seconds
+
+    def summary(self):
+        return [{'span': name, 'calls': self.spans[name][0], 'ms': round(self.spans[name][1] * 1000, 3)}
+                for name in self.order]
+
+    def as_dict(self):
+        record = {'trace': self.name, 'ms': round(self.seconds * 1000, 3)}
+        record.update(self.fields)
+        record['spans'] = self.summary()
+        return record
+
+
+@contextmanager
+def trace(name, **fields):
+    current = Trace(name, **fields)
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - start
+        _current.reset(token)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(current.as_dict(), default=str))
+
+
+@contextmanager
+def span(name):
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.add(name, time.perf_counter() - start)
+
+
+def current_trace():
+    return _current.get()
+
+
+def log_to_stderr(level=logging.INFO):
+    # Emit timing records as bare JSON lines, independent of the root logger setup
+    if not any(getattr(h, '_biolume_timing', False) for h in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler._biolume_timing = True
+        logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
@@ -0,0 +1,142 @@
+# Sales reporting over the invoice ledger.
+#
+# Totals come from the per-day aggregate tables the ledger maintains on every
+# insert, so a report over a year reads at most a few hundred rows per party
+# or product instead of rescanning every invoice. Amounts come back as exact
+# integer paise (`*_paise` columns); the CLI prints them in rupees.
+#
+#   python -m biolume.reports parties --start 2026-04-01 --end 2027-03-31
+#   python -m biolume.reports products --top 20
+#   python -m biolume.reports daily --start 2026-10-01
+#   python -m biolume.reports search --party "McKingsTown - ADYAR (Brand Outlet)"
+import argparse
+
+from .ledger import LEDGER_DB, connect
+from .pricing import rupees
+
+PAISE_SUFFIX = '_paise'
+
+
+def _date_filter(start, end, column='invoice_date'):
+    clauses, params = [], []
+    if start:
+        clauses.append(f'{column} >= ?')
+        params.append(start)
+    if end:
+        clauses.append(f'{column} <= ?')
+        params.append(end)
+    return clauses, params
+
+
+def _where(clauses):
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+
+
+def _rows(conn, sql, params):
+    cur = conn.execute(sql, params)
+    columns = [d[0] for d in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def revenue_by_party(conn, start=None, end=None, party=None, limit=None):
+    clauses, params = _date_filter(start, end)
+    if party:
+        clauses.append('party = ?')
+        params.append(party)
+    sql = ('SELECT party, SUM(invoices) AS invoices, SUM(total_paise) AS total_paise,'
+           ' SUM(tax_paise) AS tax_paise, SUM(grand_total_paise) AS grand_total_paise'
+           ' FROM daily_party_totals' + _where(clauses) +
+           ' GROUP BY party ORDER BY grand_total_paise DESC')
+    if limit:
+        sql += f' LIMIT {int(limit)}'
+    return _rows(conn, sql, params)
+
+
+def units_by_product(conn, start=None, end=None, product=None, limit=None):
+    clauses, params = _date_filter(start, end)
+    if product:
+        clauses.append('product = ?')
+        params.append(product)
+    sql = ('SELECT product, SUM(units) AS units, SUM(amount_paise) AS amount_paise'
+           ' FROM daily_product_totals' + _where(clauses) +
+           ' GROUP BY product ORDER BY units DESC')
+    if limit:
+        sql += f' LIMIT {int(limit)}'
+    return _rows(conn, sql, params)
+
+
+def daily_totals(conn, start=None, end=None):
+    clauses, params = _date_filter(start, end)
+    sql = ('SELECT invoice_date, invoices, total_paise, tax_paise, grand_total_paise'
+           ' FROM daily_totals' + _where(clauses) + ' ORDER BY invoice_date')
+    return _rows(conn, sql, params)
+
+
+def search_invoices(conn, party=None, product=None, start=None, end=None, limit=100):
+    # Invoice headers, newest first; `product` matches any line on the invoice
+    clauses, params = _date_filter(start, end, 'i.invoice_date')
+    if party:
+        clauses.append('i.party = ?')
+        params.append(party)
+    if product:
+        clauses.append('i.id IN (SELECT invoice_id FROM invoice_lines WHERE product = ?)')
+        params.append(product)
+    sql = ('SELECT i.id, i.invoice_no, i.party, i.invoice_date, i.created_at,'
+           ' i.total_paise, i.tax_paise, i.grand_total_paise FROM invoices i' + _where(clauses) +
+           ' ORDER BY i.invoice_date DESC, i.id DESC LIMIT ?')
+    return _rows(conn, sql, params + [int(limit)])
+
+
+def invoice_lines(conn, invoice_id):
+    return _rows(conn, 'SELECT line_no, product_id, product, quantity, unit_price_paise, discount,'
+                       ' disc_price_paise, amount_paise'
+                       ' FROM invoice_lines WHERE invoice_id = ? ORDER BY line_no', (invoice_id,))
+
+
+def _print_rows(rows):
+    if not rows:
+        print("No invoices.")
+        return
+    columns = list(rows[0])
+    headers = [column.removesuffix(PAISE_SUFFIX) for column in columns]
+    cells = [[_fmt(column, row[column]) for column in columns] for row in rows]
+    widths = [max(len(header), *(len(line[i]) for line in cells)) for i, header in enumerate(headers)]
+    print('  '.join(h.ljust(w) for h, w in zip(headers, widths)))
+    for line in cells:
+        print('  '.join(cell.ljust(w) for cell, w in zip(line, widths)))
+
+
+def _fmt(column, value):
+    if value is not None and column.endswith(PAISE_SUFFIX):
+        return rupees(value)
+    return f'{value:.2f}' if isinstance(value, float) else str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sales reports from the invoice ledger.")
+    parser.add_argument('report', choices=['parties', 'products', 'daily', 'search'])
+    parser.add_argument('--db', default=LEDGER_DB)
+    parser.add_argument('--start', help="first invoice date, YYYY-MM-DD")
+    parser.add_argument('--end', help="last invoice date, YYYY-MM-DD")
+    parser.add_argument('--party')
+    parser.add_argument('--product')
+    parser.add_argument('--top', type=int)
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    try:
+        if args.report == 'parties':
+            rows = revenue_by_party(conn, args.start, args.end, args.party, args.top)
+        elif args.report == 'products':
+            rows = units_by_product(conn, args.start, args.end, args.product, args.top)
+        elif args.report == 'daily':
+            rows = daily_totals(conn, args.start, args.end)
+        else:
+            rows = search_invoices(conn, args.party, args.product, args.start, args.end, args.top or 100)
+        _print_rows(rows)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# Typeahead search over catalog entries.
+#
+#   index = SearchIndex(names, fields, codes)
+#   index.search('anna nag')   # entries with words starting "anna" and "nag"
+#   index.search('tambram')    # no word starts so; matched as a typo of "tambaram"
+#   index.code('btmc001')      # exact product ID / barcode, or None
+#
+# Every distinct word is kept in one sorted list, so a query word is a binary
+# search for its prefix range. Posting lists are in catalog order, which lets
+# a query stop as soon as it has `limit` matches instead of scoring every
+# entry. Matches in the name itself rank before matches only in the other
+# fields. A query word that starts no indexed word is replaced by the indexed
+# word sharing the most trigrams with it.
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import accumulate
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+# Share of trigrams a word must have in common with a query word to count as a typo of it
+MIN_SIMILARITY = 0.25
+
+
+def normalize(text):
+    return _NON_WORD.sub(' ', str(text).lower()).strip()
+
+
+def _trigrams(word):
+    padded = f' {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _WordIndex:
+    def __init__(self, word_sets):
+        self.words = word_sets
+        postings = defaultdict(list)
+        for entry, words in enumerate(word_sets):
+            for word in words:
+                postings[word].append(entry)
+        self.vocabulary = sorted(postings)
+        self.postings = [postings[word] for word in self.vocabulary]
+        # Entries under vocabulary[:i], for sizing a prefix range without walking it
+        self._sizes = [0, *accumulate(len(postings) for postings in self.postings)]
+
+    def range(self, word):
+        low = bisect_left(self.vocabulary, word)
+        return low, bisect_left(self.vocabulary, word + '\x7f', low)
+
+    def matches(self, words):
+        """Entries having a word that starts with each of `words`, in order."""
+        if not words:
+            return
+        ranges = [self.range(word) for word in words]
+        if any(low == high for low, high in ranges):
+            return
+        # Walk the rarest prefix; check the others against each entry's words
+        rarest = min(range(len(words)), key=lambda i: self._sizes[ranges[i][1]] - self._sizes[ranges[i][0]])
+        low, high = ranges[rarest]
+        others = words[:rarest] + words[rarest + 1:]
+        stream = self.postings[low] if high - low == 1 else heapq.merge(*self.postings[low:high])
+        previous = None
+        for entry in stream:
+            if entry == previous:
+                continue
+            previous = entry
+            entry_words = self.words[entry]
+            if all(any(candidate.startswith(word) for candidate in entry_words) for word in others):
+                yield entry
+
+
+class SearchIndex:
+    def __init__(self, names, fields, codes=None):
+        """`names` are what searches return; `fields[i]` lists the other texts
+        searched for `names[i]` and `codes[i]` its exact-match codes."""
+        self.names = names
+        titles = [frozenset(normalize(name).split()) for name in names]
+        self._titles = _WordIndex(titles)
+        self._text = _WordIndex([title.union(normalize(' '.join(map(str, texts))).split())
+                                 for title, texts in zip(titles, fields)])
+        trigrams = defaultdict(list)
+        self._trigram_counts = []
+        for position, word in enumerate(self._text.vocabulary):
+            if not word.isalpha():
+                # Codes and numbers are typed exactly; leaving them out keeps the trigram table small
+                self._trigram_counts.append(0)
+                continue
+            word_trigrams = _trigrams(word)
+            self._trigram_counts.append(len(word_trigrams))
+            for trigram in word_trigrams:
+                trigrams[trigram].append(position)
+        self._trigrams = dict(trigrams)
+        self._codes = {}
+        for entry, entry_codes in enumerate(codes or ()):
+            for code in entry_codes:
+                if code:
+                    self._codes.setdefault(normalize(code).replace(' ', ''), entry)
+
+    def code(self, text):
+        entry = self._codes.get(normalize(text).replace(' ', ''))
+        return None if entry is None else self.names[entry]
+
+    def search(self, query, limit=10):
+        words = normalize(query).split()
+        if not words:
+            return self.names[:limit]
+        found = []
+        exact = self._codes.get(''.join(words))
+        if exact is not None:
+            found.append(exact)
+        else:
+            words = self._correct(words)
+        seen = set(found)
+        for index in (self._titles, self._text):
+            for entry in index.matches(words):
+                if len(found) >= limit:
+                    break
+                if entry not in seen:
+                    seen.add(entry)
+                    found.append(entry)
+        return [self.names[entry] for entry in found]
+
+    def _correct(self, words):
+        corrected = []
+        for word in words:
+            low, high = self._text.range(word)
+            if low == high:
+                word = self._closest(word)
+                if word is None:
+                    return []
+            corrected.append(word)
+        return corrected
+
+    def _closest(self, word):
+        wanted = _trigrams(word)
+        shared = Counter()
+        for trigram in wanted:
+            shared.update(self._trigrams.get(trigram, ()))
+        best, best_similarity = None, MIN_SIMILARITY
+        for position, count in shared.items():
+            # Jaccard similarity of the two trigram sets
+            similarity = count / (len(wanted) + self._trigram_counts[position] - count)
+            if similarity >= best_similarity:
+                best, best_similarity = position, similarity
+        return None if best is None else self._text.vocabulary[best]
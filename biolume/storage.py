@@ -0,0 +1,607 @@
+# Durable storage for saved invoice PDFs and the ledger backup: one small
+# key/value interface with interchangeable backends.
+#
+#   store = open_store('segments:data/store')    # append-only segment files on local disk
+#   store = open_store('s3://bucket/biolume')    # S3 or any S3-compatible service (needs boto3)
+#   store = open_store('local-s3:/tmp/s3')       # the S3 backend against a local stand-in
+#   store.put_many([('invoices/a.pdf', data)])
+#   store.get('invoices/a.pdf')
+#
+#   writer = get_writer()                        # STORAGE_URL, written from a background thread
+#   future = writer.put('invoices/a.pdf', data)
+#
+#   python -m biolume.storage compact
+#   python -m biolume.storage import-dir generated_invoices
+#   python -m biolume.storage restore-ledger data/restored.db
+#
+# A segment store appends records (header, key, value) to numbered segment
+# files and fsyncs once per batch. Each process indexes the segments in memory
+# and picks up other processes' appends when a key is missing. Overwritten and
+# deleted records stay on disk until compaction copies every live record into
+# one new segment; the writer does that in the background once most of the
+# store is dead. The writer hands everything queued since its last write to
+# the backend in one call, so invoices never wait on a disk or network round
+# trip.
+import argparse
+import atexit
+import fcntl
+import io
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from config import LEDGER_DB, STORAGE_URL
+
+logger = logging.getLogger('biolume.storage')
+
+# Saved invoice PDFs, by file name
+INVOICE_PREFIX = 'invoices/'
+# Ledger rows, one JSON-lines object per group commit
+LEDGER_PREFIX = 'ledger/'
+
+# crc32 of everything after it, key length, value length, kind
+_RECORD = struct.Struct('<IIIB')
+PUT, DELETE = 0, 1
+SEGMENT_BYTES = 64 << 20
+# Compact once dead records are this share of a store of at least COMPACT_MIN_BYTES
+COMPACT_RATIO = 0.5
+COMPACT_MIN_BYTES = 16 << 20
+# Seconds between the writer's compaction checks
+COMPACT_INTERVAL = 60
+WRITE_ATTEMPTS = 3
+
+
+class Store:
+    """Bytes by key; keys are '/'-separated paths. `get` raises KeyError for missing keys."""
+
+    def put(self, key, data):
+        self.put_many([(key, data)])
+
+    def put_many(self, items):
+        raise NotImplementedError
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def keys(self, prefix=''):
+        """Sorted keys starting with `prefix`."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def maintain(self):
+        # Housekeeping the writer runs every COMPACT_INTERVAL seconds
+        pass
+
+    def close(self):
+        pass
+
+    def __contains__(self, key):
+        try:
+            self.get(key)
+        except KeyError:
+            return False
+        return True
+
+
+def _record(kind, key, data):
+    key = key.encode('utf-8')
+    header = struct.pack('<IIB', len(key), len(data), kind)
+    return struct.pack('<I', zlib.crc32(data, zlib.crc32(key, zlib.crc32(header)))) + header + key + data
+
+
+def _segment_name(number, generation=0):
+    # Names sort in scan order: a compacted segment right after the last one it replaced
+    return f'{number:08d}-{generation:03d}.seg'
+
+
+class SegmentStore(Store):
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lock_file = open(os.path.join(directory, 'LOCK'), 'ab')
+        self._reset()
+        with self._lock:
+            self._refresh()
+
+    def _reset(self):
+        # key -> (segment, value offset, value length, record length)
+        self._index = {}
+        # segment -> bytes indexed so far
+        self._scanned = {}
+        # segment -> bytes of overwritten, deleted and tombstone records
+        self._dead = {}
+        for fd in getattr(self, '_fds', {}).values():
+            os.close(fd)
+        self._fds = {}
+
+    @contextmanager
+    def _exclusive(self):
+        # Against other threads, then other processes
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.seg'))
+
+    def _refresh(self):
+        while True:
+            names = self._segments()
+            last = max(self._scanned, default='')
+            if (any(name not in names for name in self._scanned)
+                    or any(name < last and name not in self._scanned for name in names)):
+                # Compacted since the last look; every segment is indexed again, in order
+                self._reset()
+            try:
+                for name in names:
+                    self._scan(name)
+                return
+            except FileNotFoundError:
+                # Compacted while this process was reading
+                self._reset()
+
+    def _scan(self, name):
+        position = self._scanned.get(name, 0)
+        self._dead.setdefault(name, 0)
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            f.seek(position)
+            while True:
+                header = f.read(_RECORD.size)
+                if len(header) < _RECORD.size:
+                    break
+                crc, key_length, length, kind = _RECORD.unpack(header)
+                body = f.read(key_length + length)
+                if len(body) < key_length + length or zlib.crc32(body, zlib.crc32(header[4:])) != crc:
+                    # A record still being written, or torn by a crash; the next append truncates it
+                    break
+                size = _RECORD.size + key_length + length
+                key = body[:key_length].decode('utf-8')
+                old = self._index.pop(key, None)
+                if old is not None:
+                    self._dead[old[0]] += old[3]
+                if kind == PUT:
+                    self._index[key] = (name, position + _RECORD.size + key_length, length, size)
+                else:
+                    self._dead[name] += size
+                position += size
+        self._scanned[name] = position
+
+    def _fd(self, name):
+        fd = self._fds.get(name)
+        if fd is None:
+            fd = self._fds[name] = os.open(os.path.join(self.directory, name), os.O_RDONLY)
+        return fd
+
+    def get(self, key):
+        with self._lock:
+            for attempt in range(2):
+                entry = self._index.get(key)
+                if entry is None:
+                    self._refresh()
+                    entry = self._index.get(key)
+                    if entry is None:
+                        raise KeyError(key)
+                name, offset, length, _ = entry
+                try:
+                    return os.pread(self._fd(name), length, offset)
+                except FileNotFoundError:
+                    # Compacted away by another process before this one opened it
+                    self._reset()
+                    self._refresh()
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key not in self._index:
+                self._refresh()
+            return key in self._index
+
+    def keys(self, prefix=''):
+        with self._lock:
+            self._refresh()
+            return sorted(key for key in self._index if key.startswith(prefix))
+
+    def put_many(self, items):
+        self._append([(PUT, key, data) for key, data in items])
+
+    def delete(self, key):
+        self._append([(DELETE, key, b'')])
+
+    def _append(self, records):
+        buffer = b''.join(_record(kind, key, bytes(data)) for kind, key, data in records)
+        with self._exclusive():
+            self._refresh()
+            names = self._segments()
+            if names and self._scanned[names[-1]] < self.segment_bytes:
+                name = names[-1]
+            else:
+                number = int(names[-1].split('-')[0]) + 1 if names else 1
+                name = _segment_name(number)
+            fd = os.open(os.path.join(self.directory, name), os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                # Drop a torn tail left by a writer that crashed mid-append
+                os.ftruncate(fd, self._scanned.get(name, 0))
+                os.pwrite(fd, buffer, self._scanned.get(name, 0))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            if name not in names:
+                self._sync_directory()
+            self._scan(name)
+
+    def _sync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def garbage(self):
+        """(dead bytes, total bytes) across the segments."""
+        with self._lock:
+            return sum(self._dead.values()), sum(self._scanned.values())
+
+    def maintain(self):
+        dead, total = self.garbage()
+        if total >= COMPACT_MIN_BYTES and dead > total * COMPACT_RATIO:
+            self.compact()
+
+    def compact(self):
+        """Rewrite every live record into one new segment; returns the bytes reclaimed."""
+        with self._exclusive():
+            self._refresh()
+            names = self._segments()
+            if not names or (len(names) == 1 and not self._dead[names[0]]):
+                return 0
+            before = sum(self._scanned.values())
+            number, generation = names[-1][:-4].split('-')
+            name = _segment_name(int(number), int(generation) + 1)
+            part = os.path.join(self.directory, name + '.part')
+            with open(part, 'wb') as f:
+                for key, (segment, offset, length, _) in sorted(self._index.items()):
+                    f.write(_record(PUT, key, os.pread(self._fd(segment), length, offset)))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(part, os.path.join(self.directory, name))
+            self._sync_directory()
+            # Readers still holding an old segment open keep reading it until they refresh
+            for old in names:
+                os.remove(os.path.join(self.directory, old))
+            self._reset()
+            self._refresh()
+            after = sum(self._scanned.values())
+        logger.info('compacted %d segments into %s: %d -> %d bytes', len(names), name, before, after)
+        return before - after
+
+    def close(self):
+        with self._lock:
+            self._reset()
+        self._lock_file.close()
+
+
+class S3Store(Store):
+    """Objects in an S3 bucket under `prefix`, through a boto3-style client."""
+
+    def __init__(self, bucket, prefix='', client=None, threads=8):
+        if client is None:
+            import boto3  # optional: only S3 deployments need it
+            client = boto3.client('s3', endpoint_url=os.environ.get('BIOLUME_S3_ENDPOINT'))
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        # S3 has no multi-object put; a batch goes up as parallel requests
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='storage-s3')
+
+    def put_many(self, items):
+        def put(item):
+            key, data = item
+            self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=bytes(data))
+
+        list(self._pool.map(put, items))
+
+    def get(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self.client.exceptions.NoSuchKey:
+            raise KeyError(key) from None
+        return response['Body'].read()
+
+    def keys(self, prefix=''):
+        found = []
+        request = {'Bucket': self.bucket, 'Prefix': self.prefix + prefix}
+        while True:
+            page = self.client.list_objects_v2(**request)
+            found.extend(item['Key'][len(self.prefix):] for item in page.get('Contents', ()))
+            if not page.get('IsTruncated'):
+                return found
+            request['ContinuationToken'] = page['NextContinuationToken']
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def close(self):
+        self._pool.shutdown()
+
+
+class LocalS3Client:
+    """Stand-in for a boto3 S3 client: the calls S3Store makes, on a local directory.
+
+    Objects are files under <root>/<bucket>/<key>. `latency` adds a delay to
+    every request, to try the store under a network round trip.
+    """
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self, root, latency=0.0):
+        self.root = root
+        self.latency = latency
+
+    def _path(self, bucket, key):
+        if not key or key.startswith('/') or '..' in key.split('/'):
+            raise ValueError(f'invalid key {key!r}')
+        return os.path.join(self.root, bucket, key)
+
+    def _request(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put_object(self, Bucket, Key, Body):
+        self._request()
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part = f'{path}.{os.getpid()}.{threading.get_ident()}.part'
+        with open(part, 'wb') as f:
+            f.write(Body)
+        os.replace(part, path)
+        return {}
+
+    def get_object(self, Bucket, Key):
+        self._request()
+        try:
+            with open(self._path(Bucket, Key), 'rb') as f:
+                return {'Body': io.BytesIO(f.read())}
+        except FileNotFoundError:
+            raise self.exceptions.NoSuchKey(Key) from None
+
+    def delete_object(self, Bucket, Key):
+        self._request()
+        try:
+            os.remove(self._path(Bucket, Key))
+        except FileNotFoundError:
+            pass
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000):
+        self._request()
+        base = os.path.join(self.root, Bucket)
+        keys = []
+        for directory, _, files in os.walk(base):
+            for name in files:
+                if not name.endswith('.part'):
+                    key = os.path.relpath(os.path.join(directory, name), base).replace(os.sep, '/')
+                    if key.startswith(Prefix) and (ContinuationToken is None or key > ContinuationToken):
+                        keys.append(key)
+        keys.sort()
+        page = {'Contents': [{'Key': key} for key in keys[:MaxKeys]], 'IsTruncated': len(keys) > MaxKeys}
+        if page['IsTruncated']:
+            page['NextContinuationToken'] = keys[MaxKeys - 1]
+        return page
+
+
+def open_store(url=STORAGE_URL):
+    scheme, _, location = url.partition(':')
+    if scheme == 'segments':
+        return SegmentStore(location)
+    if scheme == 's3':
+        bucket, _, prefix = location.lstrip('/').partition('/')
+        return S3Store(bucket, prefix)
+    if scheme == 'local-s3':
+        return S3Store('biolume', client=LocalS3Client(location))
+    raise ValueError(f'unknown storage {url!r}; expected segments:, s3:// or local-s3:')
+
+
+class StoreWriter:
+    """Puts queued from any thread, written in batches by one background thread."""
+
+    def __init__(self, store, batch_size=100):
+        self.store = store
+        self.batch_size = batch_size
+        # key -> data queued but not yet written, so reads see it straight away
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='storage-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, key, data):
+        # Queue a write for the next batch; the Future resolves once it is durable
+        future = Future()
+        with self._pending_lock:
+            self._pending[key] = data
+        self._queue.put((key, data, future))
+        return future
+
+    def get(self, key):
+        with self._pending_lock:
+            data = self._pending.get(key)
+        return data if data is not None else self.store.get(key)
+
+    def flush(self):
+        """Wait for everything queued so far."""
+        future = Future()
+        self._queue.put((None, None, future))
+        future.result()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        checked = time.monotonic()
+        running = True
+        while running:
+            try:
+                item = self._queue.get(timeout=COMPACT_INTERVAL)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            batch = [item] if item else []
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            if batch:
+                self._write(batch)
+            if time.monotonic() - checked >= COMPACT_INTERVAL:
+                checked = time.monotonic()
+                try:
+                    self.store.maintain()
+                except Exception:
+                    logger.exception('storage maintenance failed')
+
+    def _write(self, batch):
+        items = [(key, data) for key, data, _ in batch if key is not None]
+        error = None
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                if items:
+                    self.store.put_many(items)
+                error = None
+                break
+            except Exception as exc:
+                error = exc
+                logger.warning('storage write of %d objects failed (attempt %d)', len(items), attempt + 1,
+                               exc_info=True)
+                time.sleep(0.5 * 2 ** attempt)
+        with self._pending_lock:
+            for key, data, _ in batch:
+                if key is not None and self._pending.get(key) is data:
+                    del self._pending[key]
+        for _, _, future in batch:
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+
+_stores = {}
+_writers = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(url=STORAGE_URL):
+    # Per process: a forked child shares its parent's lock file, and flock with it
+    key = (url, os.getpid())
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = open_store(url)
+        return store
+
+
+def get_writer(url=STORAGE_URL):
+    store = get_store(url)
+    key = (url, os.getpid())
+    with _stores_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = StoreWriter(store)
+            # Write out queued objects before the interpreter exits
+            atexit.register(writer.close)
+        return writer
+
+
+def import_dir(store, directory, prefix=INVOICE_PREFIX, batch_size=100):
+    """Copy every file in `directory` into the store under `prefix`; returns the count."""
+    names = sorted(entry.name for entry in os.scandir(directory) if entry.is_file())
+    for start in range(0, len(names), batch_size):
+        batch = []
+        for name in names[start:start + batch_size]:
+            with open(os.path.join(directory, name), 'rb') as f:
+                batch.append((prefix + name, f.read()))
+        store.put_many(batch)
+    return len(names)
+
+
+def restore_ledger(store, path):
+    """Rebuild an empty ledger at `path` from the backed-up rows; returns the invoice count.
+
+    Invoice numbering resumes after the highest restored number. Invoices that
+    took stock out take it out again from products tracked in `path`; stock
+    receipts are not backed up, so a new database starts with none tracked.
+    """
+    from .inventory import INVENTORY_SCHEMA
+    from .ledger import connect, insert_invoice
+    from .numbering import NUMBER_SCHEMA, resume_sequences
+
+    conn = connect(path)
+    try:
+        if conn.execute('SELECT 1 FROM invoices LIMIT 1').fetchone():
+            raise ValueError(f'{path} already holds invoices')
+        conn.executescript(NUMBER_SCHEMA + INVENTORY_SCHEMA)
+        count = 0
+        with conn:
+            for key in store.keys(LEDGER_PREFIX):
+                for line in store.get(key).decode('utf-8').splitlines():
+                    insert_invoice(conn, json.loads(line))
+                    count += 1
+            resume_sequences(conn)
+        return count
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the invoice and ledger backup storage.")
+    parser.add_argument('--url', default=STORAGE_URL, help="segments:<dir>, s3://<bucket>/<prefix> or local-s3:<dir>")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('compact', help="reclaim overwritten and deleted records (segment stores)")
+    imp = sub.add_parser('import-dir', help="copy saved invoice PDFs into the store")
+    imp.add_argument('directory')
+    restore = sub.add_parser('restore-ledger', help="rebuild a ledger database from the backup")
+    restore.add_argument('db', nargs='?', default=LEDGER_DB)
+    args = parser.parse_args(argv)
+
+    store = open_store(args.url)
+    try:
+        if args.command == 'compact':
+            if not isinstance(store, SegmentStore):
+                parser.error('only segment stores need compacting')
+            print(f'reclaimed {store.compact()} bytes')
+        elif args.command == 'import-dir':
+            print(f'stored {import_dir(store, args.directory)} files')
+        else:
+            try:
+                count = restore_ledger(store, args.db)
+            except ValueError as exc:
+                parser.exit(1, f"Nothing restored: {exc}\n")
+            print(f'restored {count} invoices into {args.db}')
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
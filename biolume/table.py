@@ -0,0 +1,293 @@
+# Compact, read-only column store for the catalog masters.
+#
+#   table = Table.from_frame(df, PRODUCT_SCHEMA)
+#   table.write('products.tbl')
+#   table = Table.open('products.tbl')            # memory-mapped
+#   row = table.find('Product Name', '5 Step Facial - Derma Lumin')
+#   row['Disc Price Paise'], row['Discount']      # int paise, float percent
+#
+# Strings are packed UTF-8 with int64 offsets, low-cardinality text is stored
+# as category codes, and amounts are int64 fixed point. Key columns carry an
+# open-addressing hash index, so lookups decode one or two strings instead of
+# needing a per-process dict. A memory-mapped table is shared through the
+# page cache by every process that opens the same file, and rows are read on
+# demand through small `Row` views.
+import json
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Sequence
+
+MAGIC = b'BLMTBL01'
+
+STR = 'str'
+CATEGORY = 'category'
+INT = 'int'
+
+
+def _slots_for(count):
+    size = 8
+    while size < count * 2:
+        size *= 2
+    return size
+
+
+class StringColumn(Sequence):
+    """UTF-8 strings in one buffer; row i is data[offsets[i]:offsets[i + 1]]."""
+
+    def __init__(self, offsets, data, slots=None):
+        self._offsets = offsets
+        self._data = data
+        self._slots = slots
+
+    @classmethod
+    def build(cls, values, indexed=False):
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = array('q', [0])
+        total = 0
+        for value in encoded:
+            total += len(value)
+            offsets.append(total)
+        slots = None
+        if indexed:
+            slots = array('q', [-1]) * _slots_for(len(encoded))
+            mask = len(slots) - 1
+            for row, value in enumerate(encoded):
+                slot = zlib.crc32(value) & mask
+                while slots[slot] >= 0:
+                    if encoded[slots[slot]] == value:
+                        # Duplicate key; the first row wins
+                        break
+                    slot = (slot + 1) & mask
+                else:
+                    slots[slot] = row
+        return cls(offsets, b''.join(encoded), slots)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return str(self._data[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+    def tolist(self):
+        # Decoding every row at once, for building indexes and DataFrames
+        data, offsets = bytes(self._data), self._offsets.tolist()
+        return [str(data[start:end], 'utf-8') for start, end in zip(offsets, offsets[1:])]
+
+    def find(self, value):
+        """Row of the first occurrence of `value`, or None."""
+        slots = self._slots
+        if slots is None:
+            raise TypeError('column has no index')
+        encoded = value.encode('utf-8')
+        mask = len(slots) - 1
+        slot = zlib.crc32(encoded) & mask
+        offsets, data = self._offsets, self._data
+        while True:
+            row = slots[slot]
+            if row < 0:
+                return None
+            if data[offsets[row]:offsets[row + 1]] == encoded:
+                return row
+            slot = (slot + 1) & mask
+
+    def sections(self):
+        sections = {'offsets': self._offsets, 'data': self._data}
+        if self._slots is not None:
+            sections['slots'] = self._slots
+        return sections
+
+
+class CategoryColumn(Sequence):
+    def __init__(self, codes, categories):
+        self._codes = codes
+        # Each distinct value exists once per process
+        self.categories = [sys.intern(category) for category in categories]
+
+    @classmethod
+    def build(cls, values):
+        lookup = {}
+        codes = array('i', (lookup.setdefault(value, len(lookup)) for value in values))
+        return cls(codes, list(lookup))
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.categories[self._codes[index]]
+
+    def code(self, index):
+        # Position of row `index`'s value in `categories`
+        return self._codes[index]
+
+    def tolist(self):
+        categories = self.categories
+        return [categories[code] for code in self._codes.tolist()]
+
+    def sections(self):
+        return {'codes': self._codes}
+
+
+class Row:
+    """One table row, read on demand; supports `row[column]` and `row.get(column)`."""
+
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    @property
+    def index(self):
+        return self._index
+
+    def __getitem__(self, column):
+        return self._table.value(column, self._index)
+
+    def get(self, column, default=None):
+        try:
+            return self[column]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self._table.names()
+
+    def to_dict(self):
+        return {column: self[column] for column in self.keys()}
+
+    def __repr__(self):
+        return f'Row({self.to_dict()!r})'
+
+
+class Table:
+    def __init__(self, columns, rows, derived=None, meta=None, buffer=None):
+        # name -> StringColumn, CategoryColumn or an int64 sequence
+        self.columns = columns
+        self.rows = rows
+        # name -> (stored integer column, divisor), e.g. 'Price' -> ('Price Paise', 100)
+        self.derived = derived or {}
+        self.meta = meta or {}
+        # Keeps the mapping alive for as long as any column views it
+        self._buffer = buffer
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def names(self):
+        return list(self.columns) + list(self.derived)
+
+    def value(self, name, index):
+        column = self.columns.get(name)
+        if column is not None:
+            return column[index]
+        source, divisor = self.derived[name]
+        return self.columns[source][index] / divisor
+
+    def row(self, index):
+        return Row(self, index)
+
+    def find(self, name, value):
+        index = self.columns[name].find(value)
+        return None if index is None else Row(self, index)
+
+    @classmethod
+    def from_frame(cls, df, schema, derived=None, meta=None):
+        """Build from a DataFrame; `schema` lists (column, kind, indexed).
+
+        Schema columns missing from `df` are skipped.
+        """
+        columns = {}
+        for name, kind, indexed in schema:
+            if name not in df.columns:
+                continue
+            if kind == INT:
+                columns[name] = array('q', df[name].astype('int64').tolist())
+            elif kind == CATEGORY:
+                columns[name] = CategoryColumn.build(df[name].tolist())
+            else:
+                columns[name] = StringColumn.build(df[name].tolist(), indexed)
+        derived = {name: spec for name, spec in (derived or {}).items() if spec[0] in columns}
+        return cls(columns, len(df), derived, meta)
+
+    def to_frame(self, derived=True):
+        import pandas as pd
+
+        # Every column kind, array and memoryview included, has tolist()
+        frame = {name: column.tolist() for name, column in self.columns.items()}
+        if derived:
+            for name, (source, divisor) in self.derived.items():
+                frame[name] = pd.Series(frame[source], dtype='int64') / divisor
+        return pd.DataFrame(frame)
+
+    def write(self, path):
+        # Sections first, then the JSON header, then the header's offset
+        header = {'byteorder': sys.byteorder, 'rows': self.rows, 'derived': self.derived, 'meta': self.meta,
+                  'columns': []}
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            for name, column in self.columns.items():
+                if isinstance(column, StringColumn):
+                    kind, sections = STR, column.sections()
+                elif isinstance(column, CategoryColumn):
+                    kind, sections = CATEGORY, column.sections()
+                else:
+                    kind, sections = INT, {'values': column}
+                entry = {'name': name, 'kind': kind, 'sections': {}}
+                if kind == CATEGORY:
+                    entry['categories'] = column.categories
+                for section, data in sections.items():
+                    # 8-byte alignment for the int64 views
+                    f.write(b'\0' * (-f.tell() % 8))
+                    data = bytes(data)
+                    entry['sections'][section] = [f.tell(), len(data)]
+                    f.write(data)
+                header['columns'].append(entry)
+            header_offset = f.tell()
+            f.write(json.dumps(header).encode('utf-8'))
+            f.write(struct.pack('<Q', header_offset))
+
+    @classmethod
+    def open(cls, path, use_mmap=True):
+        with open(path, 'rb') as f:
+            if use_mmap:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{path} is not a table file')
+        (header_offset,) = struct.unpack('<Q', view[-8:])
+        header = json.loads(bytes(view[header_offset:-8]))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f'{path} was written on a {header["byteorder"]}-endian machine')
+
+        def section(entry, name, fmt=None):
+            start, length = entry['sections'][name]
+            data = view[start:start + length]
+            return data.cast(fmt) if fmt else data
+
+        columns = {}
+        for entry in header['columns']:
+            if entry['kind'] == INT:
+                columns[entry['name']] = section(entry, 'values', 'q')
+            elif entry['kind'] == CATEGORY:
+                columns[entry['name']] = CategoryColumn(section(entry, 'codes', 'i'), entry['categories'])
+            else:
+                slots = section(entry, 'slots', 'q') if 'slots' in entry['sections'] else None
+                columns[entry['name']] = StringColumn(section(entry, 'offsets', 'q'), section(entry, 'data'), slots)
+        derived = {name: tuple(spec) for name, spec in header['derived'].items()}
+        return cls(columns, header['rows'], derived, header['meta'], buffer)
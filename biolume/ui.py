@@ -0,0 +1,251 @@
+# Streamlit billing UI. The root app scripts call run() with their profile:
+#
+#   streamlit run app.py
+#   BIOLUME_PROFILE=mckt streamlit run app.py
+import time
+import uuid
+from datetime import datetime
+
+from config import get_profile
+
+# Most matches a party or product picker lists at once
+PICKER_LIMIT = 100
+
+
+def _fragment_decorator(st):
+    # Partial reruns need Streamlit >= 1.33; older versions rerun the whole script
+    return getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+
+
+def _fragment(st, run_every=None):
+    fragment = _fragment_decorator(st)
+    if fragment is None:
+        return lambda f: f
+    return fragment(run_every=run_every)
+
+
+def _product_name(catalog, product_id):
+    # Stock can outlive a product's removal from the price list
+    try:
+        return catalog.product_by_id(product_id)['Product Name']
+    except KeyError:
+        return product_id
+
+
+def _build_pdf(job, order, profile, catalog):
+    # Returns the PDF bytes and the invoice number printed on it (None when unnumbered)
+    from .invoice import issue_invoice
+
+    _, pdf_data, invoice_number, recorded = issue_invoice(order, profile, catalog, job.report)
+    if recorded is not None:
+        # Not issued until the ledger has it: a failed commit fails the job instead of offering the PDF
+        recorded.result()
+    return pdf_data, invoice_number
+
+
+def _render_invoice(job, order, profile):
+    # Runs on a job queue thread; returns what the session needs to offer the download
+    from .catalog import get_catalog
+    from .invoice import invoice_filename, persist_invoice
+    from .profiling import span, trace
+
+    with trace('invoice', profile=profile['name'], party=order['party'], lines=len(order['products'])) as timing:
+        # Re-check the catalog so the invoice uses the current price list
+        catalog = get_catalog()
+        invoice_number = None
+        # Ledger profiles number and record every click, so they always render
+        if profile['pdf_cache_mb'] and not profile['record_ledger']:
+            from .pdf_cache import get_pdf_cache, invoice_key
+            with span('pdf.cache'):
+                cache = get_pdf_cache(profile['pdf_cache_mb'])
+                key = invoice_key(order, profile, catalog)
+                pdf_data = cache.get(key)
+            cached = pdf_data is not None
+            if not cached:
+                pdf_data, invoice_number = _build_pdf(job, order, profile, catalog)
+                with span('pdf.cache'):
+                    cache.put(key, pdf_data)
+        else:
+            cached = False
+            pdf_data, invoice_number = _build_pdf(job, order, profile, catalog)
+        timing.fields['cached'] = cached
+        timing.fields['invoice_no'] = invoice_number
+        pdf_file = invoice_filename(order['party'], invoice_number=invoice_number)
+        if profile['save_invoice_copies'] and not cached:
+            # Unnumbered names only carry the second; two sessions billing a party then must not share a copy
+            stored = pdf_file if invoice_number else f'{pdf_file[:-4]}_{job.id[:8]}.pdf'
+            persist_invoice(stored, pdf_data)
+    return {'file_name': pdf_file, 'pdf': pdf_data, 'seconds': timing.seconds, 'spans': timing.summary(),
+            'cached': cached, 'invoice_no': invoice_number}
+
+
+def run(profile_name=None):
+    import streamlit as st
+
+    from .cart import Cart
+    from .catalog import get_catalog
+    from .gst import is_interstate
+    from .jobs import FAILED, get_job_queue, idempotency_key
+    from .pricing import rupees
+    from .profiling import log_to_stderr
+
+    profile = get_profile(profile_name)
+
+    # Per-click timing summaries go to stderr as JSON lines
+    log_to_stderr()
+
+    # Load product data and Party data (parsed once per process, reloaded on change)
+    catalog = get_catalog()
+
+    # Streamlit UI
+    st.title(profile['title'])
+
+    # Typeahead over party name and address; the dropdown only holds the top matches
+    party_query = st.text_input("Search Party", placeholder="Name, area or city")
+    selected_party = st.selectbox("Select Party", catalog.search_parties(party_query, PICKER_LIMIT))
+    if selected_party is None:
+        st.warning("No party matches the search.")
+        return
+
+    # Fetch Party details based on selection
+    party_details = catalog.party(selected_party)
+    address = party_details['Address']
+    gst_number = party_details['GSTIN/UN']
+
+    # Customer Name is the same as Party
+    customer_name = selected_party
+
+    # Display the GSTIN in the form
+    col1, col2 = st.columns(2)
+    with col1:
+        st.text_input("Enter Customer Name", value=customer_name, disabled=True)
+    with col2:
+        st.text_input("Enter GST Number", value=gst_number, disabled=True)
+
+    col3, col4 = st.columns(2)
+    with col3:
+        contact_number = st.text_input("Enter Contact Number")
+    with col4:
+        date = datetime.now().strftime("%d-%m-%Y")
+        st.text(f"Date: {date}")
+
+    # Display the address in the text area
+    st.text_area("Address", value=address, height=100)
+
+    # The order lives in session state; widget callbacks update only the line that changed
+    cart = st.session_state.setdefault('cart', Cart())
+
+    def add_product(product):
+        cart.add(get_catalog(), product)
+        st.session_state[f'qty:{product}'] = cart.quantities[product]
+
+    def on_product_query():
+        # A typed or scanned product ID / barcode goes straight into the cart
+        product = get_catalog().product_by_code(st.session_state['product_query'])
+        if product is not None:
+            add_product(product)
+            st.session_state['product_query'] = ''
+
+    def on_quantity(product):
+        cart.set_quantity(get_catalog(), product, st.session_state[f'qty:{product}'])
+
+    def remove_product(product):
+        cart.remove(product)
+
+    # Cart edits rerun only this block, not the party form above it
+    @_fragment(st)
+    def order_lines():
+        catalog = get_catalog()
+        cart.sync(catalog)
+        for product in cart.dropped:
+            st.session_state.pop(f'qty:{product}', None)
+            st.warning(f"{product} is no longer in the price list and was removed from the order.")
+        cart.dropped.clear()
+        query = st.text_input("Add Product", key='product_query', on_change=on_product_query,
+                              placeholder="Name, category, product ID or barcode")
+        if query:
+            matches = catalog.search_products(query, PICKER_LIMIT)
+            if matches:
+                col1, col2 = st.columns([5, 1], vertical_alignment='bottom')
+                with col1:
+                    match = st.selectbox("Matching Products", matches)
+                with col2:
+                    st.button("Add", on_click=add_product, args=(match,))
+            else:
+                st.caption("No matching products.")
+        for product in cart.products:
+            key = f'qty:{product}'
+            if key not in st.session_state:
+                st.session_state[key] = cart.quantities[product]
+            col1, col2 = st.columns([5, 1], vertical_alignment='bottom')
+            with col1:
+                st.number_input(f"Quantity for {product}", min_value=1, step=1, key=key,
+                                on_change=on_quantity, args=(product,))
+            with col2:
+                st.button("Remove", key=f'remove:{product}', on_click=remove_product, args=(product,))
+        if cart:
+            totals = cart.totals(profile['rounding'], is_interstate(gst_number, profile['state_code']))
+            st.text(f"Subtotal: {rupees(totals['subtotal'])}    GST: {rupees(totals['tax'])}    "
+                    f"Total: {rupees(totals['grand_total'])} INR")
+        if cart and profile['track_stock']:
+            from .inventory import get_inventory, order_quantities
+            # One query for the whole cart; the reservation on Generate re-checks it
+            wanted = order_quantities(catalog, cart.products, cart.quantities.values())
+            for product_id, (units, available) in get_inventory().shortfalls(wanted).items():
+                st.warning(f"Only {available} of {_product_name(catalog, product_id)} in stock; "
+                           f"the order has {units}.")
+
+    order_lines()
+    selected_products = cart.products
+    quantities = list(cart.quantities.values())
+
+    jobs = get_job_queue()
+    if st.button("Generate Invoice"):
+        if selected_party and selected_products and quantities and contact_number:
+            order = {'party': selected_party, 'contact': contact_number,
+                     'products': selected_products, 'quantities': quantities}
+            # Rendering happens on the job queue; a repeat of the same order today reuses its job
+            key = idempotency_key(profile['name'], order)
+            if profile['record_ledger']:
+                # Each session's invoice is its own ledger entry, even when another
+                # session bills the identical order
+                key = f"{st.session_state.setdefault('session_id', uuid.uuid4().hex)}:{key}"
+            # The job itself, not its id: the shared queue forgets finished jobs of busy sessions
+            st.session_state['invoice_job'] = jobs.submit(key, _render_invoice, order, profile)
+        else:
+            st.error("Please fill all fields and select products.")
+
+    job = st.session_state.get('invoice_job')
+    if job is not None and not job.finished:
+        @_fragment(st, run_every=0.25)
+        def job_progress():
+            if job.finished:
+                # Full rerun to swap the progress bar for the download
+                st.rerun()
+            st.progress(job.progress, text=job.stage)
+
+        job_progress()
+        if _fragment_decorator(st) is None:
+            # No timed fragment reruns; poll with whole-script reruns instead
+            time.sleep(0.25)
+            st.rerun()
+    elif job is not None and job.status == FAILED:
+        st.error(f"Invoice generation failed: {job.error}")
+    elif job is not None:
+        result = job.result
+        st.download_button("Download Invoice", result['pdf'], file_name=result['file_name'], mime="application/pdf")
+        if result['invoice_no']:
+            st.success(f"Invoice {result['invoice_no']} recorded")
+        source = ', cached' if result['cached'] else ''
+        with st.expander(f"Timing ({result['seconds'] * 1000:.1f} ms{source})"):
+            st.table(result['spans'])
+
+    if profile['track_stock']:
+        from .inventory import get_inventory
+        # Maintained by the ledger as invoices are recorded; reading it is one small query
+        low = get_inventory().low_stock()
+        if low:
+            with st.expander(f"Low stock ({len(low)})"):
+                st.table([{'Product ID': product_id, 'Product': _product_name(catalog, product_id),
+                           'Available': available, 'Reorder level': reorder_level}
+                          for product_id, available, reorder_level in low])
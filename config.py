@@ -1,3 +1,32 @@
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _path(name):
+    return os.path.join(BASE_DIR, name)
+
+
+# Data files
+PRODUCT_CSV = _path('MKT+Biolume - Inventory System - Invoice (2).csv')
+PARTY_CSV = _path('MKT+Biolume - Inventory System - Party (2).csv')
+LEDGER_DB = os.environ.get('BIOLUME_LEDGER_DB', _path('data/invoices.db'))
+# Legacy append-only invoice log, imported into the ledger once
+INVOICES_CSV = _path('data/invoices.csv')
+# Invoice copies saved before STORAGE_URL; `python -m biolume.storage import-dir` moves them over
+INVOICE_DIR = _path('generated_invoices')
+# Validated, typed copies of the product and party CSVs (see biolume/masters.py)
+SNAPSHOT_DIR = _path('data/snapshots')
+# Memory-map the snapshots, so every process on the machine shares one copy of the catalog
+CATALOG_MMAP = True
+# Rendered PDFs keyed by order, branding and price list (see biolume/pdf_cache.py)
+PDF_CACHE_DIR = _path('data/pdf_cache')
+# Durable home of saved invoice PDFs and the ledger backup (see biolume/storage.py):
+# 'segments:<dir>', 's3://<bucket>/<prefix>' or 'local-s3:<dir>'
+STORAGE_URL = os.environ.get('BIOLUME_STORAGE', 'segments:' + _path('data/store'))
+# Copy every ledger commit to STORAGE_URL
+LEDGER_BACKUP = True
+
 COMPANY_NAME = "KS Agencies"
 COMPANY_ADDRESS = """61A/42, Karunanidhi Street, Nehru Nagar,
 West Velachery, Chennai - 600042.
@@ -5,14 +34,84 @@ GSTIN/UIN: 33AAGFK1394P1ZX
 State Name : Tamil Nadu, Code : 33
 """
 
-COMPANY_LOGO = 'assets/logo.png'
-PHOTO_LOGO = 'assets/photo.png'
+# HSN code and GST rate (basis points) per product category, resolved once per
+# catalog load (see biolume/gst.py). Categories not listed use DEFAULT_TAX_CLASS.
+TAX_CLASSES = {
+    '5 - Step Facial': ('3304', 1800),
+    'Cleanup Kit': ('3304', 1800),
+    'Facial Kit': ('3304', 1800),
+    'Hair Care': ('3305', 1800),
+    'General': ('3304', 1800),
+}
+DEFAULT_TAX_CLASS = ('3304', 1800)
+
+COMPANY_LOGO = _path('Untitled design (3).png')
+PHOTO_LOGO = _path('10.png')
 
 BANK_DETAILS = """
 For Rtgs / KS Agencies
-Kotak Mahindra Bank
-Velachery branch
-Ac No 0012490288
-IFSC code KKBK0000473
+Kotak Mahindra Bank Velachery branch
+Ac No 0012490288, IFSC code KKBK0000473
 Mobile - 9444454461 / GPay / PhonePe / Niyas
+Delivery/Payment Support: {delivery_support}
+Customer Support: +919311662808
 """
+
+# Branding and behaviour shared by every profile
+BASE_PROFILE = {
+    'title': "Biolume: Billing System",
+    'company_name': COMPANY_NAME,
+    'company_address': COMPANY_ADDRESS,
+    # GST state code of the billing company; parties registered elsewhere are billed IGST
+    'state_code': '33',
+    'company_logo': COMPANY_LOGO,
+    'photo_logo': PHOTO_LOGO,
+    'bank_details': BANK_DETAILS.format(delivery_support='+919094041611'),
+    # Grand total rounding: 'none', 'up' (next rupee) or 'nearest' (see biolume/pricing.py)
+    'rounding': 'up',
+    # Downscale logos to this resolution at their printed size (None keeps the originals)
+    'image_dpi': 300,
+    # Record every invoice in the SQLite ledger. Ledger profiles also number their
+    # invoices, gap-free per financial year: <prefix>/2026-27/00001
+    'record_ledger': False,
+    'invoice_prefix': 'KS',
+    # Check and reserve stock for every invoice, and take it out of stock when the
+    # invoice is recorded (see biolume/inventory.py). Needs record_ledger.
+    'track_stock': False,
+    # Keep a copy of every generated PDF in STORAGE_URL (written in the background)
+    'save_invoice_copies': False,
+    # Disk budget for re-serving identical invoices without re-rendering (0 disables).
+    # Ledger profiles always render, since every click records a new invoice.
+    'pdf_cache_mb': 256,
+}
+
+# One profile per deployed app; app.py, app_s.py, app_deepseek.py and data.py
+# are thin entry points that select one of these.
+PROFILES = {
+    'ks': {},
+    'ks_exact': {
+        'rounding': 'none',
+    },
+    'ks_ledger': {
+        'rounding': 'none',
+        'record_ledger': True,
+        'track_stock': True,
+    },
+    'mckt': {
+        'company_logo': _path('mcktbiolume.png'),
+        'invoice_prefix': 'MCKT',
+        'bank_details': BANK_DETAILS.format(delivery_support='+916383775830'),
+    },
+}
+
+DEFAULT_PROFILE = os.environ.get('BIOLUME_PROFILE', 'ks')
+
+
+def get_profile(name=None):
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise KeyError(f"Unknown profile {name!r}; expected one of {', '.join(PROFILES)}")
+    profile = dict(BASE_PROFILE)
+    profile.update(PROFILES[name])
+    profile['name'] = name
+    return profile
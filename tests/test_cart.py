@@ -0,0 +1,57 @@
+# The session cart against a price list that is reloaded under it.
+#   python -m pytest tests
+from biolume.cart import Cart
+
+
+class PriceList:
+    # Just what the cart reads from the catalog
+    def __init__(self, prices):
+        self.prices = prices
+        self.price_version = 0
+
+    def reload(self, prices):
+        self.prices = prices
+        self.price_version += 1
+
+    def product(self, name):
+        return {'Disc Price Paise': self.prices[name]}
+
+    def tax_class(self, row):
+        return ('3304', 1800)
+
+
+def test_reload_reprices_lines():
+    catalog = PriceList({'Shampoo': 10000, 'Serum': 25000})
+    cart = Cart()
+    cart.add(catalog, 'Shampoo', 2)
+    cart.add(catalog, 'Serum')
+    assert cart.subtotal == 45000
+    catalog.reload({'Shampoo': 12000, 'Serum': 25000})
+    cart.sync(catalog)
+    assert cart.subtotal == 49000
+    assert cart.taxable[('3304', 1800)] == 49000
+
+
+def test_reload_drops_discontinued_products():
+    catalog = PriceList({'Shampoo': 10000, 'Serum': 25000})
+    cart = Cart()
+    cart.add(catalog, 'Shampoo', 2)
+    cart.add(catalog, 'Serum')
+    catalog.reload({'Shampoo': 10000})
+    cart.sync(catalog)
+    assert cart.products == ['Shampoo']
+    assert cart.dropped == ['Serum']
+    assert cart.subtotal == 20000
+    assert cart.totals()['subtotal'] == 20000
+
+
+def test_quantity_change_for_a_dropped_product_is_ignored():
+    catalog = PriceList({'Shampoo': 10000, 'Serum': 25000})
+    cart = Cart()
+    cart.add(catalog, 'Serum')
+    catalog.reload({'Shampoo': 10000})
+    # The widget callback runs before the fragment has synced the cart
+    cart.set_quantity(catalog, 'Serum', 3)
+    assert len(cart) == 0
+    assert cart.dropped == ['Serum']
+    assert cart.subtotal == 0
@@ -0,0 +1,91 @@
+# Stock reservations against a scratch ledger: reserve, release, fulfil and
+# the shortfall path.
+#   python -m pytest tests
+import subprocess
+import sys
+
+import pytest
+
+from biolume.inventory import Inventory, InsufficientStock
+from biolume.ledger import connect, insert_invoice
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'ledger.db')
+
+
+@pytest.fixture
+def inventory(db):
+    inventory = Inventory(db)
+    inventory.receive({'SH01': 10, 'SR01': 3}, reorder_levels={'SR01': 2})
+    yield inventory
+    inventory.close()
+
+
+def record(db, reservation, lines):
+    invoice = {'invoice_no': 'T/00001', 'party': 'Salon', 'gstin': None, 'contact': '', 'address': '',
+               'invoice_date': '2026-10-01', 'created_at': '2026-10-01T10:00:00', 'total_paise': 0,
+               'tax_paise': 0, 'grand_total_paise': 0, 'reservation': reservation,
+               'lines': [{'line_no': n + 1, 'product_id': product_id, 'product': product_id, 'quantity': quantity}
+                         for n, (product_id, quantity) in enumerate(lines.items())]}
+    conn = connect(db)
+    with conn:
+        insert_invoice(conn, invoice)
+    conn.close()
+
+
+def on_hand(db):
+    conn = connect(db)
+    rows = dict(conn.execute('SELECT product_id, on_hand FROM stock'))
+    conn.close()
+    return rows
+
+
+def test_reserve_holds_units(inventory):
+    inventory.reserve({'SH01': 4})
+    assert inventory.available(['SH01', 'SR01']) == {'SH01': 6, 'SR01': 3}
+
+
+def test_shortfall_reserves_nothing(inventory):
+    with pytest.raises(InsufficientStock) as exc:
+        inventory.reserve({'SH01': 4, 'SR01': 5})
+    assert exc.value.shortfalls == {'SR01': (5, 3)}
+    # The line that could be covered was not held either
+    assert inventory.available(['SH01', 'SR01']) == {'SH01': 10, 'SR01': 3}
+    assert inventory.shortfalls({'SH01': 11, 'SR01': 3}) == {'SH01': (11, 10)}
+
+
+def test_untracked_products_are_not_held(inventory):
+    inventory.reserve({'SH01': 1, 'NEW01': 500})
+    assert inventory.available(['NEW01']) == {}
+    assert inventory.shortfalls({'NEW01': 500}) == {}
+
+
+def test_release_makes_units_available(inventory):
+    reservation = inventory.reserve({'SH01': 4, 'SR01': 3})
+    inventory.release(reservation)
+    assert inventory.available(['SH01', 'SR01']) == {'SH01': 10, 'SR01': 3}
+
+
+def test_fulfil_moves_stock_out_with_the_invoice(db, inventory):
+    reservation = inventory.reserve({'SH01': 4, 'SR01': 2})
+    record(db, reservation, {'SH01': 4, 'SR01': 2, 'NEW01': 1})
+    assert on_hand(db) == {'SH01': 6, 'SR01': 1}
+    assert inventory.available(['SH01', 'SR01']) == {'SH01': 6, 'SR01': 1}
+    assert inventory.low_stock() == [('SR01', 1, 2)]
+
+
+def test_stock_count_records_the_difference(db, inventory):
+    inventory.receive({'SH01': 7}, kind='count')
+    assert on_hand(db) == {'SH01': 7, 'SR01': 3}
+
+
+def test_dead_owner_reservations_are_released(db, inventory):
+    # A reservation left behind by a process that has exited
+    script = f'from biolume.inventory import Inventory; Inventory({db!r}).reserve({{"SH01": 9}})'
+    subprocess.run([sys.executable, '-c', script], check=True)
+    assert inventory.available(['SH01']) == {'SH01': 1}
+    # The next reservation gives its units back first
+    inventory.reserve({'SH01': 5})
+    assert inventory.available(['SH01']) == {'SH01': 5}
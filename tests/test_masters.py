@@ -0,0 +1,50 @@
+# Validation in the master-data import: GSTIN checks and duplicate keys.
+#   python -m pytest tests
+import pytest
+
+from biolume.masters import gstin_error, import_master
+from config import PARTY_CSV
+
+
+@pytest.mark.parametrize('gstin', ['27AAPFU0939F1ZV', '29AAGCB7383J1Z4'])
+def test_valid_gstin(gstin):
+    assert gstin_error(gstin) is None
+
+
+@pytest.mark.parametrize('gstin', ['33BHAPM4731Q1Z', '33bhapm4731q1zx', '33BHAPM4731Q0ZX'])
+def test_malformed_gstin(gstin):
+    # Too short, lower case, and a zero entity code
+    assert gstin_error(gstin) == 'malformed GSTIN'
+
+
+def test_gstin_checksum_mismatch():
+    assert gstin_error('27AAPFU0939F1ZW') == 'GSTIN checksum mismatch'
+
+
+def write_parties(tmp_path, rows):
+    path = tmp_path / 'parties.csv'
+    path.write_text('Party,Address,GSTIN/UN\n' + ''.join(f'{row}\n' for row in rows))
+    return str(path)
+
+
+def test_party_import_flags_rows(tmp_path):
+    path = write_parties(tmp_path, [
+        'Salon A,Chennai,27AAPFU0939F1ZV',
+        'Salon B,Chennai,27AAPFU0939F1ZW',
+        'Salon C,Chennai,NA',
+        ',Chennai,',
+        'Salon A,Madurai,',
+    ])
+    table, report = import_master('parties', path, str(tmp_path / 'snapshots'))
+    assert report.errors == [(5, 'Party', 'empty')]
+    assert report.warnings == [(3, 'GSTIN/UN', 'GSTIN checksum mismatch: 27AAPFU0939F1ZW'),
+                               (None, 'Party', "duplicate 'Salon A'; the first row is used")]
+    assert report.rows == 4
+    # Placeholders for "no GSTIN" are stored empty
+    assert table.to_frame()['GSTIN/UN'].tolist() == ['27AAPFU0939F1ZV', '27AAPFU0939F1ZW', '', '']
+
+
+def test_shipped_party_master(tmp_path):
+    _, report = import_master('parties', PARTY_CSV, str(tmp_path))
+    assert (9, 'GSTIN/UN', 'malformed GSTIN: 33BHAPM4731Q1Z') in report.warnings
+    assert (None, 'Party', "duplicate 'McKingsTown - MADIPAKKAM'; the first row is used") in report.warnings
@@ -0,0 +1,116 @@
+# Invoice numbering against a scratch ledger: leasing, releasing, reclaiming,
+# resuming after a restore and closing a financial year.
+#   python -m pytest tests
+import subprocess
+import sys
+from datetime import date
+
+import pytest
+
+from biolume.ledger import connect, insert_invoice
+from biolume.numbering import NumberAllocator, financial_year, resume_sequences
+
+OCTOBER = date(2026, 10, 1)
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'ledger.db')
+
+
+@pytest.fixture
+def allocator(db):
+    allocator = NumberAllocator('KS', db, block_size=5)
+    yield allocator
+    allocator.close()
+
+
+def record(db, *numbers):
+    conn = connect(db)
+    with conn:
+        for invoice_no in numbers:
+            insert_invoice(conn, {'invoice_no': invoice_no, 'party': 'Salon', 'gstin': None, 'contact': '',
+                                  'address': '', 'invoice_date': '2026-10-01', 'created_at': '2026-10-01T10:00:00',
+                                  'total_paise': 0, 'tax_paise': 0, 'grand_total_paise': 0, 'lines': []})
+    conn.close()
+
+
+def sequences(db):
+    conn = connect(db)
+    rows = (dict(conn.execute('SELECT series, next_number FROM invoice_sequences')),
+            conn.execute('SELECT series, number FROM invoice_number_pool ORDER BY series, number').fetchall())
+    conn.close()
+    return rows
+
+
+def test_financial_year_starts_in_april():
+    assert financial_year(date(2027, 3, 31)) == '2026-27'
+    assert financial_year(date(2027, 4, 1)) == '2027-28'
+
+
+def test_numbers_continue_across_blocks(db, allocator):
+    numbers = [allocator.next(OCTOBER) for _ in range(7)]
+    assert numbers == [f'KS/2026-27/{number:05d}' for number in range(1, 8)]
+    assert sequences(db)[0] == {'KS/2026-27': 11}
+
+
+def test_released_number_is_issued_next(allocator):
+    first = allocator.next(OCTOBER)
+    allocator.next(OCTOBER)
+    allocator.release(first)
+    assert allocator.next(OCTOBER) == first
+
+
+def test_close_gives_unused_numbers_back(db, allocator):
+    other = NumberAllocator('KS', db, block_size=5)
+    assert other.next(OCTOBER) == 'KS/2026-27/00001'
+    assert allocator.next(OCTOBER) == 'KS/2026-27/00006'
+    # The unused 2-5 sit below a live lease, so they wait in the pool
+    other.close()
+    assert sequences(db) == ({'KS/2026-27': 11}, [('KS/2026-27', number) for number in range(2, 6)])
+    assert NumberAllocator('KS', db).next(OCTOBER) == 'KS/2026-27/00002'
+
+
+def test_close_trims_the_top_of_the_series(db, allocator):
+    for _ in range(3):
+        allocator.next(OCTOBER)
+    allocator.release('KS/2026-27/00002')
+    allocator.close()
+    # 4 and 5 go back into the sequence; 2 stays pooled below the issued 3
+    assert sequences(db) == ({'KS/2026-27': 4}, [('KS/2026-27', 2)])
+
+
+def test_issued_numbers_are_skipped(db, allocator):
+    record(db, 'KS/2026-27/00001', 'KS/2026-27/00002')
+    assert allocator.next(OCTOBER) == 'KS/2026-27/00003'
+
+
+def test_dead_owner_leases_are_reclaimed(db, allocator):
+    # A process that issued one number and exited without closing its allocator
+    script = f'from datetime import date; from biolume.numbering import NumberAllocator; ' \
+             f'print(NumberAllocator("KS", {db!r}, block_size=5).next(date(2026, 10, 1)))'
+    issued = subprocess.run([sys.executable, '-c', script], check=True, capture_output=True, text=True)
+    assert issued.stdout.strip() == 'KS/2026-27/00001'
+    record(db, 'KS/2026-27/00001')
+    # Its unissued 2-5 go back before this lease
+    assert allocator.next(OCTOBER) == 'KS/2026-27/00002'
+    assert sequences(db)[0] == {'KS/2026-27': 7}
+
+
+def test_resume_continues_after_the_ledger(db, allocator):
+    allocator.next(OCTOBER)
+    allocator.close()
+    record(db, 'KS/2026-27/00007', 'MANUAL-1')
+    conn = connect(db)
+    with conn:
+        assert resume_sequences(conn) == {'KS/2026-27': 8}
+    conn.close()
+    assert sequences(db) == ({'KS/2026-27': 8}, [])
+    assert NumberAllocator('KS', db).next(OCTOBER) == 'KS/2026-27/00008'
+
+
+def test_new_year_closes_the_last_one(db, allocator):
+    assert allocator.next(date(2027, 3, 31)) == 'KS/2026-27/00001'
+    assert allocator.next(date(2027, 4, 1)) == 'KS/2027-28/00001'
+    # The rest of March's block is not left behind as a gap
+    assert sequences(db) == ({'KS/2026-27': 2, 'KS/2027-28': 6}, [])
@@ -0,0 +1,66 @@
+# Randomized properties of the pricing engine, checked against a
+# straightforward Decimal implementation.
+#   python -m pytest tests
+import random
+from decimal import ROUND_CEILING, ROUND_HALF_UP, Decimal
+
+import pytest
+
+from biolume.pricing import ROUND_NEAREST, ROUND_NONE, ROUND_UP, ROUNDING_POLICIES, price_order
+
+CHECKS = 2000
+TAX_CLASSES = [('3304', 1800), ('3305', 1800), ('3401', 1200), ('0401', 500)]
+
+
+def decimal_reference(unit_paise, quantities, rounding, rate_bp):
+    subtotal = sum(Decimal(p) / 100 * q for p, q in zip(unit_paise, quantities))
+    half = (subtotal * Decimal(rate_bp) / 20000).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    total = subtotal + 2 * half
+    if rounding == ROUND_UP:
+        total = total.quantize(Decimal(1), rounding=ROUND_CEILING)
+    elif rounding == ROUND_NEAREST:
+        total = total.quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    return int(subtotal * 100), int(half * 100), int(total * 100)
+
+
+def random_order(rng):
+    n = rng.randint(0, 40)
+    return [rng.randint(0, 500000) for _ in range(n)], [rng.randint(0, 500) for _ in range(n)]
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_single_rate_matches_decimal(seed):
+    rng = random.Random(seed)
+    for _ in range(CHECKS // 4):
+        unit, qty = random_order(rng)
+        rounding = rng.choice(ROUNDING_POLICIES)
+        rate_bp = rng.choice([0, 250, 500, 1200, 1800, 2800])
+        t = price_order(unit, qty, rounding, rate_bp)
+        assert sum(t['line_amounts']) == t['subtotal']
+        assert t['cgst'] == t['sgst'] and t['tax'] == t['cgst'] + t['sgst']
+        assert t['grand_total'] == t['subtotal'] + t['tax'] + t['round_off']
+        assert rounding == ROUND_NONE or t['grand_total'] % 100 == 0
+        assert (0 <= t['round_off'] < 100) if rounding == ROUND_UP else (-50 < t['round_off'] <= 50)
+        assert (t['subtotal'], t['cgst'], t['grand_total']) == decimal_reference(unit, qty, rounding, rate_bp)
+
+
+@pytest.mark.parametrize('interstate', [False, True])
+def test_tax_classes_match_decimal(interstate):
+    # Mixed HSN codes and rates; the HSN summary adds up to the order totals
+    rng = random.Random(int(interstate))
+    for _ in range(CHECKS // 2):
+        unit, qty = random_order(rng)
+        lines = [rng.choice(TAX_CLASSES) for _ in unit]
+        t = price_order(unit, qty, ROUND_NONE, [rate for _, rate in lines], [hsn for hsn, _ in lines], interstate)
+        groups = t['tax_groups']
+        assert sum(g['taxable'] for g in groups) == t['subtotal']
+        assert sum(g['tax'] for g in groups) == t['tax'] == t['cgst'] + t['sgst'] + t['igst']
+        for g in groups:
+            taxable = sum(u * q for u, q, line in zip(unit, qty, lines) if line == (g['hsn'], g['rate_bp']))
+            assert g['taxable'] == taxable
+            if interstate:
+                assert g['cgst'] == g['sgst'] == 0
+                assert g['igst'] == int((Decimal(taxable) * g['rate_bp'] / 10000).quantize(1, ROUND_HALF_UP))
+            else:
+                assert g['igst'] == 0 and g['cgst'] == g['sgst']
+                assert g['cgst'] == int((Decimal(taxable) * g['rate_bp'] / 20000).quantize(1, ROUND_HALF_UP))